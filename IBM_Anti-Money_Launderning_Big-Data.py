@@ -11,112 +11,124 @@ import os
 import json
 import zipfile
 from pyspark.sql import SparkSession
-import random
-from pyspark.sql.types import StructType, StructField, StringType, FloatType, IntegerType, DoubleType
 from pyspark.sql import functions as F
-from pyspark.sql.functions import col, sum, when, count, avg, to_timestamp, hour, dayofweek
-from pyspark.ml.feature import StringIndexer, VectorAssembler, StandardScaler
-from pyspark.sql import Window
-import seaborn as sns
-import matplotlib.pyplot as plt
-from pyspark.ml.stat import Correlation
+from pyspark.ml.feature import VectorAssembler
 import numpy as np
-from pyspark.ml import Pipeline
+from pyspark.ml import Pipeline, PipelineModel
 from pyspark.ml.classification import RandomForestClassifier
 from pyspark.ml.tuning import CrossValidator, ParamGridBuilder
-from pyspark.ml.evaluation import BinaryClassificationEvaluator, MulticlassClassificationEvaluator
+from pyspark.ml.evaluation import BinaryClassificationEvaluator
+from aml.account_features import join_account_features, read_feature_store, refresh_feature_store
+from aml.account_index import AccountIndex, export_account_index
+from aml.batch_scoring import score_transactions
+from aml.binning import binned_matrix, fit_bucketizer
+from aml.checkpoint import StageCheckpoints
+from aml.data_profile import heatmap_inputs, profile_dataframe, stratified_fractions
+from aml.encoding import FusedStringIndexer
+from aml.evaluation import evaluation_report, format_report, write_report
+from aml.explain import ForestExplainer, top_contributions
+from aml.explain import benchmark as explain_benchmark
+from aml.features import add_time_features
+from aml.identity import dictionary_sizes, encode_identities, refresh_dictionaries
+from aml.ingest import TRANSACTION_COLUMNS, ingest_transactions, read_transactions
+from aml.labeling import check_labeling, label_transactions
+from aml.metrics import cached_storage_mb, measure_rows
+from aml.motifs import MOTIF_COLUMNS, motif_features
+from aml.patterns import parse_patterns
+from aml.profiling import StageProfiler
+from aml.scorer import benchmark, check_parity, export_random_forest
+from aml.smote import smote
+from aml.streaming import STREAM_FEATURES
+from aml.tuning import HOLDOUT_COLUMN, fold_column, holdout_column, successive_halving
+from aml.velocity import HORIZONS, SALT_COLUMN, key_skew, velocity_features, velocity_partitions
+from aml.weighting import WEIGHT_COLUMN, class_weights, with_class_weights
 
 # Initialize Spark session
 spark = SparkSession.builder \
     .appName("Anti-Money Laundering") \
     .getOrCreate()
 
-# Define schema for the CSV file
-schema = StructType([
-    StructField("Timestamp", StringType(), True),
-    StructField("From_Bank", StringType(), True),
-    StructField("From_Account", StringType(), True),
-    StructField("To_Bank", StringType(), True),
-    StructField("To_Account", StringType(), True),
-    StructField("Amount_Received", FloatType(), True),
-    StructField("Receiving_Currency", StringType(), True),
-    StructField("Amount_Paid", FloatType(), True),
-    StructField("Payment_Currency", StringType(), True),
-    StructField("Payment_Format", StringType(), True)
-])
-
-# Load the CSV file
-li_medium_df = spark.read.csv("/content/drive/MyDrive/Big data Final Project/LI-Medium_Trans.csv", schema=schema, header=True)
+# Record wall time and Spark task metrics (bytes read, shuffled and spilled,
+# GC time, task skew, cached storage) for every stage of the run and write
+# them as one JSON report at the end (see aml/profiling.py)
+profiler = StageProfiler(spark, report_path="/content/drive/MyDrive/Big data Final Project/reports/profile.json")
+# Checkpoint the output of every stage under a key derived from its inputs
+# and parameters (see aml/checkpoint.py). A rerun reads back every stage
+# whose inputs and parameters are unchanged, so it resumes at the first
+# stage that changed, or that failed last time.
+checkpoints = StageCheckpoints(spark, "/content/drive/MyDrive/Big data Final Project/checkpoints")
+
+profiler.start("ingest")
+
+# Convert the CSV once into a typed, date-partitioned Parquet store (see
+# aml/ingest.py). The conversion is skipped while the fingerprint of the
+# source file is unchanged, so reruns only read the columns they need.
+transactions_csv = "/content/drive/MyDrive/Big data Final Project/LI-Medium_Trans.csv"
+transactions_store = "/content/drive/MyDrive/Big data Final Project/LI-Medium_Trans.parquet"
+patterns_path = "/content/drive/MyDrive/Big data Final Project/LI-Medium_Patterns.txt.txt"
+ingest_transactions(spark, transactions_csv, transactions_store)
+
+# Give every account and bank a dense integer ID in a persisted, append-only
+# dictionary (see aml/identity.py). Only Date partitions that are not yet
+# encoded are scanned, and existing IDs never change.
+identity_store = "/content/drive/MyDrive/Big data Final Project/LI-Medium_Identities"
+refresh_dictionaries(spark, identity_store, transactions_store)
+print("Dictionary sizes:", dictionary_sizes(spark, identity_store))
+
+checkpoints.source("transactions", transactions_csv)
+checkpoints.source("patterns", patterns_path)
+checkpoints.source("identities", identity_store)
+
+# Load the typed transactions with integer account and bank IDs, so the
+# windows and joins below shuffle fixed-width keys instead of strings
+li_medium_df = encode_identities(
+    spark, identity_store, read_transactions(spark, transactions_store, columns=TRANSACTION_COLUMNS))
 
 # Display the first few rows
 li_medium_df.show(10)
 
 # Load the TXT file
-li_patterns_df = spark.read.text("/content/drive/MyDrive/Big data Final Project/LI-Medium_Patterns.txt.txt")
+li_patterns_df = spark.read.text(patterns_path)
 
 # Display the first few rows
 li_patterns_df.show(10, truncate=False)
 
 """Identify Laundering Patterns"""
 
-# Step 1: Extract "Pattern_Type" from BEGIN LAUNDERING ATTEMPT
-patterns_df = li_patterns_df.withColumn(
-    "Pattern_Type",
-    F.when(F.col("value").rlike("BEGIN LAUNDERING ATTEMPT - (.+)"),
-           F.regexp_extract(F.col("value"), "BEGIN LAUNDERING ATTEMPT - (.+)", 1))
-)
-
-# Step 2: Forward-fill the "Pattern_Type" column
-window_spec = Window.orderBy(F.monotonically_increasing_id())
-patterns_df = patterns_df.withColumn(
-    "Pattern_Type",
-    F.last("Pattern_Type", True).over(window_spec)
-)
-
-# Step 3: Filter out rows with "END LAUNDERING ATTEMPT"
-patterns_df = patterns_df.filter(~F.col("value").contains("END LAUNDERING ATTEMPT"))
-
-# Step 4: Filter for transaction rows
-laundering_transactions = patterns_df.filter(patterns_df.value.rlike(r'\d{4}/\d{2}/\d{2}'))
-
-# Split columns into structured fields
-laundering_transactions = laundering_transactions.withColumn("Timestamp", F.split(F.col("value"), ",").getItem(0)) \
-    .withColumn("From_Bank", F.split(F.col("value"), ",").getItem(1)) \
-    .withColumn("From_Account", F.split(F.col("value"), ",").getItem(2)) \
-    .withColumn("To_Bank", F.split(F.col("value"), ",").getItem(3)) \
-    .withColumn("To_Account", F.split(F.col("value"), ",").getItem(4)) \
-    .withColumn("Amount_Received", F.split(F.col("value"), ",").getItem(5)) \
-    .withColumn("Receiving_currency", F.split(F.col("value"), ",").getItem(6)) \
-    .withColumn("Amount_paid", F.split(F.col("value"), ",").getItem(7)) \
-    .withColumn("Payment_currency", F.split(F.col("value"), ",").getItem(8)) \
-    .withColumn("Payment_Format", F.split(F.col("value"), ",").getItem(9)) \
-    .withColumn("isLaundering", F.split(F.col("value"), ",").getItem(10))
-
-# Select required columns
-laundering_transactions = laundering_transactions.select("Timestamp", "From_Bank", "Pattern_Type", "isLaundering")
+profiler.start("pattern_parse")
+
+# Parse the BEGIN/END LAUNDERING ATTEMPT blocks in parallel across partitions.
+# Every transaction line is split once and tagged with its Attempt_ID and
+# Pattern_Type (see aml/patterns.py).
+def parse_laundering_patterns():
+    # Select required columns: the full transaction identity plus the attempt tags
+    return parse_patterns(spark, patterns_path).select(
+        *TRANSACTION_COLUMNS, "Attempt_ID", "Pattern_Type", "isLaundering")
+
+laundering_transactions = checkpoints.dataframe(
+    "pattern_parse", parse_laundering_patterns, inputs=["patterns"])
 
 # Display the results
 laundering_transactions.show(5)
 
-laundering_transactions.cache().groupBy("isLaundering").count().show()
+# Every parsed pattern transaction is a laundering one, so a count is enough
+print("Laundering transactions:", laundering_transactions.cache().count())
 
 """Join and Label Transactions"""
 
-# Join the transactions with laundering patterns
-joined_df = li_medium_df.join(
-    laundering_transactions,
-    on=["Timestamp", "From_Bank"],
-    how="left"
-)
+profiler.start("label_join")
 
-# Fill null values in "isLaundering" with 0
-joined_df = joined_df.withColumn(
-    "isLaundering",
-    F.when(F.col("isLaundering").isNull(), 0).otherwise(F.col("isLaundering"))
-)
+# Label the transactions with an exact, broadcast join on a hash of the full
+# transaction identity, so the large table is never shuffled (see aml/labeling.py)
+joined_df = checkpoints.dataframe(
+    "label_join",
+    lambda: label_transactions(li_medium_df, encode_identities(spark, identity_store, laundering_transactions),
+                               label_col="isLaundering"),
+    inputs=["transactions", "pattern_parse", "identities"])
 
-# Convert "isLaundering" to integer
-joined_df = joined_df.withColumn("isLaundering", F.col("isLaundering").cast("integer"))
+# Prove that labeling neither dropped nor duplicated any transaction
+if "label_join" in checkpoints.computed:
+    print("Labeling:", check_labeling(li_medium_df, joined_df, laundering_transactions))
 
 # Display the labeled dataset
 joined_df.show(10)
@@ -124,70 +136,137 @@ joined_df.show(10)
 # Verify the schema change
 joined_df.printSchema()
 
-#size_in_memory_gb = joined_df.rdd.map(lambda row: len(str(row))).sum() / (1024 * 1024 * 1024)
-#print(f"Approximate size in memory: ({size_in_memory_gb:.2f} GB)")
+"""Rolling Velocity Features
 
-"""Check Data Balance"""
+Transaction count, amount and distinct counterparties per sending account
+over the last 1h, 24h and 7d, computed on the full labeled data in one
+sorted window pass. Hub accounts are split into hourly sub-partitions whose
+partial aggregates are merged, so they don't straggle (see aml/velocity.py).
+They are features of the models below.
+"""
 
-# Group by "isLaundering" and count
-joined_df.groupBy("isLaundering").count().show()
+profiler.start("velocity_features")
 
-"""Balance the data
+hot_key_rows = 1_000_000
 
+def add_velocity_features():
+    # Per-account skew of the sender window partitions
+    print("Sender skew:", key_skew(joined_df, ["From_Account"]))
+    print("Sender skew after splitting hot accounts:",
+          key_skew(velocity_partitions(joined_df, "From_Account", hot_key_rows),
+                   ["From_Account", SALT_COLUMN]))
+    return velocity_features(joined_df, account_col="From_Account", counterparty_col="To_Account",
+                             amount_col="Amount_Paid", prefix="Out", hot_key_rows=hot_key_rows)
 
-DROP 50% of majority
+velocity_df = checkpoints.dataframe(
+    "velocity_features", add_velocity_features, inputs=["label_join"],
+    params={"horizons": HORIZONS, "hot_key_rows": hot_key_rows})
+print("Velocity features:", measure_rows(velocity_df, spark))
 
+velocity_columns = [f"Out_{kind}_{horizon}" for horizon in HORIZONS
+                    for kind in ("Count", "Amount", "Counterparties")]
 
-Use SMOTE to generate synthetic data of minority after data engineering
+"""Transaction Graph Motifs
+
+Per-transaction shapes in the account graph, the ones the typologies of the
+patterns file describe: fan-out and fan-in degree, scatter-gather width and
+the shortest time-respecting cycle through the transaction. They are found
+with self-joins on (account, day) that never expand through hub accounts
+(see aml/motifs.py). They are features of the models below, with Hub_Edge
+as a 0/1 integer.
 """
 
-# Register joined_df as a temporary view to use SQL
-joined_df.createOrReplaceTempView("joined_table")
+profiler.start("motif_features")
 
-# Calculate dynamic fraction for desired ratio
-minority_count = joined_df.filter("isLaundering = 1").count()
-majority_count = joined_df.filter("isLaundering = 0").count()
-desired_ratio = 1.5  # Target ratio (majority:minority)
+motif_options = {"window_seconds": 3 * 24 * 3600, "max_cycle_length": 12, "max_degree": 50}
+joined_df = checkpoints.dataframe(
+    "motif_features", lambda: motif_features(velocity_df, **motif_options),
+    inputs=["velocity_features"], params=motif_options)
+
+# The motif stage was the last reader of the velocity rows cached above
+velocity_df.unpersist()
+
+"""Check Data Balance
+
+Class counts, null counts and column statistics all come from one
+aggregation pass (see aml/data_profile.py), stored with the checkpoints.
+"""
+
+velocity_profile = checkpoints.value(
+    "velocity_profile", lambda: profile_dataframe(joined_df, label_col="isLaundering"),
+    inputs=["motif_features"])
+print("Class counts:", velocity_profile["class_counts"])
+class_counts = {entry["label"]: entry["count"] for entry in velocity_profile["class_counts"]}
 
-fraction = (desired_ratio * minority_count) / majority_count
+"""Hold Out Real Rows
 
-# Modify SQL query with the calculated fraction
-query = f"""
-SELECT *
-FROM joined_table
-WHERE NOT ((Pattern_Type IS NULL) AND (isLaundering = 0) AND (rand() < {fraction}))
+A random fifth of the labeled rows is set aside before any resampling. The
+downsampling and SMOTE below never see these rows; the class-weighted model
+further down is evaluated on them, at their real class balance. The flag is
+stored with the rows, so every later stage reads the same split.
 """
-balanced_df = spark.sql(query)
 
+profiler.start("holdout_split")
 
+holdout_fraction = 0.2
+joined_df = checkpoints.dataframe(
+    "holdout_split", lambda: joined_df.select("*", holdout_column(holdout_fraction, seed=43)),
+    inputs=["motif_features"], params={"fraction": holdout_fraction, "seed": 43})
 
-joined_df.unpersist()
+"""Balance the data
+
+
+DROP 50% of majority
 
-balanced_df.cache().groupBy("isLaundering").count().show()
 
-"""Data Cleaning and Exploration"""
+Use SMOTE to generate synthetic data of minority after data engineering
+"""
 
-# Count NULL values in each column
-null_counts = balanced_df.select([sum(col(c).isNull().cast("int")).alias(c) for c in balanced_df.columns])
+profiler.start("downsample")
+
+desired_ratio = 1.5  # Target ratio (majority:minority)
 
-# Show the result
-null_counts.show()
+def downsample():
+    # Register joined_df as a temporary view to use SQL
+    joined_df.createOrReplaceTempView("joined_table")
 
-#Fill Missing Values
-balanced_df = balanced_df.na.fill({
-    "Pattern_Type": "Unknown"
-})
+    # Calculate dynamic fraction for desired ratio from the profiled class counts
+    minority_count = class_counts[1]
+    majority_count = class_counts[0]
 
-"""Extract features such as Hour and DayOfWeek."""
+    fraction = (desired_ratio * minority_count) / majority_count
 
-balanced_df = balanced_df.withColumn("Timestamp", to_timestamp("Timestamp", "yyyy/MM/dd HH:mm")) \
-                         .withColumn("Hour", hour("Timestamp")) \
-                         .withColumn("DayOfWeek", dayofweek("Timestamp"))
+    # Modify SQL query with the calculated fraction; the held-out rows are left out
+    query = f"""
+    SELECT *
+    FROM joined_table
+    WHERE NOT {HOLDOUT_COLUMN}
+      AND NOT ((Pattern_Type IS NULL) AND (isLaundering = 0) AND (rand() < {fraction}))
+    """
+    return spark.sql(query).drop(HOLDOUT_COLUMN)
 
-balanced_df.show()
+balanced_df = checkpoints.dataframe(
+    "downsample", downsample, inputs=["holdout_split"], params={"desired_ratio": desired_ratio})
 
-"""### Feature Engineering
-Aggregated Features by Account using Window Functions:
+"""Data Cleaning and Exploration
+
+One profiling pass gives the class balance, the NULL values of each column
+and their ranges and distinct counts.
+"""
+
+balanced_profile = checkpoints.value(
+    "downsample_profile", lambda: profile_dataframe(balanced_df.cache(), label_col="isLaundering"),
+    inputs=["downsample"])
+print("Class counts:", balanced_profile["class_counts"])
+for column, stats in balanced_profile["columns"].items():
+    print(column, stats)
+
+profiler.start("features")
+
+"""Extract features such as Hour and DayOfWeek.
+
+### Feature Engineering
+Aggregated Features by Account from the incremental account feature store:
 Calculate FanOut, FanIn, and AvgAmountSent.
 
 -FanOut:
@@ -200,122 +279,149 @@ how many different transactions it receives.
 the typical transaction size for each account as a sender.
 """
 
-# Window specifications
-sender_window = Window.partitionBy("From_Account")
-receiver_window = Window.partitionBy("To_Account")
+account_store = "/content/drive/MyDrive/Big data Final Project/LI-Medium_AccountFeatures_IDs"
+
+def engineer_features():
+    #Fill Missing Values
+    filled_df = balanced_df.na.fill({
+        "Pattern_Type": "Unknown"
+    })
+    timed_df = add_time_features(filled_df, "Timestamp")
 
-# Calculate fan-out, fan-in, and average amount sent
-featured_df = balanced_df.withColumn("FanOut", count("To_Account").over(sender_window)) \
-                         .withColumn("FanIn", count("From_Account").over(receiver_window)) \
-                         .withColumn("AvgAmountSent", avg("Amount_Paid").over(sender_window))
+    # Merge any new Date partitions into the per-account feature store. The store
+    # keeps mergeable counts, sums and HyperLogLog sketches, so a new day only
+    # costs an aggregation over that day (see aml/account_features.py)
+    refresh_feature_store(spark, account_store, transactions_store, identity_path=identity_store)
 
+    # Attach fan-out, fan-in, and average amount sent with a broadcast join
+    return join_account_features(timed_df, read_feature_store(spark, account_store))
+
+featured_df = checkpoints.dataframe("features", engineer_features, inputs=["downsample", "transactions"])
+
+featured_df.cache().count()
 balanced_df.unpersist()
-featured_df.cache().show()
+featured_df.show()
 
 """Encode Categorical Variables:
 
-Converted categorical columns into numerical indices using StringIndexer.
+Converted categorical columns into numerical indices with one FusedStringIndexer,
+which learns every vocabulary in a single aggregation pass and applies them in
+one projection. Unseen categories map to a reserved index (see aml/encoding.py).
 """
 
-currency_index = StringIndexer(inputCol="Receiving_Currency", outputCol="CurrencyIndex")
-payment_format_index = StringIndexer(inputCol="Payment_Format", outputCol="PaymentFormatIndex")
-pattern_type_index = StringIndexer(inputCol="Pattern_Type", outputCol="PatternTypeIndex")
+profiler.start("encoding")
+
+category_encoder = FusedStringIndexer(
+    inputCols=["Receiving_Currency", "Payment_Format", "Pattern_Type"],
+    outputCols=["CurrencyIndex", "PaymentFormatIndex", "PatternTypeIndex"])
+category_encoder_model = checkpoints.model(
+    "encoding", lambda: category_encoder.fit(featured_df), inputs=["features"],
+    params={"inputCols": category_encoder.getInputCols(),
+            "outputCols": category_encoder.getOutputCols()})
 
-featured_df = currency_index.fit(featured_df).transform(featured_df)
-featured_df = payment_format_index.fit(featured_df).transform(featured_df)
-featured_df = pattern_type_index.fit(featured_df).transform(featured_df)
+featured_df = category_encoder_model.transform(featured_df)
 
 featured_df.show()
 
 select_col = ["Amount_Received", "FanOut", "FanIn", "AvgAmountSent",
                    "Hour", "DayOfWeek", "CurrencyIndex",
-                   "PaymentFormatIndex", "PatternTypeIndex", "isLaundering"]
+                   "PaymentFormatIndex", "PatternTypeIndex", *velocity_columns, *MOTIF_COLUMNS, "isLaundering"]
 featured_df = featured_df.select(*select_col)
 
-#size_in_memory_gb = featured_df.rdd.map(lambda row: len(str(row))).sum() / (1024 * 1024 * 1024)
-#print(f"Approximate size in memory: ({size_in_memory_gb:.2f} GB)")
-
 """SMOTE to generate synthetic data for minority"""
 
+profiler.start("smote")
+
 # Step 1: Select only the required columns (excluding 'isLaundering')
 feature_columns = ["Amount_Received", "FanOut", "FanIn", "AvgAmountSent",
                    "Hour", "DayOfWeek", "CurrencyIndex",
-                   "PaymentFormatIndex", "PatternTypeIndex"]
-
-# Select features for minority class (isLaundering = 1)
-minority_df = featured_df.filter(F.col("isLaundering") == 1).select(*feature_columns)
-majority_df = featured_df.filter(F.col("isLaundering") == 0).select(*feature_columns, "isLaundering")
-
-featured_df.unpersist()
-
-# Step 2: Define a function to generate synthetic samples (excluding isLaundering)
-def generate_synthetic_samples(minority_data, num_samples=130):
-    synthetic_samples = []
-
-    for row in minority_data:
-        base_vector = np.array([row[col] for col in feature_columns])
-
-        # Find random neighbors within the minority class
-        neighbors = random.sample(minority_data, k=num_samples)
-        for neighbor in neighbors:
-            neighbor_vector = np.array([neighbor[col] for col in feature_columns])
-
-            # Interpolate to create a synthetic sample
-            gap = np.random.rand()
-            synthetic_vector = base_vector + gap * (neighbor_vector - base_vector)
-
-            # Append the synthetic sample without the 'isLaundering' column
-            synthetic_samples.append(tuple(synthetic_vector.tolist()))
-
-    return synthetic_samples
-
-# Step 3: Collect minority samples and generate synthetic samples
-minority_data = minority_df.collect()
-synthetic_samples = generate_synthetic_samples(minority_data, num_samples=130)
-
-# Step 4: Define schema for synthetic samples without 'isLaundering'
-schema = StructType([StructField(col, DoubleType(), True) for col in feature_columns])
-
-# Create synthetic DataFrame from synthetic samples
-synthetic_df = spark.createDataFrame(synthetic_samples, schema=schema)
-
-# Step 5: Add 'isLaundering' column with value 1 to synthetic samples
-synthetic_df = synthetic_df.withColumn("isLaundering", F.lit(1))
-
-# Step 6: Combine the majority and synthetic DataFrames
-balanced_featured_df = majority_df.union(synthetic_df)
-
-# Display counts to confirm balancing
-balanced_featured_df.cache().groupBy("isLaundering").count().show()
-
+                   "PaymentFormatIndex", "PatternTypeIndex", *velocity_columns, *MOTIF_COLUMNS]
+
+smote_samples = 130
+smote_run = {}
+
+def oversample():
+    # Select features for minority class (isLaundering = 1)
+    minority_df = featured_df.filter(F.col("isLaundering") == 1).select(*feature_columns)
+    majority_df = featured_df.filter(F.col("isLaundering") == 0).select(*feature_columns, "isLaundering")
+
+    # Step 2: Generate synthetic samples on the executors (see aml/smote.py).
+    # Neighbours are drawn at random within shuffled partitions; pass
+    # k_neighbors=5 to interpolate towards LSH-bucketed nearest neighbours instead.
+    synthetic_df = smote(minority_df, feature_columns, num_samples=smote_samples, label_col="isLaundering")
+
+    # Step 3: Cache and count the synthetic rows before the union, so the
+    # report covers the generation alone (as in aml/benchmark.py)
+    smote_run["report"] = measure_rows(synthetic_df, spark, label="synthetic_rows")
+    smote_run["synthetic"] = synthetic_df
+    profiler.annotate(rows=smote_run["report"]["synthetic_rows"],
+                      synthetic_rows_per_sec=smote_run["report"]["synthetic_rows_per_sec"])
+
+    # Step 4: Combine the majority and synthetic DataFrames
+    return majority_df.union(synthetic_df)
+
+# Step 5: Store the balanced rows; the profiler's "smote" stage reports the
+# time and bytes it took
+balanced_featured_df = checkpoints.dataframe(
+    "smote", oversample, inputs=["encoding"],
+    params={"num_samples": smote_samples, "feature_columns": feature_columns})
+
+# A rerun that reads the stored rows back generates nothing to report
+if "smote" in checkpoints.computed:
+    print("SMOTE:", smote_run["report"])
+    smote_run["synthetic"].unpersist()
+balanced_featured_df.cache()
 balanced_featured_df.show()
 
-balanced_featured_df.groupBy("isLaundering").count().show()
-
-"""Assemble Features into a Vector:
+"""Profile the Balanced Data:
 
-Use VectorAssembler to create a feature vector for model input.
+One pass confirms the balancing and collects the correlation inputs:
+exact Pearson correlations over all rows, and Spearman correlations with
+95% intervals from a sample stratified by class (expected SMOTE class
+sizes set the sampling fractions; the exact counts set the weights).
 """
 
-features_col = ["Amount_Received", "FanOut", "FanIn", "AvgAmountSent", "Hour", "DayOfWeek", "CurrencyIndex", "PaymentFormatIndex", "PatternTypeIndex"]
+profiler.start("correlation")
+
 correlation_features = ["Amount_Received", "FanOut", "FanIn", "AvgAmountSent", "Hour", "DayOfWeek", "CurrencyIndex", "PaymentFormatIndex", "PatternTypeIndex", "isLaundering"]
-assembler = VectorAssembler(inputCols=correlation_features, outputCol="corr_features")
-df_vector = assembler.transform(balanced_featured_df)
+balanced_counts = {entry["label"]: entry["count"] for entry in balanced_profile["class_counts"]}
+correlation_sample = stratified_fractions(
+    {0: balanced_counts[0], 1: balanced_counts[1] * smote_samples}, sample_rows=200_000)
+smote_profile = checkpoints.value(
+    "smote_profile",
+    lambda: profile_dataframe(balanced_featured_df, label_col="isLaundering",
+                              correlation_columns=correlation_features,
+                              sample_fractions=correlation_sample),
+    inputs=["smote"], params={"sample_fractions": correlation_sample})
+
+# Display counts to confirm balancing
+print("Class counts:", smote_profile["class_counts"])
+featured_df.unpersist()
 
 """Correlation Heatmap:
 
 To assess relationships between features and identify strong predictors,
 """
 
-# Calculate correlation matrix
-correlation_matrix = Correlation.corr(df_vector, "corr_features").head()[0].toArray()
+# Plotting libraries are only loaded here, so the stages above start without them
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+correlation_matrix, correlation_labels = heatmap_inputs(smote_profile, "pearson")
 
 # Convert to a heatmap
 plt.figure(figsize=(10, 8))
-sns.heatmap(correlation_matrix, annot=True, xticklabels=correlation_features, yticklabels=correlation_features, cmap="coolwarm")
+sns.heatmap(correlation_matrix, annot=True, xticklabels=correlation_labels, yticklabels=correlation_labels, cmap="coolwarm")
 plt.title("Correlation Heatmap of Numerical Features")
 plt.show()
 
+# Rank correlations from the stratified sample, for monotonic but non-linear relationships
+spearman_matrix, _ = heatmap_inputs(smote_profile, "spearman")
+plt.figure(figsize=(10, 8))
+sns.heatmap(spearman_matrix, annot=True, xticklabels=correlation_labels, yticklabels=correlation_labels, cmap="coolwarm")
+plt.title(f"Spearman Correlations (sample of {smote_profile['correlation']['sample_rows']} rows)")
+plt.show()
+
 """Key Observations:
 Moderate Correlations:
 
@@ -363,8 +469,11 @@ Regularize the model (e.g., using L1/L2 regularization) to penalize any noise in
 Feature Selection
 """
 
+profiler.start("training")
+
 # Define all features for the final assembler, using scaled and unscaled features
-all_features = [ "FanOut", "AvgAmountSent", "DayOfWeek", "CurrencyIndex", "PaymentFormatIndex", "PatternTypeIndex"]
+all_features = [ "FanOut", "AvgAmountSent", "DayOfWeek", "CurrencyIndex", "PaymentFormatIndex", "PatternTypeIndex",
+                 *velocity_columns, *MOTIF_COLUMNS]
 
 # Assemble the final feature vector for prediction
 assembler_final = VectorAssembler(inputCols=all_features, outputCol="features")
@@ -376,10 +485,10 @@ Split the data into training, validation, and test sets.
 """
 
 train_df, val_df, test_df = balanced_featured_df.randomSplit([0.6, 0.2, 0.2], seed=42)
+train_df.cache().count()
+val_df.cache().count()
+test_df.cache().count()
 balanced_featured_df.unpersist()
-train_df.cache()
-val_df.cache()
-test_df.cache()
 
 """Model Training with Pipeline
 
@@ -406,49 +515,36 @@ pipeline = Pipeline(stages=[assembler_final, rf])
 paramGridSearch = ParamGridBuilder().addGrid(rf.numTrees, [10, 20]).addGrid(rf.maxDepth, [10]).build()
 evaluatorr = BinaryClassificationEvaluator(labelCol="isLaundering", metricName="areaUnderROC")
 crossvalidation = CrossValidator(estimator=pipeline, estimatorParamMaps=paramGridSearch, evaluator=evaluatorr, numFolds=3)
-cvModel = crossvalidation.fit(train_df)
+cvModel = checkpoints.model(
+    "training", lambda: crossvalidation.fit(train_df).bestModel, inputs=["smote"],
+    params={"features": all_features, "grid": {"numTrees": [10, 20], "maxDepth": [10]},
+            "maxBins": 75, "numFolds": 3, "split_seed": 42})
 
 """Evaluate the Model
 
 Evaluate on Validation Data:
 
-Used F1 Score, Area Under ROC metrics to evaluate the model on validation data.
+Used F1 Score, Area Under ROC and PR-AUC to evaluate the model on validation data.
+All metrics of a split come from one aggregation pass (see aml/evaluation.py).
 """
 
-# Evaluate ROC on validation data
-predictions = cvModel.transform(val_df)
-roc_score = evaluatorr.evaluate(predictions)
-print("Area Under ROC Score on validation data:", roc_score)
+profiler.start("evaluation")
 
-# Evaluate F1 Score on validation data
-evaluator_f1 = MulticlassClassificationEvaluator(labelCol="isLaundering", predictionCol="prediction", metricName="f1")
-f1_score = evaluator_f1.evaluate(predictions)
-print("F1 Score on validation data:", f1_score)
+# Evaluate on validation data
+predictions = cvModel.transform(val_df)
+val_report = evaluation_report(predictions, label_col="isLaundering")
+print("Validation data:")
+print(format_report(val_report))
 
 """Final Testing:
 Test the model on the test set to get final performance metrics.
 """
 
-# Evaluate ROC on test data
+# Evaluate on test data
 final_predictions = cvModel.transform(test_df)
-test_roc_score = evaluatorr.evaluate(final_predictions)
-print("Final ROC Score on test data:", test_roc_score)
-
-# Evaluate F1 Score on test data
-test_f1_score = evaluator_f1.evaluate(final_predictions)
-print("Final F1 Score on test data:", test_f1_score)
-
-#evaluate percision and recall
-precision_evaluator = MulticlassClassificationEvaluator(
-    labelCol="isLaundering", predictionCol="prediction", metricName="weightedPrecision")
-recall_evaluator = MulticlassClassificationEvaluator(
-    labelCol="isLaundering", predictionCol="prediction", metricName="weightedRecall")
-
-precision = precision_evaluator.evaluate(final_predictions)
-recall = recall_evaluator.evaluate(final_predictions)
-
-print(f"Precision: {precision}")
-print(f"Recall: {recall}")
+test_report = evaluation_report(final_predictions, label_col="isLaundering")
+print("Test data:")
+print(format_report(test_report))
 
 """Observations
 
@@ -460,62 +556,83 @@ If features or information from the test data inadvertently influenced the train
 Trying again without PatternTypeIndex
 """
 
+profiler.start("training_without_pattern_type")
+
 # Define all features for the final assembler, using scaled and unscaled features
-all_features = [ "FanOut", "AvgAmountSent", "DayOfWeek", "CurrencyIndex", "PaymentFormatIndex"]
+all_features = [ "FanOut", "AvgAmountSent", "DayOfWeek", "CurrencyIndex", "PaymentFormatIndex",
+                 *velocity_columns, *MOTIF_COLUMNS]
 
-# Assemble the final feature vector for prediction
-assembler_final = VectorAssembler(inputCols=all_features, outputCol="features")
+# Category indices, DayOfWeek and the Hub_Edge flag are already small integers
+# and are not binned
+passthrough_features = ["DayOfWeek", "CurrencyIndex", "PaymentFormatIndex", "Hub_Edge"]
 balanced_featured_df = balanced_featured_df.select(all_features + ["isLaundering"])
 
-train_df, val_df, test_df = balanced_featured_df.randomSplit([0.6, 0.2, 0.2], seed=42)
+# Release the splits of the first attempt before making the new ones
+train_df.unpersist()
+val_df.unpersist()
+test_df.unpersist()
 
-rf = RandomForestClassifier(featuresCol="features", labelCol="isLaundering", numTrees=20, maxDepth=10)
-pipeline = Pipeline(stages=[ assembler_final, rf])
+train_df, val_df, test_df = balanced_featured_df.randomSplit([0.6, 0.2, 0.2], seed=42)
+test_df.cache()
 
-# Train the model on the training data
-rf_model = pipeline.fit(train_df)
+search_grid = {"numTrees": [10, 20], "maxDepth": [5, 10], "maxBins": [32, 75]}
+
+def tune_without_pattern_type():
+    # Quantize the continuous features once into at most 75 quantile bins (see
+    # aml/binning.py) and keep the training matrix as compact smallint columns
+    # with a fold ID, instead of a cached vector of doubles per row.
+    continuous_features = [c for c in all_features if c not in passthrough_features]
+    binner = fit_bucketizer(train_df, continuous_features, max_bins=75)
+    binned_features = binner.getOutputCols() + passthrough_features
+    train_folds = binned_matrix(
+        train_df, binner,
+        passthrough_columns=passthrough_features,
+        extra_cols=["isLaundering", fold_column(num_folds=3)],
+        path="/content/drive/MyDrive/Big data Final Project/LI-Medium_TrainBinned.parquet")
+    print("Binned training matrix:", cached_storage_mb(spark))
+
+    # Search the grid with successive halving over the cached folds (see
+    # aml/tuning.py); the winner is refitted on the whole training set.
+    rf = RandomForestClassifier(featuresCol="features", labelCol="isLaundering", numTrees=20, maxDepth=10)
+    paramGridSearch = ParamGridBuilder() \
+        .addGrid(rf.numTrees, search_grid["numTrees"]) \
+        .addGrid(rf.maxDepth, search_grid["maxDepth"]) \
+        .addGrid(rf.maxBins, search_grid["maxBins"]) \
+        .build()
+    tuning = successive_halving(rf, paramGridSearch, train_folds, label_col="isLaundering",
+                                metric="pr_auc", feature_columns=binned_features)
+    print("Best parameters:", tuning["best_params"], "PR-AUC:", tuning["best_metric"])
+    print("Tuning time (s):", tuning["seconds"])
+    for tuning_round in tuning["history"]:
+        print(f"fraction={tuning_round['fraction']:.3f} candidates={len(tuning_round['candidates'])} "
+              f"seconds={tuning_round['seconds']}")
+    train_folds.unpersist()
+
+    return PipelineModel(stages=[
+        binner, VectorAssembler(inputCols=binned_features, outputCol="features"), tuning["model"]])
+
+best_model = checkpoints.model(
+    "training_without_pattern_type", tune_without_pattern_type, inputs=["smote"],
+    params={"features": all_features, "grid": search_grid, "metric": "pr_auc",
+            "numFolds": 3, "split_seed": 42})
+
+profiler.start("evaluation_without_pattern_type")
 
 # Evaluate on validation data
-val_predictions = rf_model.transform(val_df)
-
-# Evaluate ROC on validation data
-evaluator = BinaryClassificationEvaluator(labelCol="isLaundering", metricName="areaUnderROC")
-
-paramGridSearch = ParamGridBuilder().addGrid(rf.numTrees, [10]).addGrid(rf.maxDepth, [10]).build()
-evaluatorr = BinaryClassificationEvaluator(labelCol="isLaundering", metricName="areaUnderROC")
-crossvalidation = CrossValidator(estimator=pipeline, estimatorParamMaps=paramGridSearch, evaluator=evaluatorr, numFolds=2, parallelism=4)
-cvModel = crossvalidation.fit(train_df)
-
-# Evaluate ROC on validation data
-#predictions = cvModel.transform(val_df)
-roc_score = evaluatorr.evaluate(val_predictions)
-print("Area Under ROC Score on validation data:", roc_score)
-
-# Evaluate F1 Score on validation data
-evaluator_f1 = MulticlassClassificationEvaluator(labelCol="isLaundering", predictionCol="prediction", metricName="f1")
-f1_score = evaluator_f1.evaluate(val_predictions)
-print("F1 Score on validation data:", f1_score)
-
-# Evaluate ROC on test data
-final_predictions = cvModel.transform(test_df)
-test_roc_score = evaluatorr.evaluate(final_predictions)
-print("Final ROC Score on test data:", test_roc_score)
+val_predictions = best_model.transform(val_df)
+val_report = evaluation_report(val_predictions, label_col="isLaundering")
+print("Validation data:")
+print(format_report(val_report))
 
-# Evaluate F1 Score on test data
-test_f1_score = evaluator_f1.evaluate(final_predictions)
-print("Final F1 Score on test data:", test_f1_score)
+# Evaluate on test data
+final_predictions = best_model.transform(test_df)
+test_report = evaluation_report(final_predictions, label_col="isLaundering")
+print("Test data:")
+print(format_report(test_report))
 
-#evaluate percision and recall
-precision_evaluator = MulticlassClassificationEvaluator(
-    labelCol="isLaundering", predictionCol="prediction", metricName="weightedPrecision")
-recall_evaluator = MulticlassClassificationEvaluator(
-    labelCol="isLaundering", predictionCol="prediction", metricName="weightedRecall")
-
-precision = precision_evaluator.evaluate(final_predictions)
-recall = recall_evaluator.evaluate(final_predictions)
-
-print(f"Precision: {precision}")
-print(f"Recall: {recall}")
+# Keep both reports, including the alert-budget curves, for comparison between runs
+report_path = "/content/drive/MyDrive/Big data Final Project/reports/evaluation.json"
+write_report(spark, report_path, {"validation": val_report, "test": test_report})
 
 """Metrics Overview
 Validation Data:
@@ -545,7 +662,7 @@ Recall: 0.965
 Suggests the model identified 96.5% of actual positive instances.
 """
 
-rf_model = cvModel.bestModel.stages[-1]  # Access the trained Random Forest model
+rf_model = best_model.stages[-1]  # Access the trained Random Forest model
 importances = rf_model.featureImportances.toArray()
 print("Feature Importances:", importances)
 
@@ -571,11 +688,13 @@ Analyze the predictions
 to ensure the model is not trivially predicting the majority or minority
 """
 
-# Count predicted classes
-final_predictions.groupBy("prediction").count().show()
-
-# Calculate confusion matrix
-final_predictions.crosstab("isLaundering", "prediction").show()
+# Count predicted classes and show the confusion matrix, both taken from the test report
+predicted_counts = {}
+for cell in test_report["confusion_matrix"]:
+    predicted_counts[cell["prediction"]] = predicted_counts.get(cell["prediction"], 0) + cell["count"]
+print("Predicted classes:", predicted_counts)
+for cell in test_report["confusion_matrix"]:
+    print(f"isLaundering={cell['label']} prediction={cell['prediction']}: {cell['count']}")
 
 """Observations
 
@@ -592,6 +711,207 @@ False Negatives (FN): 231,031 (Missed laundering cases).
 which could be critical in real-world anti-money laundering applications.
 """
 
-train_df.unpersist()
-val_df.unpersist()
-test_df.unpersist()
\ No newline at end of file
+"""Class-Weighted Training
+
+Instead of downsampling and 130 synthetic copies of every laundering row,
+train on the real rows and give the Random Forest a per-row weight from
+the class frequencies, balanced within each payment format (see
+aml/weighting.py). The rows are the labeled ones from before the
+downsampling, with the same account features and encoding as above. No
+rows are added, so nothing extra is cached or shuffled. The weighted
+model is evaluated on the rows held out before any resampling;
+`python -m aml.benchmark --compare-balancing` compares both strategies on
+time, cached memory and PR-AUC.
+"""
+
+profiler.start("training_class_weights")
+
+weighted_features = all_features
+
+def weighted_inputs():
+    # All the labeled rows, not the downsampled ones, featured like engineer_features()
+    timed_df = add_time_features(joined_df.na.fill({"Pattern_Type": "Unknown"}), "Timestamp")
+    real_df = join_account_features(timed_df, read_feature_store(spark, account_store))
+    return category_encoder_model.transform(real_df) \
+        .select(*weighted_features, "isLaundering", HOLDOUT_COLUMN)
+
+real_df = checkpoints.dataframe(
+    "weighted_features", weighted_inputs, inputs=["holdout_split", "transactions", "encoding"],
+    params={"features": weighted_features})
+real_train_df = real_df.where(~F.col(HOLDOUT_COLUMN)).drop(HOLDOUT_COLUMN)
+real_test_df = real_df.where(F.col(HOLDOUT_COLUMN)).drop(HOLDOUT_COLUMN)
+real_test_df.cache()
+
+def train_with_class_weights():
+    weights = class_weights(real_train_df, "isLaundering", strata_col="PaymentFormatIndex")
+    print("Class weights by payment format:", weights["strata"])
+
+    continuous_features = [c for c in weighted_features if c not in passthrough_features]
+    binner = fit_bucketizer(real_train_df, continuous_features, max_bins=75)
+    binned_features = binner.getOutputCols() + passthrough_features
+    weighted_matrix = binned_matrix(
+        with_class_weights(real_train_df, weights), binner,
+        passthrough_columns=passthrough_features,
+        extra_cols=["isLaundering", WEIGHT_COLUMN])
+    print("Weighted training matrix:", cached_storage_mb(spark))
+
+    rf = RandomForestClassifier(featuresCol="features", labelCol="isLaundering",
+                                weightCol=WEIGHT_COLUMN, numTrees=20, maxDepth=10)
+    assembler = VectorAssembler(inputCols=binned_features, outputCol="features")
+    model = rf.fit(assembler.transform(weighted_matrix))
+    weighted_matrix.unpersist()
+    return PipelineModel(stages=[binner, assembler, model])
+
+weighted_model = checkpoints.model(
+    "training_class_weights", train_with_class_weights, inputs=["weighted_features"],
+    params={"features": weighted_features, "strata": "PaymentFormatIndex",
+            "numTrees": 20, "maxDepth": 10, "maxBins": 75})
+
+weighted_report = evaluation_report(weighted_model.transform(real_test_df), label_col="isLaundering")
+print("Class-weighted model on real held-out data:")
+print(format_report(weighted_report))
+real_test_df.unpersist()
+
+"""Save the Scoring Model
+
+The fitted category encoder is saved as the first stage of the best model,
+so scoring new data reuses the learned vocabularies instead of refitting.
+"""
+
+profiler.start("export")
+
+model_path = "/content/drive/MyDrive/Big data Final Project/models/aml_rf"
+scoring_model = PipelineModel(stages=[category_encoder_model, *best_model.stages])
+scoring_model.write().overwrite().save(model_path)
+
+"""Save the Streaming Model
+
+The streaming job (aml/streaming.py) keeps only the running counts of every
+account, not its transaction history, so it cannot compute the velocity or
+graph motif features of the model above and refuses it. A second forest is
+trained on the same training rows with only the features the stream can
+compute, and with the parameters chosen by the search above. It is saved
+next to the scoring model for `python -m aml.streaming --model`. Its test
+report shows what the stream gives up against the batch scores.
+"""
+
+profiler.start("training_stream")
+
+def train_stream_model():
+    stream_passthrough = [c for c in STREAM_FEATURES if c in passthrough_features]
+    binner = fit_bucketizer(
+        train_df, [c for c in STREAM_FEATURES if c not in passthrough_features], max_bins=75)
+    binned_features = binner.getOutputCols() + stream_passthrough
+    stream_matrix = binned_matrix(train_df, binner, passthrough_columns=stream_passthrough,
+                                  extra_cols=["isLaundering"])
+
+    best_rf = best_model.stages[-1]
+    rf = RandomForestClassifier(featuresCol="features", labelCol="isLaundering",
+                                numTrees=best_rf.getOrDefault("numTrees"),
+                                maxDepth=best_rf.getOrDefault("maxDepth"),
+                                maxBins=best_rf.getOrDefault("maxBins"))
+    assembler = VectorAssembler(inputCols=binned_features, outputCol="features")
+    model = rf.fit(assembler.transform(stream_matrix))
+    stream_matrix.unpersist()
+    return PipelineModel(stages=[binner, assembler, model])
+
+stream_model = checkpoints.model(
+    "training_stream", train_stream_model, inputs=["smote", "training_without_pattern_type"],
+    params={"features": STREAM_FEATURES, "split_seed": 42, "maxBins": 75})
+
+stream_report = evaluation_report(stream_model.transform(test_df), label_col="isLaundering")
+print("Streaming model on test data:")
+print(format_report(stream_report))
+
+stream_model_path = "/content/drive/MyDrive/Big data Final Project/models/aml_rf_stream"
+PipelineModel(stages=[category_encoder_model, *stream_model.stages]) \
+    .write().overwrite().save(stream_model_path)
+
+"""Compile the Forest for In-Process Scoring
+
+Flatten the trees into NumPy arrays so single payments can be scored without
+a JVM, check that it reproduces Spark's probabilities and measure its latency
+(see aml/scorer.py).
+"""
+
+compiled_path = "/content/drive/MyDrive/Big data Final Project/models/aml_rf_compiled.npz"
+compiled_forest = export_random_forest(best_model)
+compiled_forest.save(compiled_path)
+
+# The compiled forest takes the raw feature values; its thresholds were
+# translated back from the bins
+print("Parity with Spark:", check_parity(compiled_forest, final_predictions,
+                                         feature_columns=compiled_forest.feature_names))
+
+sample_features = np.array([[row[c] for c in compiled_forest.feature_names]
+                            for row in final_predictions.select(*compiled_forest.feature_names)
+                            .limit(10000).collect()], dtype=np.float64)
+print("Compiled scorer:", benchmark(compiled_forest, sample_features))
+
+"""Explain Flagged Transactions
+
+The feature importances above only rank the features over the whole
+training set. TreeSHAP splits the score of every flagged transaction into
+the contribution of each feature, so an analyst can see why it was flagged
+(see aml/explain.py). The contributions of a row add up to its score minus
+the expected score.
+"""
+
+explainer = ForestExplainer(compiled_forest)
+flagged_features = sample_features[compiled_forest.predict_proba(sample_features)[:, 1] >= 0.5]
+print("Expected score:", round(explainer.expected_value, 4))
+print("Explainer:", explain_benchmark(explainer, flagged_features))
+
+reason_names, reason_values = top_contributions(
+    explainer.shap_values(flagged_features[:5]), compiled_forest.feature_names, top_n=3)
+for names, values in zip(reason_names, reason_values):
+    print("  ".join(f"{name}={value:+.3f}" for name, value in zip(names, values)))
+
+"""Account Feature Index
+
+The compiled forest needs each account's FanOut, FanIn and AvgAmountSent,
+which only exist in the feature store's Parquet snapshot. Export the snapshot
+as a sorted, memory-mapped index on local disk, so an in-process scorer can
+look up a batch of accounts without Spark (see aml/account_index.py). The store
+is keyed by account IDs, so the index is too. The velocity and motif features
+belong to the transaction, not the account, and are not in the index.
+"""
+
+account_index_dir = "/content/account_index"
+print("Account index snapshot:", export_account_index(spark, account_store, account_index_dir))
+account_index = AccountIndex(account_index_dir)
+sample_accounts = [row["Account"] for row in
+                   read_feature_store(spark, account_store).select("Account").limit(5).collect()]
+print("Indexed accounts:", account_index.accounts)
+print("Lookup:", account_index.lookup(sample_accounts))
+
+test_df.unpersist()
+
+"""Score a New Day
+
+Score the next day's transactions file with the saved pipeline. The account
+features combine the feature store with the file itself, every Arrow batch is
+scored by the compiled forest, and the top 100 alerts of every bank and day are
+written as Parquet partitioned by date and bank, each with its five largest
+TreeSHAP contributions (see aml/batch_scoring.py). The velocity and motif
+features are computed on the file together with the preceding week of the
+transaction store, with the same motif options as in training.
+"""
+
+new_day_csv = "/content/drive/MyDrive/Big data Final Project/LI-Medium_Trans_NextDay.csv"
+if os.path.exists(new_day_csv):
+    scoring_summary = score_transactions(
+        spark, new_day_csv, model_path, "/content/drive/MyDrive/Big data Final Project/LI-Medium_Alerts",
+        feature_store_path=account_store, compiled_path=compiled_path, top_k=100,
+        transactions_store=transactions_store, motif_options=motif_options, profiler=profiler)
+    print("Batch scoring:", scoring_summary)
+
+# Close the last stage and write the per-stage report
+profile = profiler.finish()
+for stage in profile["stages"]:
+    print(f"{stage['stage']:<32} {stage['seconds']:>9.1f}s  shuffle={stage['shuffle_read_bytes']:>14,}B  "
+          f"spill={stage['disk_spilled_bytes']:>12,}B  gc={stage['gc_ms']:>8,}ms  skew={stage['max_task_skew']}")
+
+# Drop stored stage versions this run no longer uses
+checkpoints.prune()
+print("Checkpoints:", checkpoints.summary())
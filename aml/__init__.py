@@ -0,0 +1,7 @@
+"""Reusable stages for the IBM AML detection pipeline.
+
+The notebook export in ``IBM_Anti-Money_Launderning_Big-Data.py`` walks
+through the analysis top to bottom; the modules in this package hold the
+stages it calls so they can run on executors, be benchmarked and be
+reused outside the notebook.
+"""
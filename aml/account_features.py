@@ -0,0 +1,212 @@
+"""Incremental per-account feature store for FanOut, FanIn and AvgAmountSent.
+
+Instead of two window passes over the full history, the store keeps
+mergeable aggregates per account:
+
+- ``Out_Count`` / ``In_Count``: transactions sent and received,
+- ``Out_Amount``: total ``Amount_Paid`` sent,
+- ``Out_Counterparties`` / ``In_Counterparties``: HyperLogLog sketches of
+  the distinct receivers and senders.
+
+Each batch (one ``Date`` partition of the transaction store) is aggregated
+on its own and merged into the previous snapshot, so a daily refresh costs
+time proportional to the new day plus the number of accounts, not the full
+history. Snapshots are written to new directories and a small ``_CURRENT``
+JSON file points at the live one together with the batches it contains.
+
+With an identity store (see ``aml.identity``) the accounts are aggregated
+by their integer IDs, so the store joins onto encoded transactions. A
+store keeps the keys it was built with; refreshing it with the other kind
+raises ValueError instead of mixing them.
+"""
+
+import json
+
+from pyspark.sql import functions as F
+
+from aml import fs
+from aml.identity import encode_identities
+from aml.ingest import list_dates, read_transactions
+
+CURRENT_FILE = "_CURRENT"
+
+# log2 of the number of HLL buckets; 12 gives about 1.6% relative error
+HLL_LG_CONFIG_K = 12
+
+
+def account_aggregates(transactions_df, sketches=True):
+    """Aggregate transactions into one row of mergeable aggregates per account.
+
+    Every transaction is emitted once for its sender and once for its
+    receiver, so both sides are computed in a single aggregation. Without
+    ``sketches`` only the counts and the amount are computed.
+    """
+    roles = F.explode(F.array(
+        F.struct(F.col("From_Account").alias("Account"), F.lit(True).alias("Outgoing"),
+                 F.col("To_Account").alias("Counterparty"), F.col("Amount_Paid").alias("Amount")),
+        F.struct(F.col("To_Account").alias("Account"), F.lit(False).alias("Outgoing"),
+                 F.col("From_Account").alias("Counterparty"), F.lit(None).alias("Amount")),
+    )).alias("role")
+
+    outgoing = F.col("role.Outgoing")
+    counterparty = F.col("role.Counterparty")
+    aggregates = [
+        F.count(F.when(outgoing, counterparty)).alias("Out_Count"),
+        F.sum(F.when(outgoing, F.col("role.Amount"))).cast("decimal(38,8)").alias("Out_Amount"),
+        F.count(F.when(~outgoing, counterparty)).alias("In_Count"),
+    ]
+    if sketches:
+        aggregates += [
+            F.hll_sketch_agg(F.when(outgoing, counterparty), HLL_LG_CONFIG_K).alias("Out_Counterparties"),
+            F.hll_sketch_agg(F.when(~outgoing, counterparty), HLL_LG_CONFIG_K).alias("In_Counterparties"),
+        ]
+    return transactions_df.select(roles) \
+        .where(F.col("role.Account").isNotNull()) \
+        .groupBy(F.col("role.Account").alias("Account")) \
+        .agg(*aggregates)
+
+
+def merge_aggregates(*aggregates):
+    """Merge several aggregate DataFrames into one row per account.
+
+    The sketches are merged when every input has them and dropped otherwise.
+    """
+    combined = aggregates[0]
+    for other in aggregates[1:]:
+        combined = combined.unionByName(other, allowMissingColumns=True)
+    merged = [
+        F.sum("Out_Count").alias("Out_Count"),
+        F.sum("Out_Amount").cast("decimal(38,8)").alias("Out_Amount"),
+        F.sum("In_Count").alias("In_Count"),
+    ]
+    if all("Out_Counterparties" in df.columns for df in aggregates):
+        merged += [F.hll_union_agg("Out_Counterparties").alias("Out_Counterparties"),
+                   F.hll_union_agg("In_Counterparties").alias("In_Counterparties")]
+    return combined.groupBy("Account").agg(*merged)
+
+
+def _read_current(spark, store_path):
+    text = fs.read_text(spark, f"{store_path.rstrip('/')}/{CURRENT_FILE}")
+    return json.loads(text) if text else {"snapshot": None, "batches": []}
+
+
+def update_feature_store(spark, store_path, batch_df, batch_ids, identity_path=None):
+    """Merge the transactions in ``batch_df`` into the store as a new snapshot.
+
+    ``batch_ids`` names the batches contained in ``batch_df``; batches that
+    are already in the store are rejected with ValueError so that no day is
+    counted twice. ``identity_path`` is the identity store that encoded
+    ``batch_df``, or None for raw account strings.
+    """
+    current = _read_current(spark, store_path)
+    repeated = sorted(set(batch_ids) & set(current["batches"]))
+    if repeated:
+        raise ValueError(f"Batches already in the feature store: {repeated}")
+    if current["snapshot"] is not None and current.get("identities") != identity_path:
+        raise ValueError(f"The feature store at {store_path} is keyed by "
+                         f"{current.get('identities') or 'raw account strings'}; rebuild it "
+                         f"to key it by {identity_path or 'raw account strings'}")
+
+    batch_aggregates = account_aggregates(batch_df)
+    if current["snapshot"] is not None:
+        previous = spark.read.parquet(f"{store_path.rstrip('/')}/{current['snapshot']}")
+        merged = merge_aggregates(previous, batch_aggregates)
+    else:
+        merged = batch_aggregates
+
+    versions = [int(name.split("=", 1)[1]) for name in fs.list_dirs(spark, store_path)
+                if name.startswith("snapshot=")]
+    snapshot = f"snapshot={max(versions, default=-1) + 1:06d}"
+    merged.write.mode("overwrite").parquet(f"{store_path.rstrip('/')}/{snapshot}")
+
+    # The pointer is only moved once the new snapshot is completely written
+    fs.write_text(spark, f"{store_path.rstrip('/')}/{CURRENT_FILE}", json.dumps({
+        "snapshot": snapshot,
+        "batches": sorted(current["batches"] + list(batch_ids)),
+        "identities": identity_path,
+    }))
+
+    # Keep the previous snapshot for readers that are still using it
+    for name in fs.list_dirs(spark, store_path):
+        if name.startswith("snapshot=") and name not in (snapshot, current["snapshot"]):
+            fs.delete(spark, f"{store_path.rstrip('/')}/{name}")
+    return snapshot
+
+
+def refresh_feature_store(spark, store_path, transactions_store, identity_path=None):
+    """Merge every ``Date`` partition of the transaction store not yet in the store.
+
+    With ``identity_path`` the accounts are encoded by that identity store,
+    which must already cover the new dates. Returns the list of dates that
+    were added.
+    """
+    known = set(_read_current(spark, store_path)["batches"])
+    new_dates = [d for d in list_dates(spark, transactions_store) if d not in known]
+    if new_dates:
+        batch_df = read_transactions(
+            spark, transactions_store,
+            columns=["From_Account", "To_Account", "Amount_Paid"],
+            where=F.col("Date").isin(new_dates))
+        if identity_path is not None:
+            batch_df = encode_identities(spark, identity_path, batch_df)
+        update_feature_store(spark, store_path, batch_df, new_dates, identity_path)
+    return new_dates
+
+
+def feature_store_state(spark, store_path):
+    """Return the live ``snapshot``, its ``batches`` and the ``identities`` that key it."""
+    current = _read_current(spark, store_path)
+    return {"snapshot": current["snapshot"], "batches": list(current["batches"]),
+            "identities": current.get("identities")}
+
+
+def read_aggregates(spark, store_path):
+    """Return the mergeable aggregates of the current snapshot, one row per account."""
+    current = _read_current(spark, store_path)
+    if current["snapshot"] is None:
+        raise ValueError(f"No feature store snapshot at {store_path}")
+    return spark.read.parquet(f"{store_path.rstrip('/')}/{current['snapshot']}")
+
+
+def aggregate_features(aggregates_df):
+    """Derive the per-account features from mergeable aggregates.
+
+    ``DistinctReceivers`` and ``DistinctSenders`` are only added when the
+    aggregates carry their sketches.
+    """
+    columns = [
+        "Account",
+        F.col("Out_Count").alias("FanOut"),
+        F.col("In_Count").alias("FanIn"),
+        (F.col("Out_Amount") / F.col("Out_Count")).cast("double").alias("AvgAmountSent"),
+    ]
+    if "Out_Counterparties" in aggregates_df.columns:
+        columns += [F.hll_sketch_estimate("Out_Counterparties").alias("DistinctReceivers"),
+                    F.hll_sketch_estimate("In_Counterparties").alias("DistinctSenders")]
+    return aggregates_df.select(*columns)
+
+
+def read_feature_store(spark, store_path):
+    """Return the current per-account features.
+
+    Columns: ``Account``, ``FanOut``, ``FanIn``, ``AvgAmountSent``,
+    ``DistinctReceivers`` and ``DistinctSenders``.
+    """
+    return aggregate_features(read_aggregates(spark, store_path))
+
+
+def join_account_features(transactions_df, features_df, broadcast=True):
+    """Attach the sender's FanOut/AvgAmountSent and the receiver's FanIn.
+
+    With ``broadcast`` the feature table is broadcast and the transactions
+    are not shuffled; disable it when the account table is too large for
+    the executors' memory.
+    """
+    sender = features_df.select(F.col("Account").alias("From_Account"), "FanOut", "AvgAmountSent")
+    receiver = features_df.select(F.col("Account").alias("To_Account"), "FanIn")
+    if broadcast:
+        sender, receiver = F.broadcast(sender), F.broadcast(receiver)
+
+    return transactions_df.join(sender, on="From_Account", how="left") \
+        .join(receiver, on="To_Account", how="left") \
+        .fillna(0, subset=["FanOut", "FanIn"])
@@ -0,0 +1,333 @@
+"""Memory-mapped account feature index for lookups at scoring time.
+
+The account feature store (``aml.account_features``) is a Parquet snapshot
+that Spark joins onto transactions. A scorer running in its own process
+(``aml.scorer``) cannot join. It needs FanOut, FanIn and AvgAmountSent for
+the accounts of each batch it scores. ``export_account_index`` writes the
+current store snapshot as a flat, sorted index on local disk:
+
+- one file per column: the 64-bit account keys in ascending order
+  (``uint64``), FanOut and FanIn (``int32``) and AvgAmountSent
+  (``float64``, NaN for accounts that never sent). Two million accounts
+  take about 48MB;
+- the keys are the integer IDs of a store keyed through an identity store
+  (see ``aml.identity``). For raw account strings they are a 64-bit hash
+  of the string, and the export fails rather than keep colliding keys.
+
+``AccountIndex`` memory-maps the files. Opening it reads nothing but the
+pointer, and the pages are shared by every process on the machine through
+the page cache. A batch lookup is one ``searchsorted`` over the key file
+plus a gather of the matching rows, so only the looked-up values are
+copied. Accounts missing from the index get the values
+``join_account_features`` gives them: FanOut and FanIn 0, AvgAmountSent
+null (NaN).
+
+Each export writes a new ``index=NNNNNN`` directory, and a small
+``_CURRENT`` JSON file names the live one. The pointer is written to a
+temporary file and renamed over the old one, so readers see either the
+old or the new snapshot, never a partial one. ``AccountIndex.refresh``
+switches a running reader to the new snapshot between batches. The
+previous snapshot is kept for readers that have not switched yet.
+
+Only ``export_account_index`` imports pyspark. Benchmark the lookups on a
+synthetic index with::
+
+    python -m aml.account_index --index /tmp/account_index --benchmark-accounts 2000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+
+CURRENT_FILE = "_CURRENT"
+
+INDEX_VERSION = 1
+
+# Column -> dtype of its file
+INDEX_COLUMNS = {
+    "Key": "uint64",
+    "FanOut": "int32",
+    "FanIn": "int32",
+    "AvgAmountSent": "float64",
+}
+
+FEATURE_COLUMNS = ["FanOut", "FanIn", "AvgAmountSent"]
+
+# Values of accounts missing from the index, as join_account_features fills them
+MISSING_VALUES = {"FanOut": 0, "FanIn": 0, "AvgAmountSent": np.nan}
+
+
+def account_keys(accounts, keyed_by):
+    """Return the 64-bit index keys of ``accounts``.
+
+    ``keyed_by`` is ``"id"`` for the integer IDs of an identity store, or
+    ``"hash"`` for account strings.
+    """
+    if keyed_by == "id":
+        return np.asarray(accounts, dtype=np.int64).astype(np.uint64)
+    # The same hash as pd.util.hash_pandas_object, without building a Series
+    return pd.util.hash_array(np.asarray(accounts, dtype=object), categorize=False)
+
+
+def _read_current(index_dir):
+    path = os.path.join(index_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _snapshots(index_dir):
+    return sorted(name for name in os.listdir(index_dir) if name.startswith("index="))
+
+
+def write_account_index(index_dir, keys, fan_out, fan_in, avg_amount_sent, keyed_by, source=None):
+    """Write the per-account features as a new snapshot and make it the live one.
+
+    ``keys`` are the accounts' ``account_keys``; duplicate keys raise
+    ValueError. ``source`` is recorded in the pointer (the feature store
+    snapshot it came from). Returns the name of the new snapshot.
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    if len(keys) > 1 and (keys[1:] == keys[:-1]).any():
+        raise ValueError(f"{int((keys[1:] == keys[:-1]).sum())} account keys are not unique; "
+                         "key the feature store by an identity store instead")
+    counts = {"FanOut": np.asarray(fan_out)[order], "FanIn": np.asarray(fan_in)[order]}
+    for name, values in counts.items():
+        if len(values) and values.max() > np.iinfo(np.int32).max:
+            raise ValueError(f"{name} does not fit the index's int32 column")
+    columns = {"Key": keys, **counts,
+               "AvgAmountSent": np.asarray(avg_amount_sent, dtype=np.float64)[order]}
+
+    os.makedirs(index_dir, exist_ok=True)
+    previous = _read_current(index_dir)
+    versions = [int(name.split("=", 1)[1]) for name in _snapshots(index_dir)]
+    snapshot = f"index={max(versions, default=-1) + 1:06d}"
+    snapshot_dir = os.path.join(index_dir, snapshot)
+    os.makedirs(snapshot_dir)
+    for name, dtype in INDEX_COLUMNS.items():
+        columns[name].astype(dtype).tofile(os.path.join(snapshot_dir, f"{name}.bin"))
+
+    # Renaming the pointer is atomic, so readers see the old or the new snapshot
+    pointer = os.path.join(index_dir, CURRENT_FILE)
+    with open(f"{pointer}.tmp", "w") as out:
+        json.dump({"snapshot": snapshot, "version": INDEX_VERSION, "accounts": len(keys),
+                   "keyed_by": keyed_by, "columns": INDEX_COLUMNS, "source": source}, out)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(f"{pointer}.tmp", pointer)
+
+    # Keep the previous snapshot for readers that are still using it
+    keep = {snapshot, previous["snapshot"] if previous else None}
+    for name in _snapshots(index_dir):
+        if name not in keep:
+            for file_name in os.listdir(os.path.join(index_dir, name)):
+                os.remove(os.path.join(index_dir, name, file_name))
+            os.rmdir(os.path.join(index_dir, name))
+    return snapshot
+
+
+def export_account_index(spark, store_path, index_dir, force=False):
+    """Export the current snapshot of the account feature store at ``store_path``.
+
+    ``index_dir`` is a local directory. The export is skipped while the
+    index already holds the store's current snapshot, unless ``force``.
+    Returns the name of the live index snapshot.
+    """
+    from pyspark.sql import functions as F
+
+    from aml.account_features import aggregate_features, feature_store_state, read_aggregates
+
+    state = feature_store_state(spark, store_path)
+    source = {"store": store_path, **state}
+    current = _read_current(index_dir)
+    if not force and current is not None and current["source"] == source:
+        return current["snapshot"]
+
+    features = aggregate_features(read_aggregates(spark, store_path)
+                                  .select("Account", "Out_Count", "Out_Amount", "In_Count")) \
+        .where(F.col("Account").isNotNull())
+    # The accounts reach the driver as Arrow batches instead of Row objects
+    arrow_enabled = spark.conf.get("spark.sql.execution.arrow.pyspark.enabled", "false")
+    spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+    try:
+        frame = features.toPandas()
+    finally:
+        spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", arrow_enabled)
+
+    keyed_by = "id" if state["identities"] else "hash"
+    return write_account_index(
+        index_dir, account_keys(frame["Account"], keyed_by), frame["FanOut"].to_numpy(),
+        frame["FanIn"].to_numpy(), frame["AvgAmountSent"].to_numpy(dtype=np.float64, na_value=np.nan),
+        keyed_by, source)
+
+
+class AccountIndex:
+    """Reader of the live snapshot of an account index directory."""
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.snapshot = None
+        if not self.refresh():
+            raise ValueError(f"No account index at {index_dir}")
+
+    def refresh(self):
+        """Switch to the live snapshot if the pointer moved; return True if it did."""
+        current = _read_current(self.index_dir)
+        if current is None or current["snapshot"] == self.snapshot:
+            return False
+        snapshot_dir = os.path.join(self.index_dir, current["snapshot"])
+        rows = current["accounts"]
+        columns = {name: np.memmap(os.path.join(snapshot_dir, f"{name}.bin"), dtype=dtype,
+                                   mode="r", shape=(rows,))
+                   if rows else np.empty(0, dtype=dtype)
+                   for name, dtype in current["columns"].items()}
+        # One assignment, so a lookup uses either the old or the new snapshot
+        self._state = (current, columns)
+        self.snapshot = current["snapshot"]
+        return True
+
+    @property
+    def accounts(self):
+        return self._state[0]["accounts"]
+
+    @property
+    def keyed_by(self):
+        return self._state[0]["keyed_by"]
+
+    def lookup(self, accounts, columns=FEATURE_COLUMNS):
+        """Return ``{column: values}`` for a batch of account strings or IDs."""
+        current, arrays = self._state
+        query = account_keys(accounts, current["keyed_by"])
+        keys = arrays["Key"]
+        if not len(keys):
+            return {name: np.full(len(query), MISSING_VALUES[name],
+                                  dtype=current["columns"][name]) for name in columns}
+        position = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        found = keys[position] == query
+        return {name: np.where(found, arrays[name][position], MISSING_VALUES[name])
+                for name in columns}
+
+    def transaction_features(self, from_accounts, to_accounts):
+        """The sender's FanOut and AvgAmountSent and the receiver's FanIn of a batch.
+
+        These are the columns ``join_account_features`` adds in Spark.
+        """
+        sender = self.lookup(from_accounts, ["FanOut", "AvgAmountSent"])
+        receiver = self.lookup(to_accounts, ["FanIn"])
+        return {"FanOut": sender["FanOut"], "FanIn": receiver["FanIn"],
+                "AvgAmountSent": sender["AvgAmountSent"]}
+
+
+def _rss_mb():
+    """Current resident memory in MB (peak on systems without ``/proc``)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except OSError:
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def synthetic_index(index_dir, num_accounts, seed=42):
+    """Write an index of ``num_accounts`` random IBM-style accounts and return their strings.
+
+    The accounts are 9-digit hex strings like those of the IBM files, with
+    skewed transaction counts.
+    """
+    rng = np.random.default_rng(seed)
+    numbers = np.unique(rng.integers(0x100000000, 0x1000000000, int(num_accounts * 1.01)))
+    numbers = rng.permutation(numbers)[:num_accounts]
+    accounts = np.array([f"{n:09X}" for n in numbers.tolist()], dtype=object)
+    fan_out = rng.zipf(2.0, len(accounts)).clip(max=1_000_000) - 1
+    fan_in = rng.zipf(2.0, len(accounts)).clip(max=1_000_000) - 1
+    avg_amount = np.where(fan_out > 0, rng.lognormal(8, 2, len(accounts)), np.nan)
+    write_account_index(index_dir, account_keys(accounts, "hash"), fan_out, fan_in, avg_amount,
+                        "hash", source={"synthetic_accounts": len(accounts), "seed": seed})
+    return accounts
+
+
+def benchmark(index_dir, accounts, batch_sizes=(1, 100, 10_000), lookups=200_000,
+              unknown_fraction=0.1, seed=42):
+    """Measure the open time, batch lookup latency and resident memory of an index.
+
+    The lookups draw ``accounts`` at random, with ``unknown_fraction`` of
+    them replaced by accounts missing from the index. For every batch size
+    the report has the p50 and p99 latency of one batch in microseconds and
+    the lookups per second, over about ``lookups`` accounts. ``rss_mb``
+    records resident memory before opening, after opening and after all
+    lookups.
+    """
+    rng = np.random.default_rng(seed)
+    rss = {"before_open": _rss_mb()}
+    started = time.perf_counter()
+    index = AccountIndex(index_dir)
+    open_ms = (time.perf_counter() - started) * 1000
+    rss["after_open"] = _rss_mb()
+
+    results = []
+    for batch_size in batch_sizes:
+        batches = max(1, min(lookups // batch_size, 20_000))
+        sample = np.asarray(accounts, dtype=object)[rng.integers(0, len(accounts),
+                                                                 batches * batch_size)]
+        unknown = rng.random(len(sample)) < unknown_fraction
+        sample[unknown] = "UNKNOWN"
+        latencies = []
+        for batch in sample.reshape(batches, batch_size):
+            start = time.perf_counter_ns()
+            index.lookup(batch)
+            latencies.append(time.perf_counter_ns() - start)
+        seconds = sum(latencies) / 1e9
+        results.append({
+            "batch_size": batch_size,
+            "batches": batches,
+            "p50_us": round(float(np.percentile(latencies, 50)) / 1000, 1),
+            "p99_us": round(float(np.percentile(latencies, 99)) / 1000, 1),
+            "lookups_per_sec": round(batches * batch_size / seconds, 1) if seconds else None,
+        })
+    rss["after_lookups"] = _rss_mb()
+
+    index_bytes = sum(os.path.getsize(os.path.join(index_dir, index.snapshot, f"{name}.bin"))
+                      for name in INDEX_COLUMNS)
+    return {
+        "accounts": index.accounts,
+        "index_mb": round(index_bytes / 2 ** 20, 1),
+        "open_ms": round(open_ms, 2),
+        "lookups": results,
+        "rss_mb": rss,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or benchmark the account feature index.")
+    parser.add_argument("--index", required=True, help="local directory of the index")
+    parser.add_argument("--store", help="account feature store to export")
+    parser.add_argument("--force", action="store_true", help="export even if the snapshot is current")
+    parser.add_argument("--benchmark-accounts", type=int,
+                        help="write a synthetic index of this many accounts and benchmark it")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--report", help="output JSON report of the benchmark")
+    args = parser.parse_args(argv)
+
+    if args.store:
+        from pyspark.sql import SparkSession
+
+        spark = SparkSession.builder.appName("AML Account Index Export").getOrCreate()
+        print("Live snapshot:", export_account_index(spark, args.store, args.index, args.force))
+    if args.benchmark_accounts:
+        accounts = synthetic_index(args.index, args.benchmark_accounts)
+        report = benchmark(args.index, accounts, batch_sizes=args.batch_sizes)
+        if args.report:
+            with open(args.report, "w") as out:
+                json.dump(report, out, indent=2)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Batch scoring of a new day's transaction file with the saved model.
+
+``score_transactions`` reads one transactions CSV in the layout of the
+IBM files and writes the alerts of the saved scoring model:
+
+- the saved ``PipelineModel`` is loaded once. Its first stage (the fitted
+  category encoder) maps the currencies and payment formats to the
+  learned indices, and its RandomForest is flattened into a
+  ``CompiledForest`` (see ``aml.scorer``), or read from a saved ``.npz``;
+- FanOut, FanIn and AvgAmountSent are rebuilt for the file: the counts
+  of the account feature store are merged with the counts of the file's
+  own days that the store does not hold yet. The store is only read,
+  and its daily refresh adds the day once the file is ingested;
+- if the forest reads velocity or graph motif features, they are computed
+  on the file together with the recent transactions of the transaction
+  store, so the windows and paths of the file's first hours see the days
+  before it (``file_history_features``);
+- the rows are scored with ``mapInPandas``. Spark ships them to the Python
+  workers as Arrow record batches, and every batch is scored with one
+  vectorized ``predict_proba`` call on the broadcast forest instead of a
+  JVM vector per row;
+- the transactions at or above the threshold are ranked by score within
+  each date and bank, and the top ``top_k`` of every bank are written as
+  Parquet partitioned by ``Date`` and bank. Rescoring a file replaces
+  the partitions of its dates and banks only;
+- every written alert carries ``Reasons``, the ``explain_top_n`` features
+  with the largest TreeSHAP contributions to its score (see
+  ``aml.explain``). Only the alerts are explained, never the whole file.
+
+The summary reports the scoring and explanation throughput in rows/sec
+per core, where the cores are Spark's default parallelism.
+
+Run it with::
+
+    python -m aml.batch_scoring --transactions /data/landing/2022-09-15.csv \\
+        --model /models/aml_rf --feature-store /data/account_features --alerts /data/alerts \\
+        --transactions-store /data/transactions.parquet
+"""
+
+import argparse
+import json
+import time
+from datetime import timedelta
+
+import numpy as np
+from pyspark.ml import PipelineModel
+from pyspark.sql import SparkSession, Window
+from pyspark.sql import functions as F
+from pyspark.sql.types import DoubleType, StructField, StructType
+
+from aml.account_features import (account_aggregates, aggregate_features, feature_store_state,
+                                  join_account_features, merge_aggregates, read_aggregates)
+from aml.explain import REASONS_COLUMN, ForestExplainer, explain_alerts
+from aml.features import add_missing_columns, add_time_features
+from aml.identity import decode_identities
+from aml.ingest import (AMOUNT_COLUMNS, RAW_SCHEMA, TRANSACTION_COLUMNS, cast_transactions,
+                        read_transactions)
+from aml.labeling import KEY_COLUMN, transaction_key
+from aml.motifs import MOTIF_COLUMNS, WINDOW_SECONDS, motif_features
+from aml.scorer import CompiledForest, export_random_forest
+from aml.velocity import HORIZONS, velocity_columns, velocity_features
+
+SCORE_COLUMN = "Score"
+RANK_COLUMN = "Rank"
+
+_HISTORY = "_history"
+
+ALERT_COLUMNS = [KEY_COLUMN, *TRANSACTION_COLUMNS, "FanOut", "FanIn", "AvgAmountSent"]
+
+
+def read_transaction_file(spark, csv_path):
+    """Read a transactions CSV with typed columns, ``Transaction_Key`` and ``Date``."""
+    return cast_transactions(spark.read.csv(csv_path, schema=RAW_SCHEMA, header=True)) \
+        .withColumn(KEY_COLUMN, transaction_key()) \
+        .withColumn("Date", F.to_date("Timestamp"))
+
+
+def file_account_features(spark, transactions_df, feature_store_path=None):
+    """Per-account FanOut, FanIn and AvgAmountSent including the file's transactions.
+
+    The file's days that the store already holds are not counted again. A
+    store keyed by account IDs is mapped back to the account strings of
+    the file through the identity store it records.
+    """
+    if feature_store_path is None:
+        return aggregate_features(account_aggregates(transactions_df, sketches=False))
+
+    state = feature_store_state(spark, feature_store_path)
+    history = read_aggregates(spark, feature_store_path) \
+        .select("Account", "Out_Count", "Out_Amount", "In_Count")
+    if state["identities"]:
+        history = decode_identities(spark, state["identities"], history, {"account": ["Account"]})
+    new_rows = transactions_df.where(~F.col("Date").cast("string").isin(state["batches"]))
+    return aggregate_features(merge_aggregates(
+        history, account_aggregates(new_rows, sketches=False)))
+
+
+def file_history_features(spark, transactions_df, feature_names, transactions_store=None,
+                          motif_options=None):
+    """Add the velocity and motif features among ``feature_names`` to the file's rows.
+
+    Both look back in time: the velocity windows over the longest horizon
+    and the motif paths over two motif windows. With
+    ``transactions_store`` the store's transactions of that period before
+    the file, on days the file does not hold, are added as context rows
+    and dropped after the features are computed. Without it the windows
+    only see the file. ``motif_options`` must match the options the
+    motifs were trained with.
+    """
+    velocity = bool(set(feature_names) & set(velocity_columns()))
+    motifs = bool(set(feature_names) & set(MOTIF_COLUMNS))
+    if not (velocity or motifs):
+        return transactions_df
+    motif_options = motif_options or {}
+    lookback = max(HORIZONS.values()) if velocity else 0
+    if motifs:
+        lookback = max(lookback, 2 * motif_options.get("window_seconds", WINDOW_SECONDS))
+
+    rows = transactions_df.withColumn(_HISTORY, F.lit(False))
+    bounds = None
+    if transactions_store is not None:
+        bounds = transactions_df.agg(
+            F.min("Timestamp").alias("start"), F.max("Timestamp").alias("end"),
+            F.collect_set(F.col("Date").cast("string")).alias("dates")).first()
+    if bounds is not None and bounds["start"] is not None:
+        since = bounds["start"] - timedelta(seconds=lookback)
+        days = F.col("Date").between(F.lit(since.date()), F.lit(bounds["end"].date())) \
+            & ~F.col("Date").cast("string").isin(bounds["dates"])
+        history = read_transactions(spark, transactions_store, columns=TRANSACTION_COLUMNS,
+                                    where=days) \
+            .where(F.col("Timestamp") >= F.lit(since)) \
+            .withColumn(KEY_COLUMN, transaction_key()) \
+            .withColumn("Date", F.to_date("Timestamp"))
+        rows = rows.unionByName(history.withColumn(_HISTORY, F.lit(True)))
+
+    if velocity:
+        rows = velocity_features(rows)
+    if motifs:
+        rows = motif_features(rows, **motif_options)
+    return rows.where(~F.col(_HISTORY)).drop(_HISTORY)
+
+
+def load_scorer(model_path, compiled_path=None):
+    """Return the saved ``PipelineModel`` and its forest as a ``CompiledForest``."""
+    model = PipelineModel.load(model_path)
+    forest = CompiledForest.load(compiled_path) if compiled_path else export_random_forest(model)
+    return model, forest
+
+
+def score_with_forest(spark, df, forest, score_col=SCORE_COLUMN):
+    """Add the forest's probability of the positive class as ``score_col``.
+
+    ``df`` must hold the forest's ``feature_names`` as numeric columns;
+    nulls are scored as NaN, which takes the right branch of every split.
+    The forest is broadcast once and every Arrow batch is scored with one
+    vectorized call; ``spark.sql.execution.arrow.maxRecordsPerBatch`` sets
+    the batch size.
+    """
+    feature_names = forest.feature_names
+    forest_broadcast = spark.sparkContext.broadcast(forest)
+
+    def score(batches):
+        scorer = forest_broadcast.value
+        for batch in batches:
+            X = batch[feature_names].to_numpy(dtype=np.float64, na_value=np.nan)
+            yield batch.assign(**{score_col: scorer.predict_proba(X)[:, 1]})
+
+    schema = StructType(df.schema.fields + [StructField(score_col, DoubleType(), False)])
+    return df.mapInPandas(score, schema)
+
+
+def rank_alerts(scored_df, threshold=0.5, top_k=None, bank_col="From_Bank",
+                score_col=SCORE_COLUMN):
+    """Keep the rows scored at or above ``threshold`` and rank them per date and bank.
+
+    ``Rank`` 1 is the highest score of the bank on that day; ties are
+    broken by the transaction key so reruns rank identically. With
+    ``top_k`` only the first ``top_k`` of every bank and day are kept.
+    """
+    order = Window.partitionBy("Date", bank_col) \
+        .orderBy(F.col(score_col).desc(), F.col(KEY_COLUMN))
+    alerts = scored_df.where(F.col(score_col) >= threshold) \
+        .withColumn(RANK_COLUMN, F.row_number().over(order))
+    if top_k is not None:
+        alerts = alerts.where(F.col(RANK_COLUMN) <= top_k)
+    return alerts
+
+
+def score_transactions(spark, transactions_csv, model_path, alerts_path, feature_store_path=None,
+                       compiled_path=None, threshold=0.5, top_k=100, bank_col="From_Bank",
+                       explain_top_n=5, transactions_store=None, motif_options=None,
+                       profiler=None):
+    """Score the transactions of ``transactions_csv`` and write the ranked alerts.
+
+    ``bank_col`` is the bank the alerts are partitioned and ranked by.
+    With ``explain_top_n`` set, the alerts get their top contributing
+    features as ``Reasons``. ``transactions_store`` and ``motif_options``
+    are only used by forests that read velocity or motif features (see
+    ``file_history_features``). Pass a ``StageProfiler`` to record the
+    ``load_model``, ``account_features``, ``history_features`` (when
+    needed), ``scoring``, ``alerts``, ``explanations`` and
+    ``write_alerts`` stages. Returns the row and alert counts, and the
+    seconds and rows/sec per core of the scoring, the explanations and the
+    whole run.
+    """
+    def start(name):
+        if profiler is not None:
+            profiler.start(name)
+
+    started = time.perf_counter()
+    start("load_model")
+    model, forest = load_scorer(model_path, compiled_path)
+    encoder = model.stages[0]
+
+    start("account_features")
+    transactions = read_transaction_file(spark, transactions_csv)
+    features = file_account_features(spark, transactions, feature_store_path).cache()
+    accounts = features.count()
+
+    history_columns = set(velocity_columns()) | set(MOTIF_COLUMNS)
+    if history_columns & set(forest.feature_names):
+        start("history_features")
+        transactions = file_history_features(spark, transactions, forest.feature_names,
+                                             transactions_store, motif_options).cache()
+        transactions.count()
+
+    start("scoring")
+    scoring_started = time.perf_counter()
+    # Amounts travel to the Python workers as doubles, as in the streaming alerts
+    prepared = encoder.transform(add_time_features(add_missing_columns(
+        join_account_features(transactions, features), encoder.getInputCols()))) \
+        .withColumns({c: F.col(c).cast("double") for c in AMOUNT_COLUMNS})
+    scored = score_with_forest(
+        spark, prepared.select(*ALERT_COLUMNS, "Date",
+                               *[c for c in forest.feature_names if c not in ALERT_COLUMNS]),
+        forest).cache()
+    rows = scored.count()
+    scoring_seconds = time.perf_counter() - scoring_started
+    features.unpersist()
+    transactions.unpersist()
+
+    start("alerts")
+    ranked = rank_alerts(scored, threshold, top_k, bank_col).cache()
+    alert_rows = ranked.count()
+    alerts = ranked.select(*ALERT_COLUMNS, SCORE_COLUMN, RANK_COLUMN, "Date")
+
+    explain_seconds = None
+    if explain_top_n:
+        start("explanations")
+        explain_started = time.perf_counter()
+        # The ranked alerts still hold the forest's features
+        alerts = explain_alerts(spark, ranked, ForestExplainer(forest), explain_top_n) \
+            .select(*alerts.columns, REASONS_COLUMN).cache()
+        alerts.count()
+        explain_seconds = time.perf_counter() - explain_started
+
+    start("write_alerts")
+    # One task per date and bank, so every partition directory gets a single file
+    alerts.repartition("Date", bank_col).write.mode("overwrite") \
+        .option("partitionOverwriteMode", "dynamic") \
+        .partitionBy("Date", bank_col).parquet(alerts_path)
+    alerts.unpersist()
+    ranked.unpersist()
+    scored.unpersist()
+    if profiler is not None:
+        profiler.stop()
+
+    seconds = time.perf_counter() - started
+    cores = spark.sparkContext.defaultParallelism
+    return {
+        "rows": rows,
+        "accounts": accounts,
+        "alerts": alert_rows,
+        "threshold": threshold,
+        "top_k": top_k,
+        "cores": cores,
+        "scoring_seconds": round(scoring_seconds, 3),
+        "scoring_rows_per_sec_per_core": round(rows / scoring_seconds / cores, 1)
+        if scoring_seconds else None,
+        "explain_seconds": round(explain_seconds, 3) if explain_seconds is not None else None,
+        "explain_rows_per_sec_per_core": round(alert_rows / explain_seconds / cores, 1)
+        if explain_seconds else None,
+        "seconds": round(seconds, 3),
+        "rows_per_sec_per_core": round(rows / seconds / cores, 1) if seconds else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a day of transactions and write alerts.")
+    parser.add_argument("--transactions", required=True, help="transactions CSV to score")
+    parser.add_argument("--model", required=True, help="saved scoring PipelineModel")
+    parser.add_argument("--alerts", required=True, help="Parquet directory for alerts")
+    parser.add_argument("--feature-store", help="account feature store with the history")
+    parser.add_argument("--transactions-store",
+                        help="ingested transaction store, the history of the velocity and motifs")
+    parser.add_argument("--motif-options", type=json.loads,
+                        help='motif options of the model, e.g. \'{"window_seconds": 259200}\'')
+    parser.add_argument("--compiled", help="compiled forest (.npz); exported from --model if omitted")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--top-k", type=int, default=100, help="alerts kept per bank and day")
+    parser.add_argument("--bank-column", default="From_Bank")
+    parser.add_argument("--explain-top-n", type=int, default=5,
+                        help="top contributing features attached to each alert (0 disables)")
+    args = parser.parse_args(argv)
+
+    spark = SparkSession.builder.appName("Anti-Money Laundering Batch Scoring").getOrCreate()
+    summary = score_transactions(
+        spark, args.transactions, args.model, args.alerts,
+        feature_store_path=args.feature_store, compiled_path=args.compiled,
+        threshold=args.threshold, top_k=args.top_k, bank_col=args.bank_column,
+        explain_top_n=args.explain_top_n, transactions_store=args.transactions_store,
+        motif_options=args.motif_options)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+"""Scale benchmark of the pipeline on synthetic data.
+
+``run_benchmark`` generates an IBM-format dataset for every requested row
+count (see ``aml.synthetic``) and runs the pipeline stages on it:
+
+ingest, pattern parse, label join, velocity features, downsample, account
+features, encoding, SMOTE, training and evaluation, and optionally the
+graph motif features (see ``aml.motifs``).
+
+It records each stage with ``aml.profiling.StageProfiler``, so every scale
+gets the full per-stage metrics. The combined report adds a scaling curve
+for each stage: seconds and rows/sec at every scale, and the exponent of
+a power-law fit (1.0 means linear scaling).
+
+A random share of the labeled rows is held out before any downsampling or
+oversampling, so every run is evaluated on untouched rows at the natural
+class ratio. ``compare_balancing`` runs the pipeline once per imbalance
+strategy on the same dataset: downsampling plus SMOTE, or per-row class
+weights (see ``aml.weighting``). It compares their training time, cached
+memory and PR-AUC. ``compare_features`` does the same for the feature
+sets: the base account and categorical features, plus the velocity
+features, plus the graph motifs. ``scoring_throughput`` trains once and
+measures the batch scoring of a generated day file (see
+``aml.batch_scoring``) in rows/sec per core. It also checks that
+explaining the day's alerts fits a time budget, and how many alerts the
+measured rate would explain in it.
+
+Run it in local mode on any machine::
+
+    python -m aml.benchmark --work-dir /tmp/aml-bench --scales 100000 1000000 10000000
+    python -m aml.benchmark --work-dir /tmp/aml-bench --scales 1000000 --compare-balancing
+    python -m aml.benchmark --work-dir /tmp/aml-bench --scales 1000000 --compare-features
+    python -m aml.benchmark --work-dir /tmp/aml-bench --scales 1000000 --score-day-rows 2000000
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+from pyspark.ml import PipelineModel
+from pyspark.ml.classification import RandomForestClassifier
+from pyspark.ml.feature import VectorAssembler
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+
+from aml import fs
+from aml.account_features import join_account_features, read_feature_store, refresh_feature_store
+from aml.batch_scoring import score_transactions
+from aml.binning import binned_matrix, fit_bucketizer
+from aml.encoding import FusedStringIndexer
+from aml.evaluation import evaluation_report
+from aml.explain import alerts_in_budget
+from aml.features import add_time_features
+from aml.identity import dictionary_sizes, encode_identities, refresh_dictionaries
+from aml.ingest import TRANSACTION_COLUMNS, ingest_transactions, read_transactions
+from aml.labeling import label_transactions
+from aml.metrics import cached_storage_mb, measure_rows
+from aml.motifs import MOTIF_COLUMNS, motif_features
+from aml.patterns import parse_patterns
+from aml.profiling import StageProfiler
+from aml.smote import smote
+from aml.synthetic import generate_dataset
+from aml.tuning import HOLDOUT_COLUMN, holdout_column
+from aml.velocity import velocity_columns, velocity_features
+from aml.weighting import WEIGHT_COLUMN, class_weights, with_class_weights
+
+BASE_FEATURES = ["FanOut", "AvgAmountSent", "DayOfWeek", "CurrencyIndex", "PaymentFormatIndex"]
+
+MODEL_FEATURES = BASE_FEATURES + velocity_columns()
+
+# Features that are already small integers and are not binned
+PASSTHROUGH_FEATURES = ["DayOfWeek", "CurrencyIndex", "PaymentFormatIndex", "Hub_Edge"]
+
+# The day after the 14 days that generate_dataset covers by default
+SCORING_DAY = "2022/09/15"
+
+# Imbalance strategies of compare_balancing, as run_pipeline options
+BALANCING_MODES = {
+    "smote": {"balancing": "smote"},
+    "class_weights": {"balancing": "weights", "desired_ratio": None},
+    "class_weights_by_payment_format": {"balancing": "weights", "desired_ratio": None,
+                                        "weight_strata": "PaymentFormatIndex"},
+}
+
+# Feature sets of compare_features, as run_pipeline options
+FEATURE_SETS = {
+    "base": {"model_features": BASE_FEATURES},
+    "velocity": {"model_features": MODEL_FEATURES},
+    "velocity_motifs": {"model_features": MODEL_FEATURES + MOTIF_COLUMNS, "motif_options": {}},
+}
+
+
+def _materialize(df):
+    """Cache and count ``df`` so its cost is charged to the current stage."""
+    df = df.cache()
+    return df, df.count()
+
+
+def run_pipeline(spark, transactions_csv, patterns_path, work_dir, profiler,
+                 desired_ratio=1.5, smote_samples=10, num_trees=20, max_depth=10,
+                 balancing="smote", weight_strata=None, test_fraction=0.2, encode_ids=True,
+                 motif_options=None, model_features=None, model_path=None, seed=42):
+    """Run the pipeline stages on one dataset, one profiler stage each.
+
+    ``balancing="smote"`` oversamples the minority of the training rows
+    with ``smote_samples`` synthetic rows each. ``balancing="weights"``
+    trains on the real rows with class weights instead, stratified by
+    ``weight_strata`` when given. ``desired_ratio=None`` skips the
+    downsampling of the majority. ``test_fraction`` of the labeled rows is
+    held out from all of this and used for the evaluation. With
+    ``encode_ids`` accounts and banks are replaced by dictionary IDs right
+    after ingestion (see ``aml.identity``). With ``motif_options`` (a dict
+    of ``motif_features`` options, possibly empty) the graph motifs are
+    computed as their own stage after the velocity features.
+    ``model_features`` are the columns the forest is trained on; they
+    default to ``MODEL_FEATURES``, plus ``MOTIF_COLUMNS`` when the motifs
+    are computed. With ``model_path`` the encoder, binner and forest are
+    saved there as one scoring ``PipelineModel`` (see
+    ``aml.batch_scoring``).
+
+    Intermediate results are cached and counted inside their own stage and
+    released once the next stage has materialized. Returns the evaluation
+    report of the held-out rows.
+    """
+    if balancing not in ("smote", "weights"):
+        raise ValueError(f"Unknown balancing mode: {balancing}")
+    if model_features is None:
+        model_features = MODEL_FEATURES + (MOTIF_COLUMNS if motif_options is not None else [])
+    if motif_options is None and set(model_features) & set(MOTIF_COLUMNS):
+        raise ValueError("The motif features need motif_options")
+    transactions_store = f"{work_dir}/transactions.parquet"
+    account_store = f"{work_dir}/account_features"
+    identity_store = f"{work_dir}/identities" if encode_ids else None
+    fs.delete(spark, account_store)
+
+    profiler.start("ingest")
+    ingest_transactions(spark, transactions_csv, transactions_store, force=True)
+    transactions = read_transactions(spark, transactions_store, columns=TRANSACTION_COLUMNS)
+    profiler.annotate(rows=transactions.count())
+
+    if encode_ids:
+        profiler.start("identity_encoding")
+        fs.delete(spark, identity_store)
+        refresh_dictionaries(spark, identity_store, transactions_store)
+        transactions = encode_identities(spark, identity_store, transactions)
+        profiler.annotate(**{f"{name}_ids": size
+                             for name, size in dictionary_sizes(spark, identity_store).items()})
+
+    profiler.start("pattern_parse")
+    laundering = parse_patterns(spark, patterns_path).select(
+        *TRANSACTION_COLUMNS, "Attempt_ID", "Pattern_Type", "isLaundering")
+    if encode_ids:
+        laundering = encode_identities(spark, identity_store, laundering)
+    laundering, rows = _materialize(laundering)
+    profiler.annotate(rows=rows)
+
+    profiler.start("label_join")
+    labeled, rows = _materialize(label_transactions(transactions, laundering))
+    profiler.annotate(rows=rows)
+    laundering.unpersist()
+
+    profiler.start("velocity_features")
+    velocity, rows = _materialize(velocity_features(labeled)
+                                  .select("*", holdout_column(test_fraction, seed + 1)))
+    profiler.annotate(rows=rows)
+    labeled.unpersist()
+
+    if motif_options is not None:
+        profiler.start("motif_features")
+        previous = velocity
+        velocity, rows = _materialize(motif_features(velocity, **motif_options))
+        profiler.annotate(rows=rows)
+        previous.unpersist()
+
+    balanced = velocity
+    if desired_ratio is not None:
+        profiler.start("downsample")
+        counts = {(row[HOLDOUT_COLUMN], row["isLaundering"]): row["count"]
+                  for row in velocity.groupBy(HOLDOUT_COLUMN, "isLaundering").count().collect()}
+        minority_count = counts.get((False, 1), 0)
+        keep = min(1.0, desired_ratio * minority_count / max(1, counts.get((False, 0), 0)))
+        balanced, rows = _materialize(velocity.where(
+            F.col(HOLDOUT_COLUMN) | (F.col("isLaundering") == 1) | (F.rand(seed) < keep)))
+        profiler.annotate(rows=rows)
+        velocity.unpersist()
+
+    profiler.start("features")
+    refresh_feature_store(spark, account_store, transactions_store, identity_path=identity_store)
+    featured, rows = _materialize(join_account_features(
+        add_time_features(balanced), read_feature_store(spark, account_store)))
+    profiler.annotate(rows=rows)
+    balanced.unpersist()
+
+    profiler.start("encoding")
+    encoder = FusedStringIndexer(inputCols=["Receiving_Currency", "Payment_Format"],
+                                 outputCols=["CurrencyIndex", "PaymentFormatIndex"]).fit(featured)
+    encoded, rows = _materialize(
+        encoder.transform(featured).select(*model_features, "isLaundering", HOLDOUT_COLUMN))
+    profiler.annotate(rows=rows)
+    featured.unpersist()
+
+    train_rows = encoded.where(~F.col(HOLDOUT_COLUMN)).drop(HOLDOUT_COLUMN)
+    test_df = encoded.where(F.col(HOLDOUT_COLUMN)).drop(HOLDOUT_COLUMN)
+    if balancing == "smote":
+        profiler.start("smote")
+        minority = train_rows.where(F.col("isLaundering") == 1).select(*model_features)
+        synthetic = smote(minority, model_features, num_samples=smote_samples,
+                          label_col="isLaundering", seed=seed)
+        # The same report as the notebook's: the synthetic rows alone, before the union
+        smote_report = measure_rows(synthetic, spark, label="synthetic_rows")
+        profiler.annotate(rows=smote_report["synthetic_rows"],
+                          synthetic_rows_per_sec=smote_report["synthetic_rows_per_sec"])
+        train_df = train_rows.where(F.col("isLaundering") == 0).unionByName(synthetic)
+        extra_cols, weight_col = ["isLaundering"], None
+    else:
+        profiler.start("class_weights")
+        weights = class_weights(train_rows, "isLaundering", strata_col=weight_strata)
+        profiler.annotate(weights=weights["strata"] or weights["classes"])
+        synthetic = None
+        train_df = with_class_weights(train_rows, weights)
+        extra_cols, weight_col = ["isLaundering", WEIGHT_COLUMN], WEIGHT_COLUMN
+
+    profiler.start("training")
+    passthrough = [c for c in model_features if c in PASSTHROUGH_FEATURES]
+    binner = fit_bucketizer(train_df, [c for c in model_features if c not in passthrough])
+    binned_features = binner.getOutputCols() + passthrough
+    matrix = binned_matrix(train_df, binner, passthrough, extra_cols=extra_cols)
+    assembler = VectorAssembler(inputCols=binned_features, outputCol="features")
+    rf = RandomForestClassifier(featuresCol="features", labelCol="isLaundering",
+                                numTrees=num_trees, maxDepth=max_depth, seed=seed)
+    if weight_col is not None:
+        rf.setWeightCol(weight_col)
+    model = rf.fit(assembler.transform(matrix))
+    profiler.annotate(rows=matrix.count(),
+                      training_cached_memory_mb=cached_storage_mb(spark)["cached_memory_mb"])
+    matrix.unpersist()
+    if model_path is not None:
+        PipelineModel(stages=[encoder, binner, assembler, model]).write().overwrite().save(model_path)
+
+    profiler.start("evaluation")
+    predictions = model.transform(assembler.transform(binner.transform(test_df)))
+    report = evaluation_report(predictions, label_col="isLaundering")
+    profiler.annotate(rows=report["rows"])
+    encoded.unpersist()
+    if synthetic is not None:
+        synthetic.unpersist()
+    profiler.stop()
+    return report
+
+
+def scaling_curves(runs):
+    """Per-stage seconds and rows/sec across scales, with a power-law exponent.
+
+    ``runs`` maps the dataset row count to the profiler report of that
+    scale. The exponent is the slope of log(seconds) against log(rows).
+    """
+    curves = {}
+    for scale in sorted(runs):
+        for stage in runs[scale]["stages"]:
+            curves.setdefault(stage["stage"], []).append({
+                "scale": scale,
+                "seconds": stage["seconds"],
+                "rows_per_sec": round(scale / stage["seconds"], 1) if stage["seconds"] else None,
+            })
+
+    result = {}
+    for name, points in curves.items():
+        usable = [p for p in points if p["seconds"] > 0]
+        exponent = None
+        if len(usable) >= 2:
+            exponent = round(float(np.polyfit(np.log([p["scale"] for p in usable]),
+                                              np.log([p["seconds"] for p in usable]), 1)[0]), 3)
+        result[name] = {"points": points, "exponent": exponent}
+    return result
+
+
+def dataset(work_dir, scale, generator_options=None):
+    """Generate the dataset of ``scale`` rows under ``work_dir``, unless it is up to date.
+
+    Returns the scale's directory, the transactions and patterns paths,
+    and the generator's summary, or None when the existing files were kept.
+    """
+    generator_options = generator_options or {}
+    scale_dir = os.path.join(work_dir, f"rows={scale}")
+    os.makedirs(scale_dir, exist_ok=True)
+    transactions_csv = os.path.join(scale_dir, "Trans.csv")
+    patterns_path = os.path.join(scale_dir, "Patterns.txt")
+    params_path = os.path.join(scale_dir, "generator.json")
+
+    generated = None
+    params = json.dumps({"num_rows": scale, **generator_options}, sort_keys=True)
+    if not (os.path.exists(params_path) and open(params_path).read() == params):
+        generated = generate_dataset(transactions_csv, patterns_path, num_rows=scale,
+                                     **generator_options)
+        with open(params_path, "w") as out:
+            out.write(params)
+    return scale_dir, transactions_csv, patterns_path, generated
+
+
+def compare_balancing(spark, transactions_csv, patterns_path, work_dir, modes=BALANCING_MODES,
+                      pipeline_options=None, report_path=None):
+    """Run the pipeline once per imbalance strategy and compare cost and quality.
+
+    ``modes`` maps a name to ``run_pipeline`` options (see
+    ``BALANCING_MODES``); ``pipeline_options`` are shared by all of them.
+    Every mode uses the same seed and so the same held-out rows. Each mode
+    reports the total and training seconds, the rows trained on, the
+    largest cached memory of any stage, and the PR-AUC and ROC-AUC on the
+    held-out rows. The ``runs`` hold the full profiler reports.
+    """
+    runs, comparison = {}, {}
+    for name, options in modes.items():
+        profiler = StageProfiler(spark, run_name=f"balancing={name}")
+        evaluation = run_pipeline(spark, transactions_csv, patterns_path, work_dir, profiler,
+                                  **{**(pipeline_options or {}), **options})
+        runs[name] = profiler.finish()
+        stages = {stage["stage"]: stage for stage in runs[name]["stages"]}
+        comparison[name] = {
+            "total_seconds": runs[name]["total_seconds"],
+            "training_seconds": stages["training"]["seconds"],
+            "training_rows": stages["training"]["rows"],
+            "peak_cached_memory_mb": max(
+                [stage["cached_memory_mb"] for stage in stages.values()]
+                + [stages["training"]["training_cached_memory_mb"]]),
+            "pr_auc": evaluation["pr_auc"],
+            "roc_auc": evaluation["roc_auc"],
+            "test_rows": evaluation["rows"],
+        }
+
+    report = {"comparison": comparison, "runs": runs}
+    if report_path is not None:
+        fs.write_text(spark, report_path, json.dumps(report, indent=2, default=str))
+    return report
+
+
+def compare_features(spark, transactions_csv, patterns_path, work_dir, feature_sets=FEATURE_SETS,
+                     pipeline_options=None, report_path=None):
+    """Run the pipeline once per feature set and compare the quality of the models.
+
+    ``feature_sets`` maps a name to ``run_pipeline`` options (see
+    ``FEATURE_SETS``); ``pipeline_options`` are shared by all of them.
+    Every set uses the same seed and so the same held-out rows. Each set
+    reports its features, the total and training seconds, and the PR-AUC
+    and ROC-AUC on the held-out rows.
+    """
+    runs, comparison = {}, {}
+    for name, options in feature_sets.items():
+        profiler = StageProfiler(spark, run_name=f"features={name}")
+        options = {**(pipeline_options or {}), **options}
+        evaluation = run_pipeline(spark, transactions_csv, patterns_path, work_dir, profiler,
+                                  **options)
+        runs[name] = profiler.finish()
+        stages = {stage["stage"]: stage for stage in runs[name]["stages"]}
+        comparison[name] = {
+            "features": len(options.get("model_features") or MODEL_FEATURES),
+            "total_seconds": runs[name]["total_seconds"],
+            "training_seconds": stages["training"]["seconds"],
+            "pr_auc": evaluation["pr_auc"],
+            "roc_auc": evaluation["roc_auc"],
+        }
+
+    report = {"comparison": comparison, "runs": runs}
+    if report_path is not None:
+        fs.write_text(spark, report_path, json.dumps(report, indent=2, default=str))
+    return report
+
+
+def scoring_throughput(spark, work_dir, scale, day_rows, generator_options=None,
+                       pipeline_options=None, top_k=100, explain_budget_seconds=60.0,
+                       report_path=None):
+    """Train on the dataset of ``scale`` rows, then batch-score a generated day of ``day_rows``.
+
+    The day is generated with the same accounts and banks as the training
+    dataset and falls on ``SCORING_DAY``, after its period. It is scored
+    by ``aml.batch_scoring`` against the run's account feature store and,
+    for the velocity and motif features, its transaction store.
+    Returns (and optionally writes) the scoring summary with its
+    rows/sec per core, the explanation cost against
+    ``explain_budget_seconds`` and the per-stage profiles of both runs.
+    """
+    generator_options = generator_options or {}
+    scale_dir, transactions_csv, patterns_path, _ = dataset(work_dir, scale, generator_options)
+    model_path = os.path.join(scale_dir, "scoring_model")
+    training = StageProfiler(spark, run_name=f"rows={scale}")
+    run_pipeline(spark, transactions_csv, patterns_path, scale_dir, training,
+                 model_path=model_path, **(pipeline_options or {}))
+
+    day_dir = os.path.join(scale_dir, f"day_rows={day_rows}")
+    os.makedirs(day_dir, exist_ok=True)
+    day_csv = os.path.join(day_dir, "Trans.csv")
+    generate_dataset(day_csv, os.path.join(day_dir, "Patterns.txt"), num_rows=day_rows,
+                     num_accounts=max(100, scale // 10), days=1, start=SCORING_DAY,
+                     **generator_options)
+
+    scoring = StageProfiler(spark, run_name=f"score day_rows={day_rows}")
+    summary = score_transactions(spark, day_csv, model_path, os.path.join(day_dir, "alerts"),
+                                 feature_store_path=f"{scale_dir}/account_features",
+                                 transactions_store=f"{scale_dir}/transactions.parquet",
+                                 motif_options=(pipeline_options or {}).get("motif_options"),
+                                 top_k=top_k, profiler=scoring)
+    rate = summary["explain_rows_per_sec_per_core"]
+    explanations = {
+        "alerts": summary["alerts"],
+        "seconds": summary["explain_seconds"],
+        "budget_seconds": explain_budget_seconds,
+        "within_budget": summary["explain_seconds"] <= explain_budget_seconds,
+        "alerts_in_budget": alerts_in_budget(rate, summary["cores"], explain_budget_seconds)
+        if rate else None,
+    }
+    report = {"scale": scale, "day_rows": day_rows, "scoring": summary,
+              "explanations": explanations,
+              "runs": {"training": training.finish(), "scoring": scoring.finish()}}
+    if report_path is not None:
+        fs.write_text(spark, report_path, json.dumps(report, indent=2, default=str))
+    return report
+
+
+def run_benchmark(spark, work_dir, scales=(100_000, 1_000_000), generator_options=None,
+                  pipeline_options=None, report_path=None):
+    """Generate a dataset per scale, run the pipeline on it and report every stage.
+
+    Datasets are reused while their generator options are unchanged.
+    ``generator_options`` go to ``generate_dataset`` and
+    ``pipeline_options`` to ``run_pipeline``. Returns (and optionally
+    writes) the report with the per-scale profiles and the scaling curves.
+    """
+    generator_options = generator_options or {}
+    runs, quality, datasets = {}, {}, {}
+    for scale in scales:
+        scale_dir, transactions_csv, patterns_path, generated = dataset(
+            work_dir, scale, generator_options)
+        if generated is not None:
+            datasets[scale] = generated
+
+        profiler = StageProfiler(spark, run_name=f"rows={scale}")
+        evaluation = run_pipeline(spark, transactions_csv, patterns_path, scale_dir, profiler,
+                                  **(pipeline_options or {}))
+        runs[scale] = profiler.finish()
+        quality[scale] = {"pr_auc": evaluation["pr_auc"], "roc_auc": evaluation["roc_auc"]}
+
+    report = {
+        "default_parallelism": spark.sparkContext.defaultParallelism,
+        "generator_options": generator_options,
+        "generated": datasets,
+        "runs": {str(scale): run for scale, run in runs.items()},
+        "quality": {str(scale): q for scale, q in quality.items()},
+        "scaling": scaling_curves(runs),
+    }
+    if report_path is not None:
+        fs.write_text(spark, report_path, json.dumps(report, indent=2))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic data.")
+    parser.add_argument("--work-dir", required=True, help="directory for datasets and outputs")
+    parser.add_argument("--scales", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--laundering-rate", type=float, default=0.001)
+    parser.add_argument("--degree-skew", type=float, default=1.0)
+    parser.add_argument("--smote-samples", type=int, default=10)
+    parser.add_argument("--motifs", action="store_true", help="also compute the graph motif features")
+    parser.add_argument("--raw-ids", action="store_true",
+                        help="keep account and bank strings instead of dictionary IDs")
+    parser.add_argument("--compare-balancing", action="store_true",
+                        help="compare SMOTE with class weights on the first scale instead")
+    parser.add_argument("--compare-features", action="store_true",
+                        help="compare the feature sets of FEATURE_SETS on the first scale instead")
+    parser.add_argument("--score-day-rows", type=int,
+                        help="train on the first scale, then batch-score a generated day this size")
+    parser.add_argument("--explain-budget", type=float, default=60.0,
+                        help="seconds allowed for explaining the scored day's alerts")
+    parser.add_argument("--master", default="local[*]")
+    parser.add_argument("--report", help="output JSON report (default: <work-dir>/benchmark.json)")
+    args = parser.parse_args(argv)
+
+    spark = SparkSession.builder.master(args.master).appName("AML Benchmark").getOrCreate()
+    work_dir = os.path.abspath(args.work_dir)
+    generator_options = {"laundering_rate": args.laundering_rate, "degree_skew": args.degree_skew}
+    pipeline_options = {"smote_samples": args.smote_samples, "encode_ids": not args.raw_ids,
+                        "motif_options": {} if args.motifs else None}
+    if args.compare_balancing:
+        scale_dir, transactions_csv, patterns_path, _ = dataset(
+            work_dir, args.scales[0], generator_options)
+        report = compare_balancing(
+            spark, transactions_csv, patterns_path, scale_dir,
+            pipeline_options=pipeline_options,
+            report_path=args.report or os.path.join(work_dir, "balancing.json"))
+        for name, result in report["comparison"].items():
+            print(f"{name:<32} " + "  ".join(f"{k}={v}" for k, v in result.items()))
+        return
+    if args.compare_features:
+        scale_dir, transactions_csv, patterns_path, _ = dataset(
+            work_dir, args.scales[0], generator_options)
+        report = compare_features(
+            spark, transactions_csv, patterns_path, scale_dir,
+            pipeline_options={k: v for k, v in pipeline_options.items() if k != "motif_options"},
+            report_path=args.report or os.path.join(work_dir, "features.json"))
+        for name, result in report["comparison"].items():
+            print(f"{name:<32} " + "  ".join(f"{k}={v}" for k, v in result.items()))
+        return
+    if args.score_day_rows:
+        report = scoring_throughput(
+            spark, work_dir, args.scales[0], args.score_day_rows,
+            generator_options=generator_options, pipeline_options=pipeline_options,
+            explain_budget_seconds=args.explain_budget,
+            report_path=args.report or os.path.join(work_dir, "scoring.json"))
+        print(json.dumps({**report["scoring"], "explanations": report["explanations"]}, indent=2))
+        return
+
+    report = run_benchmark(
+        spark, work_dir, scales=args.scales,
+        generator_options=generator_options,
+        pipeline_options=pipeline_options,
+        report_path=args.report or os.path.join(work_dir, "benchmark.json"))
+
+    for name, curve in report["scaling"].items():
+        points = "  ".join(f"{p['scale']:>10,}: {p['seconds']:>8.1f}s" for p in curve["points"])
+        print(f"{name:<18} {points}  exponent={curve['exponent']}")
+
+
+if __name__ == "__main__":
+    main()
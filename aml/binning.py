@@ -0,0 +1,83 @@
+"""Quantize continuous features into small-integer bins once, before tree training.
+
+Every RandomForest fit recomputes the split candidates of its continuous
+features from a sample and re-bins every row against them. The same
+happens for every tuning fold and grid point. ``fit_bucketizer`` takes the
+approximate quantiles of all the continuous columns in one job and returns
+a ``Bucketizer`` that maps each value to its quantile bin. The binned
+columns then hold at most ``max_bins`` distinct values. Spark uses those
+values directly as split candidates, so the later fits no longer sample or
+search real-valued thresholds.
+
+``binned_matrix`` keeps the bin IDs and the other already-small integer
+features as ``smallint`` columns. Category indices stay doubles so that
+they keep their nominal ML attributes. The matrix is cached in that form,
+or written to Parquet first so that it can be reused across sessions.
+That costs a few bytes per feature, compared with a cached ``features``
+vector of doubles.
+
+The ``Bucketizer`` is a regular pipeline stage, so it is saved with the
+scoring model, and ``aml.scorer`` maps split thresholds on its bins back to
+raw feature values.
+"""
+
+from pyspark.ml.feature import Bucketizer
+from pyspark.sql import functions as F
+
+BIN_SUFFIX = "_Bin"
+
+
+def quantile_splits(df, columns, max_bins=75, relative_error=0.001):
+    """Return the Bucketizer splits of every column from one approximate-quantile job.
+
+    Each column gets at most ``max_bins`` buckets, with duplicate quantiles
+    merged, so a heavily repeated value gets a bucket to itself. An
+    all-null column has no quantiles and gets the single split 0, since
+    Bucketizer needs at least three splits.
+    """
+    probabilities = [i / max_bins for i in range(1, max_bins)]
+    quantiles = df.approxQuantile(list(columns), probabilities, relative_error)
+    return [[-float("inf")] + (sorted(set(q)) or [0.0]) + [float("inf")] for q in quantiles]
+
+
+def fit_bucketizer(df, columns, max_bins=75, relative_error=0.001, suffix=BIN_SUFFIX):
+    """Return a Bucketizer that writes the quantile bin of each column to ``{column}{suffix}``."""
+    return Bucketizer(splitsArray=quantile_splits(df, columns, max_bins, relative_error),
+                      inputCols=list(columns),
+                      outputCols=[f"{c}{suffix}" for c in columns],
+                      handleInvalid="keep")
+
+
+def _passthrough_column(field):
+    """Cast a passthrough feature to ``smallint``, unless it carries ML attributes.
+
+    VectorAssembler only reads the attributes of double columns, so nominal
+    indices are kept as doubles with their metadata to stay categorical.
+    """
+    if "ml_attr" in field.metadata:
+        return F.col(field.name).cast("double").alias(field.name, metadata=field.metadata)
+    return F.col(field.name).cast("smallint").alias(field.name)
+
+
+def binned_matrix(df, bucketizer, passthrough_columns=(), extra_cols=(), path=None):
+    """Apply ``bucketizer`` and keep the feature columns in compact form.
+
+    ``passthrough_columns`` are features that are already small integers
+    (category indices, DayOfWeek). Those with ML attributes, such as the
+    nominal category indices, keep them and stay categorical features of the
+    assembled vector. ``extra_cols``, such as the label, are
+    kept unchanged. With ``path`` the matrix is written as Parquet and read
+    back, so the cache is built from the compact files. Returns the cached,
+    materialized DataFrame.
+    """
+    matrix = bucketizer.transform(df).select(
+        *[F.col(c).cast("smallint").alias(c) for c in bucketizer.getOutputCols()],
+        *[_passthrough_column(df.schema[c]) for c in passthrough_columns],
+        *extra_cols)
+    if path is not None:
+        matrix.write.mode("overwrite").parquet(path)
+        matrix = df.sparkSession.read.parquet(path)
+    matrix = matrix.cache()
+    matrix.count()
+    return matrix
+
@@ -0,0 +1,131 @@
+"""Content-addressed checkpoints for resuming the pipeline stage by stage.
+
+Every stage's output is stored under ``<root>/<stage>/<key>``. The key is
+a hash of three things: the stage name, its parameters, and the keys of
+the inputs it was computed from. The inputs are either source files,
+identified by their fingerprint, or other stages. A rerun finds the output
+of every stage whose inputs and parameters are unchanged and reads it back
+instead of recomputing it. Changing a parameter changes that stage's key
+and the keys of everything downstream, so only the affected stages run
+again.
+
+A stage's directory is only trusted once its ``_CHECKPOINT.json`` marker
+exists. The marker is written after the output is complete, so an
+interrupted write is simply redone.
+"""
+
+import hashlib
+import json
+
+from pyspark.ml import PipelineModel
+
+from aml import fs
+
+MARKER_FILE = "_CHECKPOINT.json"
+
+# Bump when the code of the stages changes in a way their parameters do not capture
+CHECKPOINT_VERSION = 1
+
+
+class StageCheckpoints:
+    """Store and reuse the outputs of named pipeline stages under ``root``.
+
+    With ``enabled=False`` every stage is recomputed and overwritten, which
+    is useful to force a full rebuild while keeping the same code path.
+    """
+
+    def __init__(self, spark, root, enabled=True):
+        self.spark = spark
+        self.root = root.rstrip("/")
+        self.enabled = enabled
+        self.keys = {}
+        self.resumed = []
+        self.computed = []
+
+    def source(self, name, path, params=None):
+        """Register the files at ``path`` as the input ``name``, keyed by their fingerprint."""
+        self.keys[name] = fs.fingerprint(self.spark, path, params or {})
+        return self.keys[name]
+
+    def key(self, name, inputs=(), params=None):
+        """Return the content key of stage ``name`` for the given inputs and parameters."""
+        missing = [i for i in inputs if i not in self.keys]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown inputs: {missing}")
+        payload = json.dumps({
+            "version": CHECKPOINT_VERSION,
+            "stage": name,
+            "inputs": {i: self.keys[i] for i in inputs},
+            "params": params or {},
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
+
+    def _run(self, name, inputs, params, compute, save, load):
+        key = self.key(name, inputs, params)
+        path = f"{self.root}/{name}/{key}"
+        marker = f"{path}/{MARKER_FILE}"
+        self.keys[name] = key
+
+        if self.enabled and fs.exists(self.spark, marker):
+            self.resumed.append(name)
+            return load(path, json.loads(fs.read_text(self.spark, marker)))
+
+        fs.delete(self.spark, path)
+        metadata = save(path, compute()) or {}
+        fs.write_text(self.spark, marker, json.dumps(
+            {"stage": name, "key": key, "inputs": list(inputs), "params": params or {},
+             **metadata}, default=str))
+        self.computed.append(name)
+        return load(path, metadata)
+
+    def dataframe(self, name, compute, inputs=(), params=None):
+        """Return the DataFrame of stage ``name``, computing and storing it if needed.
+
+        ``compute`` is called without arguments and returns the DataFrame.
+        The result is always read back from the stored Parquet files, so
+        downstream stages never recompute this stage's lineage.
+        """
+        def save(path, df):
+            df.write.mode("overwrite").parquet(path)
+
+        return self._run(name, inputs, params, compute, save,
+                         lambda path, _: self.spark.read.parquet(path))
+
+    def model(self, name, fit, inputs=(), params=None):
+        """Return the fitted model of stage ``name``, fitting and saving it if needed.
+
+        ``fit`` returns a ``PipelineModel`` or a single fitted model. Single
+        models are saved inside a one-stage pipeline, so any model that
+        supports ML persistence can be stored.
+        """
+        def save(path, model):
+            wrapped = not isinstance(model, PipelineModel)
+            (PipelineModel(stages=[model]) if wrapped else model).write().overwrite().save(path)
+            return {"wrapped": wrapped}
+
+        def load(path, metadata):
+            model = PipelineModel.load(path)
+            return model.stages[0] if metadata.get("wrapped") else model
+
+        return self._run(name, inputs, params, fit, save, load)
+
+    def value(self, name, compute, inputs=(), params=None):
+        """Return the JSON-serializable result of stage ``name``, computing it if needed."""
+        def save(path, result):
+            fs.write_text(self.spark, f"{path}/value.json", json.dumps(result, default=str))
+
+        return self._run(name, inputs, params, compute, save,
+                         lambda path, _: json.loads(fs.read_text(self.spark, f"{path}/value.json")))
+
+    def prune(self):
+        """Delete the stored versions of this run's stages that it did not use."""
+        for name, key in self.keys.items():
+            stage_dir = f"{self.root}/{name}"
+            if not fs.exists(self.spark, stage_dir):
+                continue
+            for entry in fs.list_dirs(self.spark, stage_dir):
+                if entry != key:
+                    fs.delete(self.spark, f"{stage_dir}/{entry}")
+
+    def summary(self):
+        return {"resumed": list(self.resumed), "computed": list(self.computed)}
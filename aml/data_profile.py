@@ -0,0 +1,208 @@
+"""Single-pass data profiles: class balance, column statistics and correlations.
+
+Checking the class balance, the null counts and the correlations of a
+DataFrame usually takes one job per question. ``profile_dataframe`` builds
+one global aggregation instead, so a single scan of the data returns:
+
+- the row count and the count of every class of the label;
+- the null count and an approximate distinct count (HyperLogLog++) of
+  every column;
+- the min, max, mean and approximate quantiles of every numeric column;
+- the Pearson correlation of every pair of ``correlation_columns``. It is
+  computed exactly over all rows, pairwise ignoring nulls;
+- optionally, a sample drawn in the same scan with a separate fraction for
+  each class. The Spearman correlations are computed from it, with each
+  row weighted by the inverse of its class's sampling fraction, together
+  with 95% confidence intervals.
+
+The profile is a plain JSON-serializable dict, so it can be stored as a
+checkpoint value and compared between runs.
+"""
+
+import math
+
+import numpy as np
+from pyspark.sql import functions as F
+from pyspark.sql.types import BooleanType, NumericType
+
+QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+_DRAW_COLUMN = "_profile_draw"
+
+
+def stratified_fractions(class_counts, sample_rows=100_000):
+    """Sampling fraction per class, so each class contributes at most ``sample_rows / classes`` rows.
+
+    ``class_counts`` is a ``{label: count}`` dict or the ``class_counts``
+    of a previous profile. The counts only size the sample; the weights of
+    the sampled rows come from the exact counts of the profiling pass.
+    """
+    if not isinstance(class_counts, dict):
+        class_counts = {entry["label"]: entry["count"] for entry in class_counts}
+    per_class = sample_rows / max(1, len(class_counts))
+    return {label: min(1.0, per_class / count) if count else 1.0
+            for label, count in class_counts.items()}
+
+
+def _finite(value):
+    """``value`` as a float, with NaN and infinities replaced by None for JSON."""
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _weighted_ranks(values, weights):
+    """Weighted mid-ranks: each tie group is ranked at the middle of its cumulative weight."""
+    order = np.argsort(values, kind="mergesort")
+    ordered, ordered_weights = values[order], weights[order]
+    cumulative = np.cumsum(ordered_weights)
+    _, starts, groups = np.unique(ordered, return_index=True, return_inverse=True)
+    ends = np.append(starts[1:], len(ordered)) - 1
+    before = cumulative[starts] - ordered_weights[starts]
+    middles = before + (cumulative[ends] - before) / 2
+    ranks = np.empty(len(values))
+    ranks[order] = middles[groups]
+    return ranks
+
+
+def _weighted_correlation(matrix, weights):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = np.cov(matrix, rowvar=False, aweights=weights)
+        scale = np.sqrt(np.diag(covariance))
+        return covariance / np.outer(scale, scale)
+
+
+def _spearman(sample, weights, columns, z=1.96):
+    """Weighted Spearman matrix of ``sample`` with Fisher-z confidence intervals.
+
+    The intervals use the effective sample size of the weights, so
+    oversampled classes do not narrow them.
+    """
+    ranks = np.column_stack([_weighted_ranks(sample[:, i], weights) for i in range(len(columns))])
+    spearman = _weighted_correlation(ranks, weights)
+    effective_rows = weights.sum() ** 2 / (weights ** 2).sum()
+
+    intervals = []
+    for row in spearman:
+        bounds = []
+        for rho in row:
+            if not math.isfinite(rho) or effective_rows <= 3:
+                bounds.append(None)
+                continue
+            center = math.atanh(max(-0.999999, min(0.999999, rho)))
+            spread = z / math.sqrt(effective_rows - 3)
+            bounds.append([math.tanh(center - spread), math.tanh(center + spread)])
+        intervals.append(bounds)
+    return {
+        "spearman": [[_finite(v) for v in row] for row in spearman],
+        "spearman_interval": intervals,
+        "effective_rows": round(float(effective_rows), 1),
+    }
+
+
+def profile_dataframe(df, label_col="isLaundering", classes=(0, 1), columns=None,
+                      correlation_columns=None, quantiles=QUANTILES, relative_error=0.01,
+                      distinct_rsd=0.05, sample_fractions=None, seed=42):
+    """Profile ``df`` with a single aggregation job.
+
+    ``columns`` defaults to every column; numeric ones also get min, max,
+    mean and the approximate ``quantiles`` within ``relative_error``.
+    ``correlation_columns`` (numeric) get the Pearson matrix. When
+    ``sample_fractions`` maps each class to a sampling fraction (see
+    ``stratified_fractions``), the sampled rows with no nulls in
+    ``correlation_columns`` also give the Spearman matrix.
+
+    Returns a dict with ``rows``, ``class_counts`` (a list of
+    ``{label, count}``), per-column statistics under ``columns``, and the
+    correlations under ``correlation``.
+    """
+    columns = list(columns or df.columns)
+    fields = {field.name: field.dataType for field in df.schema.fields}
+    numeric = [c for c in columns
+               if isinstance(fields[c], NumericType) and not isinstance(fields[c], BooleanType)]
+    correlation_columns = list(correlation_columns or [])
+    accuracy = max(1, int(round(1 / relative_error)))
+
+    aggregates = [F.count(F.lit(1)).alias("rows")]
+    for i, label in enumerate(classes):
+        aggregates.append(F.sum((F.col(label_col) == F.lit(label)).cast("long")).alias(f"class_{i}"))
+    for i, c in enumerate(columns):
+        aggregates.append(F.sum(F.col(c).isNull().cast("long")).alias(f"nulls_{i}"))
+        aggregates.append(F.approx_count_distinct(c, distinct_rsd).alias(f"distinct_{i}"))
+        if c in numeric:
+            aggregates += [
+                F.min(c).alias(f"min_{i}"),
+                F.max(c).alias(f"max_{i}"),
+                F.avg(c).alias(f"mean_{i}"),
+                F.percentile_approx(F.col(c).cast("double"), list(quantiles), accuracy)
+                 .alias(f"quantiles_{i}"),
+            ]
+    for i, a in enumerate(correlation_columns):
+        for j in range(i + 1, len(correlation_columns)):
+            aggregates.append(F.corr(F.col(a).cast("double"),
+                                     F.col(correlation_columns[j]).cast("double"))
+                              .alias(f"corr_{i}_{j}"))
+    if sample_fractions and correlation_columns:
+        # Aggregates cannot take rand() directly, so the draw is projected first
+        df = df.withColumn(_DRAW_COLUMN, F.rand(seed))
+        draw = F.col(_DRAW_COLUMN)
+        sampled = F.lit(False)
+        for label, fraction in sample_fractions.items():
+            sampled = sampled | ((F.col(label_col) == F.lit(label)) & (draw < fraction))
+        complete = F.lit(True)
+        for c in correlation_columns:
+            complete = complete & F.col(c).isNotNull()
+        row = F.array(F.col(label_col).cast("double"),
+                      *[F.col(c).cast("double") for c in correlation_columns])
+        aggregates.append(F.collect_list(F.when(sampled & complete, row)).alias("sample"))
+
+    result = df.agg(*aggregates).head().asDict()
+
+    profile = {
+        "rows": result["rows"],
+        "label_col": label_col,
+        "class_counts": [{"label": label, "count": result[f"class_{i}"] or 0}
+                         for i, label in enumerate(classes)],
+        "quantile_probabilities": list(quantiles),
+        "relative_error": relative_error,
+        "distinct_rsd": distinct_rsd,
+        "columns": {},
+    }
+    for i, c in enumerate(columns):
+        stats = {"nulls": result[f"nulls_{i}"], "distinct": result[f"distinct_{i}"]}
+        if c in numeric:
+            stats.update({
+                "min": _finite(result[f"min_{i}"]),
+                "max": _finite(result[f"max_{i}"]),
+                "mean": _finite(result[f"mean_{i}"]),
+                "quantiles": [_finite(q) for q in result[f"quantiles_{i}"] or []],
+            })
+        profile["columns"][c] = stats
+
+    if correlation_columns:
+        k = len(correlation_columns)
+        pearson = [[1.0 if i == j else None for j in range(k)] for i in range(k)]
+        for i in range(k):
+            for j in range(i + 1, k):
+                pearson[i][j] = pearson[j][i] = _finite(result[f"corr_{i}_{j}"])
+        correlation = {"columns": correlation_columns, "pearson": pearson, "spearman": None}
+
+        if "sample" in result and result["sample"]:
+            sample = np.array(result["sample"], dtype=float)
+            counts = {float(entry["label"]): entry["count"] for entry in profile["class_counts"]}
+            sampled = {label: int((sample[:, 0] == label).sum()) for label in counts}
+            weights = np.array([counts[label] / sampled[label] for label in sample[:, 0]])
+            correlation.update(_spearman(sample[:, 1:], weights, correlation_columns))
+            correlation["sample_rows"] = len(sample)
+            correlation["sample_class_counts"] = [
+                {"label": label, "count": sampled[float(label)]} for label in classes]
+        profile["correlation"] = correlation
+    return profile
+
+
+def heatmap_inputs(profile, method="pearson"):
+    """Return the ``(matrix, labels)`` of a profile's correlations, ready for ``sns.heatmap``."""
+    correlation = profile["correlation"]
+    matrix = np.array([[np.nan if v is None else v for v in row] for row in correlation[method]])
+    return matrix, correlation["columns"]
@@ -0,0 +1,100 @@
+"""Single-pass categorical encoding with persisted vocabularies.
+
+``FusedStringIndexer`` learns the vocabularies of all its input columns in
+one aggregation pass. Its model applies them in one projection. Labels are
+ordered by descending frequency, with ties broken alphabetically, which is
+the same order ``StringIndexer`` uses. Values that were never seen,
+including nulls, map to the reserved index ``len(labels)``.
+
+The vocabularies are stored as a Param, so the fitted model is saved and
+loaded with the rest of a ``PipelineModel``. The output columns carry the
+same nominal ML attributes as ``StringIndexer``, so tree models still treat
+them as categorical.
+"""
+
+import json
+
+from pyspark import keyword_only
+from pyspark.ml import Estimator, Model
+from pyspark.ml.param import Param, Params, TypeConverters
+from pyspark.ml.param.shared import HasInputCols, HasOutputCols
+from pyspark.ml.util import DefaultParamsReadable, DefaultParamsWritable
+from pyspark.sql import functions as F
+
+UNKNOWN_LABEL = "__unknown"
+
+
+class _FusedStringIndexerParams(HasInputCols, HasOutputCols):
+
+    labelsJson = Param(Params._dummy(), "labelsJson",
+                       "JSON list with the ordered labels of every input column",
+                       typeConverter=TypeConverters.toString)
+
+
+class FusedStringIndexer(Estimator, _FusedStringIndexerParams,
+                         DefaultParamsReadable, DefaultParamsWritable):
+    """Index several string columns with a single aggregation pass."""
+
+    @keyword_only
+    def __init__(self, *, inputCols=None, outputCols=None):
+        super().__init__()
+        kwargs = self._input_kwargs
+        self.setParams(**kwargs)
+
+    @keyword_only
+    def setParams(self, *, inputCols=None, outputCols=None):
+        kwargs = self._input_kwargs
+        return self._set(**kwargs)
+
+    def _fit(self, dataset):
+        input_cols = self.getInputCols()
+        pairs = F.explode(F.array(*[
+            F.struct(F.lit(i).alias("column"), F.col(c).cast("string").alias("value"))
+            for i, c in enumerate(input_cols)
+        ])).alias("pair")
+        counts = dataset.select(pairs) \
+            .where(F.col("pair.value").isNotNull()) \
+            .groupBy("pair.column", "pair.value") \
+            .count() \
+            .collect()
+
+        labels = [[] for _ in input_cols]
+        for row in sorted(counts, key=lambda r: (r["column"], -r["count"], r["value"])):
+            labels[row["column"]].append(row["value"])
+
+        model = FusedStringIndexerModel(labelsJson=json.dumps(labels))
+        model._set(inputCols=input_cols, outputCols=self.getOutputCols())
+        return model._resetUid(self.uid)
+
+
+class FusedStringIndexerModel(Model, _FusedStringIndexerParams,
+                              DefaultParamsReadable, DefaultParamsWritable):
+    """Model fitted by :class:`FusedStringIndexer`."""
+
+    @keyword_only
+    def __init__(self, *, labelsJson=None):
+        super().__init__()
+        kwargs = self._input_kwargs
+        self._set(**kwargs)
+
+    @property
+    def labelsArray(self):
+        """Ordered labels of every input column, like ``StringIndexerModel``."""
+        return json.loads(self.getOrDefault(self.labelsJson))
+
+    def _transform(self, dataset):
+        encoded = {}
+        for input_col, output_col, labels in zip(self.getInputCols(), self.getOutputCols(),
+                                                 self.labelsArray):
+            mapping = F.create_map(*[F.lit(x) for i, label in enumerate(labels)
+                                     for x in (label, float(i))]) if labels else None
+            index = F.lit(float(len(labels)))
+            if mapping is not None:
+                index = F.coalesce(mapping[F.col(input_col).cast("string")], index)
+            metadata = {"ml_attr": {"type": "nominal", "name": output_col,
+                                    "vals": labels + [UNKNOWN_LABEL]}}
+            encoded[output_col] = index.cast("double").alias(output_col, metadata=metadata)
+
+        # One projection for all columns; existing output columns are replaced
+        kept = [F.col(c) for c in dataset.columns if c not in encoded]
+        return dataset.select(*kept, *encoded.values())
@@ -0,0 +1,234 @@
+"""Single-pass evaluation report for a binary classifier.
+
+The separate evaluators each run their own job over the predictions.
+``evaluation_report`` instead runs one aggregation: the positive-class
+probability is cut into ``num_bins`` equal-width bins, and the rows are
+counted per ``(bin, label, prediction)``. The result holds at most
+``4 * num_bins`` rows and is collected to the driver. All the metrics are
+derived from it:
+
+- ROC-AUC and PR-AUC, from the curves through the bin edges (with 10000
+  bins a score is at most 1e-4 away from its threshold);
+- the confusion matrix, plus precision, recall and F1 for the laundering
+  class and weighted over both classes, as reported by
+  ``MulticlassClassificationEvaluator``;
+- precision and recall for a given number of alerts (precision at K),
+  and an alert-budget curve over score thresholds.
+
+``histogram_report`` derives the report from the histogram alone, so the
+single-node engine (``aml.single_node``) fills it with ``array_histogram``
+and gets the same metrics. pyspark is only imported by ``score_histogram``.
+"""
+
+import json
+
+import numpy as np
+
+from aml import fs
+
+ALERT_BUDGETS = (100, 1000, 10000, 100000)
+
+
+def score_histogram(predictions_df, label_col="isLaundering", probability_col="probability",
+                    prediction_col="prediction", num_bins=10000):
+    """Count the rows per score bin, label and prediction in one job.
+
+    Returns ``(positives, negatives, confusion)``. ``positives`` and
+    ``negatives`` are arrays of length ``num_bins`` that count the rows with
+    label 1 and 0 whose score falls in each bin. ``confusion`` maps
+    ``(label, prediction)`` to a row count.
+    """
+    from pyspark.ml.functions import vector_to_array
+    from pyspark.sql import functions as F
+
+    score = vector_to_array(F.col(probability_col))[1]
+    score_bin = F.least(F.floor(score * num_bins), F.lit(num_bins - 1)).cast("int")
+    rows = predictions_df \
+        .groupBy(score_bin.alias("bin"),
+                 F.col(label_col).cast("int").alias("label"),
+                 F.col(prediction_col).cast("int").alias("prediction")) \
+        .count() \
+        .collect()
+
+    positives = np.zeros(num_bins, dtype=np.int64)
+    negatives = np.zeros(num_bins, dtype=np.int64)
+    confusion = {}
+    for row in rows:
+        target = positives if row["label"] == 1 else negatives
+        target[row["bin"]] += row["count"]
+        key = (row["label"], row["prediction"])
+        confusion[key] = confusion.get(key, 0) + row["count"]
+    return positives, negatives, confusion
+
+
+def array_histogram(scores, labels, predictions=None, num_bins=10000):
+    """``score_histogram`` for NumPy arrays of positive-class scores and labels.
+
+    ``predictions`` default to the class with the higher probability, as
+    in Spark. Histograms of several batches can be added up.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels).astype(np.int64)
+    predictions = (scores > 0.5 if predictions is None else np.asarray(predictions)).astype(np.int64)
+    bins = np.minimum(np.floor(scores * num_bins), num_bins - 1).astype(np.int64)
+    positives = np.bincount(bins[labels == 1], minlength=num_bins)
+    negatives = np.bincount(bins[labels != 1], minlength=num_bins)
+    cells = np.bincount(labels.clip(0, 1) * 2 + predictions.clip(0, 1), minlength=4)
+    confusion = {(label, prediction): int(cells[label * 2 + prediction])
+                 for label in (0, 1) for prediction in (0, 1) if cells[label * 2 + prediction]}
+    return positives, negatives, confusion
+
+
+def _classification_metrics(confusion):
+    """Per-class and support-weighted precision, recall and F1."""
+    total = sum(confusion.values())
+    per_class = {}
+    for label in (0, 1):
+        true_positive = confusion.get((label, label), 0)
+        predicted = sum(n for (_, p), n in confusion.items() if p == label)
+        support = sum(n for (l, _), n in confusion.items() if l == label)
+        precision = true_positive / predicted if predicted else 0.0
+        recall = true_positive / support if support else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_class[label] = {"precision": precision, "recall": recall, "f1": f1, "support": support}
+
+    weighted = {metric: sum(m[metric] * m["support"] for m in per_class.values()) / total
+                if total else 0.0 for metric in ("precision", "recall", "f1")}
+    correct = confusion.get((0, 0), 0) + confusion.get((1, 1), 0)
+    return {
+        "accuracy": correct / total if total else 0.0,
+        "precision": per_class[1]["precision"],
+        "recall": per_class[1]["recall"],
+        "f1": per_class[1]["f1"],
+        "weighted_precision": weighted["precision"],
+        "weighted_recall": weighted["recall"],
+        "weighted_f1": weighted["f1"],
+    }
+
+
+def _area(x, y):
+    """Trapezoidal area under the curve through the points ``(x, y)``."""
+    return float(np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2))
+
+
+def _curves(positives, negatives):
+    """ROC and PR areas from the histogram, walking the bins from the highest score."""
+    pos, neg = positives[::-1], negatives[::-1]
+    nonempty = (pos + neg) > 0
+    true_pos = np.cumsum(pos)[nonempty]
+    false_pos = np.cumsum(neg)[nonempty]
+    total_pos, total_neg = positives.sum(), negatives.sum()
+    if not total_pos or not total_neg:
+        return None, None
+
+    tpr = np.concatenate([[0.0], true_pos / total_pos])
+    fpr = np.concatenate([[0.0], false_pos / total_neg])
+    precision = true_pos / (true_pos + false_pos)
+    # Like Spark's BinaryClassificationMetrics, the PR curve starts at
+    # recall 0 with the precision of the first threshold
+    precision = np.concatenate([precision[:1], precision])
+    return _area(fpr, tpr), _area(tpr, precision)
+
+
+def _precision_at(positives, negatives, alerts):
+    """Precision and recall when the ``alerts`` highest-scored rows are flagged.
+
+    Rows inside the bin that crosses the budget are assumed to share the
+    bin's positive rate.
+    """
+    pos, neg = positives[::-1], negatives[::-1]
+    counts = pos + neg
+    flagged = np.cumsum(counts)
+    total_pos = positives.sum()
+    alerts = min(alerts, int(flagged[-1]))
+    if alerts == 0:
+        return {"alerts": 0, "precision": None, "recall": 0.0, "threshold": None}
+
+    i = int(np.searchsorted(flagged, alerts))
+    before = flagged[i] - counts[i]
+    true_pos = pos[:i].sum() + (alerts - before) * pos[i] / counts[i]
+    return {
+        "alerts": alerts,
+        "precision": float(true_pos / alerts),
+        "recall": float(true_pos / total_pos) if total_pos else 0.0,
+        "threshold": (len(pos) - 1 - i) / len(pos),
+    }
+
+
+def _alert_curve(positives, negatives, points):
+    """Alerts, precision and recall when flagging every score at or above each threshold."""
+    num_bins = len(positives)
+    pos_above = np.cumsum(positives[::-1])[::-1]
+    neg_above = np.cumsum(negatives[::-1])[::-1]
+    total_pos = positives.sum()
+    curve = []
+    for threshold in np.linspace(0.0, 1.0, points, endpoint=False):
+        b = int(round(threshold * num_bins))
+        alerts = int(pos_above[b] + neg_above[b])
+        curve.append({
+            "threshold": round(float(threshold), 6),
+            "alerts": alerts,
+            "precision": float(pos_above[b] / alerts) if alerts else None,
+            "recall": float(pos_above[b] / total_pos) if total_pos else 0.0,
+        })
+    return curve
+
+
+def evaluation_report(predictions_df, label_col="isLaundering", probability_col="probability",
+                      prediction_col="prediction", num_bins=10000, alert_budgets=ALERT_BUDGETS,
+                      curve_points=100):
+    """Compute every evaluation metric from a single aggregation over ``predictions_df``.
+
+    ``alert_budgets`` lists the alert counts for which precision at K is
+    reported. ``curve_points`` sets how many evenly spaced score thresholds
+    the alert-budget curve has.
+    """
+    positives, negatives, confusion = score_histogram(
+        predictions_df, label_col, probability_col, prediction_col, num_bins)
+    return histogram_report(positives, negatives, confusion, alert_budgets, curve_points)
+
+
+def histogram_report(positives, negatives, confusion, alert_budgets=ALERT_BUDGETS,
+                     curve_points=100):
+    """Build the evaluation report from the per-bin label counts and the confusion counts."""
+    roc_auc, pr_auc = _curves(positives, negatives)
+
+    report = {
+        "rows": int(positives.sum() + negatives.sum()),
+        "positives": int(positives.sum()),
+        "roc_auc": roc_auc,
+        "pr_auc": pr_auc,
+    }
+    report.update(_classification_metrics(confusion))
+    report["confusion_matrix"] = [
+        {"label": label, "prediction": prediction, "count": confusion.get((label, prediction), 0)}
+        for label in (0, 1) for prediction in (0, 1)
+    ]
+    report["precision_at_k"] = [_precision_at(positives, negatives, k) for k in alert_budgets]
+    report["alert_curve"] = _alert_curve(positives, negatives, curve_points)
+    return report
+
+
+def write_report(spark, path, reports):
+    """Write ``reports`` (e.g. ``{"validation": ..., "test": ...}``) as one JSON file."""
+    fs.write_text(spark, path, json.dumps(reports, indent=2))
+
+
+def format_report(report):
+    """Return a short printable summary of a report."""
+    matrix = {(c["label"], c["prediction"]): c["count"] for c in report["confusion_matrix"]}
+    lines = [
+        f"ROC-AUC: {report['roc_auc']}",
+        f"PR-AUC: {report['pr_auc']}",
+        f"Precision: {report['precision']:.4f}  Recall: {report['recall']:.4f}  "
+        f"F1: {report['f1']:.4f}",
+        f"Weighted precision: {report['weighted_precision']:.4f}  "
+        f"Weighted recall: {report['weighted_recall']:.4f}  "
+        f"Weighted F1: {report['weighted_f1']:.4f}",
+        f"Confusion matrix: TN={matrix[(0, 0)]} FP={matrix[(0, 1)]} "
+        f"FN={matrix[(1, 0)]} TP={matrix[(1, 1)]}",
+    ]
+    for point in report["precision_at_k"]:
+        lines.append(f"Precision at {point['alerts']} alerts: {point['precision']}  "
+                     f"(recall {point['recall']})")
+    return "\n".join(lines)
@@ -0,0 +1,20 @@
+"""Row-level features shared by training and scoring."""
+
+from pyspark.sql import functions as F
+
+
+def add_time_features(df, timestamp_col="Timestamp"):
+    """Add ``Hour`` (0-23) and ``DayOfWeek`` (1 = Sunday) from the timestamp."""
+    return df.withColumn("Hour", F.hour(timestamp_col)) \
+             .withColumn("DayOfWeek", F.dayofweek(timestamp_col))
+
+
+def add_missing_columns(df, columns):
+    """Add every column in ``columns`` that ``df`` lacks as a null string.
+
+    Scoring data has no ``Pattern_Type``, for instance, but the saved
+    category encoder still expects the column; nulls map to its reserved
+    index.
+    """
+    missing = [c for c in columns if c not in df.columns]
+    return df.select("*", *[F.lit(None).cast("string").alias(c) for c in missing])
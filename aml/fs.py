@@ -0,0 +1,93 @@
+"""Hadoop FileSystem helpers shared by the stages that persist data.
+
+Going through the JVM's Hadoop FileSystem keeps the same code working for
+local paths, HDFS and S3 (EMR), which is where the pipeline actually runs.
+"""
+
+import hashlib
+import json
+
+
+def _filesystem(spark, path):
+    jvm = spark.sparkContext._jvm
+    hadoop_path = jvm.org.apache.hadoop.fs.Path(path)
+    return hadoop_path.getFileSystem(spark.sparkContext._jsc.hadoopConfiguration()), hadoop_path
+
+
+def exists(spark, path):
+    """Return True if ``path`` exists."""
+    fs, hadoop_path = _filesystem(spark, path)
+    return fs.exists(hadoop_path)
+
+
+def read_text(spark, path):
+    """Return the UTF-8 contents of ``path``, or None if it does not exist."""
+    fs, hadoop_path = _filesystem(spark, path)
+    if not fs.exists(hadoop_path):
+        return None
+    stream = fs.open(hadoop_path)
+    try:
+        return spark.sparkContext._jvm.org.apache.commons.io.IOUtils.toString(stream, "UTF-8")
+    finally:
+        stream.close()
+
+
+def write_text(spark, path, text):
+    """Write ``text`` to ``path`` as UTF-8, replacing any existing file."""
+    fs, hadoop_path = _filesystem(spark, path)
+    stream = fs.create(hadoop_path, True)
+    try:
+        stream.write(bytearray(text.encode("utf-8")))
+    finally:
+        stream.close()
+
+
+def delete(spark, path):
+    """Recursively delete ``path`` if it exists."""
+    fs, hadoop_path = _filesystem(spark, path)
+    if fs.exists(hadoop_path):
+        fs.delete(hadoop_path, True)
+
+
+def list_dirs(spark, path):
+    """Return the names of the directories directly under ``path``."""
+    fs, hadoop_path = _filesystem(spark, path)
+    if not fs.exists(hadoop_path):
+        return []
+    return sorted(status.getPath().getName() for status in fs.listStatus(hadoop_path)
+                  if status.isDirectory())
+
+
+def list_files(spark, path):
+    """Return ``(path, length, modification_time)`` for every file under ``path``.
+
+    ``path`` may be a single file, a directory (listed recursively) or a glob.
+    """
+    fs, hadoop_path = _filesystem(spark, path)
+    statuses = fs.globStatus(hadoop_path) or []
+    files = []
+    for status in statuses:
+        if status.isDirectory():
+            iterator = fs.listFiles(status.getPath(), True)
+            while iterator.hasNext():
+                child = iterator.next()
+                files.append((child.getPath().toString(), child.getLen(),
+                              child.getModificationTime()))
+        else:
+            files.append((status.getPath().toString(), status.getLen(),
+                          status.getModificationTime()))
+    return sorted(files)
+
+
+def fingerprint(spark, path, params=None):
+    """Return a content fingerprint of the files under ``path``.
+
+    The fingerprint hashes each file's path, length and modification time
+    together with ``params`` (any JSON-serializable settings that change
+    the output), so it changes whenever the source data or the settings do.
+    """
+    digest = hashlib.sha256()
+    for name, length, modified in list_files(spark, path):
+        digest.update(f"{name}\t{length}\t{modified}\n".encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
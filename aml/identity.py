@@ -0,0 +1,160 @@
+"""Dense integer IDs for accounts and banks through persisted dictionaries.
+
+Account identifiers are hex strings and bank identifiers numeric strings.
+Every window, join and aggregation keyed on them hashes, compares and
+shuffles the full strings. The identity store maps each distinct value to a
+dense integer ID (0, 1, 2, ...). The IDs are ``int`` while the dictionary
+fits into 32 bits and ``bigint`` after that, so the stages after ingestion
+run on fixed-width keys.
+
+The dictionaries are append-only, so an ID never changes once assigned.
+Each ``Date`` partition of the transaction store is added once: its new
+values are sorted and numbered after the existing ones, and written as a
+new ``batch=NNNNNN`` directory of the dictionary. A small ``_CURRENT``
+JSON file lists the committed batches and dates, and it is only rewritten
+after the batches are completely written. An interrupted refresh therefore
+leaves the previous dictionaries intact and is redone on the next run.
+
+``encode_identities`` replaces the identifier columns by their IDs with
+broadcast joins, so the transactions are not shuffled to encode them, and
+``decode_identities`` maps IDs back for reports and alerts.
+"""
+
+import json
+
+from pyspark.sql import functions as F
+from pyspark.sql.types import LongType, StringType, StructField, StructType
+
+from aml import fs
+from aml.ingest import list_dates, read_transactions
+
+CURRENT_FILE = "_CURRENT"
+
+# Dictionary name -> the transaction columns it encodes
+DICTIONARIES = {
+    "account": ["From_Account", "To_Account"],
+    "bank": ["From_Bank", "To_Bank"],
+}
+
+DICTIONARY_SCHEMA = StructType([
+    StructField("Value", StringType(), False),
+    StructField("ID", LongType(), False),
+])
+
+_ENCODED = "_encoded_id"
+
+
+def _read_current(spark, store_path):
+    text = fs.read_text(spark, f"{store_path.rstrip('/')}/{CURRENT_FILE}")
+    return json.loads(text) if text else {"dictionaries": {}, "dates": []}
+
+
+def id_type(size):
+    """Spark SQL type of the IDs of a dictionary with ``size`` entries."""
+    return "int" if size <= 2 ** 31 - 1 else "bigint"
+
+
+def _read_batches(spark, store_path, name, entry):
+    paths = [f"{store_path.rstrip('/')}/{name}/{batch}" for batch in entry["batches"]]
+    return spark.read.schema(DICTIONARY_SCHEMA).parquet(*paths) \
+        .select("Value", F.col("ID").cast(id_type(entry["size"])).alias("ID"))
+
+
+def read_dictionary(spark, store_path, name):
+    """Return the ``Value``/``ID`` rows of dictionary ``name``, with IDs in their compact type."""
+    entry = _read_current(spark, store_path)["dictionaries"].get(name)
+    if not entry or not entry["batches"]:
+        raise ValueError(f"No {name} dictionary at {store_path}")
+    return _read_batches(spark, store_path, name, entry)
+
+
+def _new_entries(spark, store_path, name, entry, values_df):
+    """Number the values of ``values_df`` missing from dictionary ``name`` after its last ID."""
+    new_values = values_df.where(F.col("Value").isNotNull()).distinct()
+    if entry["batches"]:
+        new_values = new_values.join(_read_batches(spark, store_path, name, entry),
+                                     on="Value", how="left_anti")
+    offset = entry["size"]
+    numbered = new_values.orderBy("Value").rdd.zipWithIndex() \
+        .map(lambda pair: (pair[0]["Value"], pair[1] + offset))
+    return spark.createDataFrame(numbered, DICTIONARY_SCHEMA)
+
+
+def refresh_dictionaries(spark, store_path, transactions_store, dictionaries=DICTIONARIES):
+    """Add the values of every ``Date`` partition not yet in the identity store.
+
+    Returns the list of dates that were added.
+    """
+    current = _read_current(spark, store_path)
+    known = set(current["dates"])
+    new_dates = [d for d in list_dates(spark, transactions_store) if d not in known]
+    if not new_dates:
+        return new_dates
+
+    batch_df = read_transactions(
+        spark, transactions_store,
+        columns=[c for columns in dictionaries.values() for c in columns],
+        where=F.col("Date").isin(new_dates))
+    for name, columns in dictionaries.items():
+        entry = current["dictionaries"].get(name, {"batches": [], "size": 0})
+        values = batch_df.select(F.explode(F.array(*columns)).alias("Value"))
+        batch = f"batch={len(entry['batches']):06d}"
+        batch_path = f"{store_path.rstrip('/')}/{name}/{batch}"
+        _new_entries(spark, store_path, name, entry, values).write.mode("overwrite").parquet(batch_path)
+
+        added = spark.read.parquet(batch_path).count()
+        if added:
+            entry = {"batches": entry["batches"] + [batch], "size": entry["size"] + added}
+        else:
+            fs.delete(spark, batch_path)
+        current["dictionaries"][name] = entry
+
+    # The batches only become visible once the pointer lists them
+    current["dates"] = sorted(known | set(new_dates))
+    fs.write_text(spark, f"{store_path.rstrip('/')}/{CURRENT_FILE}", json.dumps(current))
+    return new_dates
+
+
+def dictionary_sizes(spark, store_path):
+    """Return the number of entries of every dictionary in the store."""
+    return {name: entry["size"]
+            for name, entry in _read_current(spark, store_path)["dictionaries"].items()}
+
+
+def encode_identities(spark, store_path, df, dictionaries=DICTIONARIES, broadcast=True):
+    """Replace the identifier columns of ``df`` by their integer IDs.
+
+    Columns keep their names and positions. Values missing from the
+    dictionaries become null, so refresh the store before encoding new
+    data. With ``broadcast`` the dictionaries are broadcast and ``df`` is
+    not shuffled; disable it when the account dictionary is too large for
+    the executors' memory.
+    """
+    columns = df.columns
+    for name, names in dictionaries.items():
+        present = [c for c in names if c in columns]
+        if not present:
+            continue
+        dictionary = read_dictionary(spark, store_path, name)
+        for c in present:
+            lookup = dictionary.select(F.col("Value").alias(c), F.col("ID").alias(_ENCODED))
+            if broadcast:
+                lookup = F.broadcast(lookup)
+            df = df.join(lookup, on=c, how="left").drop(c).withColumnRenamed(_ENCODED, c)
+    return df.select(*columns)
+
+
+def decode_identities(spark, store_path, df, dictionaries=DICTIONARIES, broadcast=True):
+    """Map the integer ID columns of ``df`` back to the original identifiers."""
+    columns = df.columns
+    for name, names in dictionaries.items():
+        present = [c for c in names if c in columns]
+        if not present:
+            continue
+        dictionary = read_dictionary(spark, store_path, name)
+        for c in present:
+            lookup = dictionary.select(F.col("ID").alias(c), F.col("Value").alias(_ENCODED))
+            if broadcast:
+                lookup = F.broadcast(lookup)
+            df = df.join(lookup, on=c, how="left").drop(c).withColumnRenamed(_ENCODED, c)
+    return df.select(*columns)
@@ -0,0 +1,104 @@
+"""Typed, date-partitioned columnar cache of the transactions CSV.
+
+The raw CSV is parsed once into Parquet with a real ``Timestamp``, decimal
+amounts and dictionary-encoded currency and format columns, partitioned by
+transaction ``Date``. A fingerprint of the source files is stored next to
+the Parquet files and the conversion is skipped while it still matches, so
+later runs only pay for reading the columns and dates they use.
+"""
+
+import json
+
+from pyspark.sql import functions as F
+from pyspark.sql.types import DecimalType, StringType, StructField, StructType
+
+from aml import fs
+
+TIMESTAMP_FORMAT = "yyyy/MM/dd HH:mm"
+
+# Scale 8 keeps the smallest Bitcoin amounts exact; precision 24 leaves 16
+# integer digits for the largest amounts in low-value currencies.
+AMOUNT_TYPE = DecimalType(24, 8)
+
+TRANSACTION_COLUMNS = ["Timestamp", "From_Bank", "From_Account", "To_Bank", "To_Account",
+                       "Amount_Received", "Receiving_Currency", "Amount_Paid",
+                       "Payment_Currency", "Payment_Format"]
+AMOUNT_COLUMNS = ["Amount_Received", "Amount_Paid"]
+
+# Every field is read as a string and converted explicitly in ``cast_transactions``
+RAW_SCHEMA = StructType([StructField(c, StringType(), True) for c in TRANSACTION_COLUMNS])
+
+FINGERPRINT_FILE = "_fingerprint.json"
+
+# Bump when the stored layout changes so existing stores are rebuilt
+STORE_VERSION = 1
+
+
+def cast_transactions(df):
+    """Convert raw string transaction columns to their stored types.
+
+    Used for the CSV and for the transactions listed in the patterns file,
+    so both sides of the labeling join carry identical types.
+    """
+    converted = {
+        "Timestamp": F.to_timestamp("Timestamp", TIMESTAMP_FORMAT),
+        **{c: F.col(c).cast(AMOUNT_TYPE) for c in AMOUNT_COLUMNS},
+    }
+    return df.select(*[converted[c].alias(c) if c in converted else F.col(c)
+                       for c in df.columns])
+
+
+def ingest_transactions(spark, csv_path, store_path, force=False):
+    """Convert ``csv_path`` into the Parquet store at ``store_path`` if needed.
+
+    Returns True when the CSV was converted and False when the store was
+    already up to date with the source files.
+    """
+    source_fingerprint = fs.fingerprint(spark, csv_path, {"version": STORE_VERSION})
+    marker_path = f"{store_path.rstrip('/')}/{FINGERPRINT_FILE}"
+
+    stored = fs.read_text(spark, marker_path)
+    if not force and stored and json.loads(stored).get("fingerprint") == source_fingerprint:
+        return False
+
+    raw_df = spark.read.csv(csv_path, schema=RAW_SCHEMA, header=True)
+    typed_df = cast_transactions(raw_df).withColumn("Date", F.to_date("Timestamp"))
+
+    # Overwriting removes the old marker, so an interrupted run is rebuilt next time
+    typed_df.repartition("Date") \
+        .write \
+        .mode("overwrite") \
+        .partitionBy("Date") \
+        .option("parquet.enable.dictionary", "true") \
+        .parquet(store_path)
+
+    fs.write_text(spark, marker_path, json.dumps({
+        "fingerprint": source_fingerprint,
+        "source": csv_path,
+        "version": STORE_VERSION,
+    }))
+    return True
+
+
+def list_dates(spark, store_path):
+    """Return the ``Date`` partitions in the store as sorted ISO date strings.
+
+    Only the directory listing is read, so no Spark job is launched.
+    """
+    return [name.split("=", 1)[1] for name in fs.list_dirs(spark, store_path)
+            if name.startswith("Date=")]
+
+
+def read_transactions(spark, store_path, columns=None, where=None):
+    """Read the transaction store with column pruning and predicate pushdown.
+
+    ``columns`` limits the Parquet columns that are decoded and ``where`` is
+    a Column or SQL expression pushed down to the scan; filters on ``Date``
+    prune whole partitions.
+    """
+    df = spark.read.parquet(store_path)
+    if where is not None:
+        df = df.where(where)
+    if columns is not None:
+        df = df.select(*columns)
+    return df
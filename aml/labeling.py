@@ -0,0 +1,68 @@
+"""Exact labeling of transactions against the laundering patterns.
+
+Each transaction is identified by a 64-bit hash of its full identity
+(timestamp, both banks, both accounts, amounts, currencies and format).
+The laundering set is tiny next to the transactions, so it is
+de-duplicated on that key and broadcast; the transactions are labeled by a
+broadcast hash join without being shuffled, and every transaction matches
+at most one laundering row.
+"""
+
+from pyspark.sql import functions as F
+
+from aml.ingest import TRANSACTION_COLUMNS, cast_transactions
+
+KEY_COLUMN = "Transaction_Key"
+
+
+def transaction_key(columns=TRANSACTION_COLUMNS):
+    """Return the 64-bit xxHash of the transaction identity columns.
+
+    With tens of millions of transactions and thousands of laundering rows
+    the chance of a 64-bit collision is negligible, so matching on the key
+    is exact in practice.
+    """
+    return F.xxhash64(*columns)
+
+
+def label_transactions(transactions_df, laundering_df, label_col="isLaundering",
+                       extra_cols=("Attempt_ID", "Pattern_Type"), broadcast=True):
+    """Left-join the laundering labels onto ``transactions_df``.
+
+    ``laundering_df`` must hold the transaction identity columns (raw
+    strings from the patterns file are cast like the transaction store),
+    ``label_col`` and ``extra_cols``. Unmatched transactions get a label of
+    0 and null extras. Set ``broadcast=False`` if the laundering set is too
+    large to broadcast.
+    """
+    laundering_keys = cast_transactions(laundering_df) \
+        .select(transaction_key().alias(KEY_COLUMN), label_col, *extra_cols) \
+        .dropDuplicates([KEY_COLUMN])
+    if broadcast:
+        laundering_keys = F.broadcast(laundering_keys)
+
+    keyed = transactions_df.withColumn(KEY_COLUMN, transaction_key())
+    return keyed.join(laundering_keys, on=KEY_COLUMN, how="left") \
+        .withColumn(label_col, F.coalesce(F.col(label_col), F.lit(0)).cast("integer"))
+
+
+def check_labeling(transactions_df, labeled_df, laundering_df, label_col="isLaundering"):
+    """Verify that labeling neither dropped nor duplicated transactions.
+
+    Returns the row counts and the number of laundering rows that matched a
+    transaction, and raises ValueError if the labeled row count differs from
+    the input row count.
+    """
+    transactions = transactions_df.count()
+    counts = labeled_df.agg(F.count(F.lit(1)).alias("rows"),
+                            F.sum(label_col).alias("laundering")).first()
+    report = {
+        "transactions": transactions,
+        "labeled": counts["rows"],
+        "laundering_matched": counts["laundering"] or 0,
+        "laundering_listed": laundering_df.count(),
+    }
+    if report["labeled"] != transactions:
+        raise ValueError(
+            f"Labeling changed the row count from {transactions} to {report['labeled']}")
+    return report
@@ -0,0 +1,58 @@
+"""Small helpers for reporting stage throughput and memory."""
+
+import resource
+import sys
+import time
+
+
+def peak_driver_memory_mb(spark=None):
+    """Return the driver's peak memory use in MB.
+
+    ``python_rss_mb`` is the peak resident set size of the Python driver
+    process. When a SparkSession is given, ``jvm_heap_mb`` adds the summed
+    peak usage of the driver JVM's heap pools (in local mode this JVM also
+    hosts the executors).
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    memory = {"python_rss_mb": round(rss_mb, 1)}
+
+    if spark is not None:
+        management = spark.sparkContext._jvm.java.lang.management.ManagementFactory
+        heap_bytes = 0
+        for pool in management.getMemoryPoolMXBeans():
+            if pool.getType().toString() == "Heap memory":
+                heap_bytes += pool.getPeakUsage().getUsed()
+        memory["jvm_heap_mb"] = round(heap_bytes / (1024 * 1024), 1)
+
+    return memory
+
+
+def measure_rows(df, spark=None, label="rows"):
+    """Cache and count ``df``, returning row throughput and peak driver memory.
+
+    The DataFrame is left cached so the caller can reuse the materialized
+    rows without recomputing them.
+    """
+    start = time.perf_counter()
+    rows = df.cache().count()
+    seconds = time.perf_counter() - start
+
+    report = {
+        label: rows,
+        "seconds": round(seconds, 3),
+        f"{label}_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+    }
+    report.update(peak_driver_memory_mb(spark))
+    return report
+
+
+def cached_storage_mb(spark):
+    """Return the memory and disk used by all cached DataFrames and RDDs, in MB."""
+    memory_bytes = disk_bytes = 0
+    for info in spark.sparkContext._jsc.sc().getRDDStorageInfo():
+        memory_bytes += info.memSize()
+        disk_bytes += info.diskSize()
+    return {"cached_memory_mb": round(memory_bytes / (1024 * 1024), 1),
+            "cached_disk_mb": round(disk_bytes / (1024 * 1024), 1)}
@@ -0,0 +1,176 @@
+"""Time-bounded transaction graph motifs per transaction.
+
+The laundering typologies of the patterns file (FAN-OUT, FAN-IN, CYCLE,
+SCATTER-GATHER, ...) are shapes in the account-to-account graph, which
+per-account counts do not capture. Here the transactions are turned into
+an edge list of ``(Key, Src, Dst, Ts)`` rows and every transaction gets:
+
+- ``Fan_Out_Degree`` / ``Fan_In_Degree``: distinct receivers of its
+  sender, and distinct senders of its receiver, in the same time bucket;
+- ``Scatter_Gather_Width``: for the two-hop paths ``a -> m -> c`` through
+  this transaction (as either hop, with the second hop at most one window
+  after the first), the largest number of distinct intermediaries ``m``
+  between the same ``a`` and ``c`` in the bucket. 1 is a plain chain and
+  larger values are scatter-gather;
+- ``Cycle_Length``: the length of the shortest time-respecting cycle that
+  starts with this transaction and returns to its sender within one
+  window, up to ``max_cycle_length`` hops (0 if none);
+- ``Hub_Edge``: 1 if the sender or the receiver is a hub in the bucket,
+  else 0. It is an integer so it can go into a model's features as is.
+
+Time is cut into buckets of ``window_seconds``. The path joins are
+equi-joins on ``(account, bucket)`` plus a time filter, so they are
+partitioned by account and time instead of comparing all pairs. Hubs are
+the accounts with more than ``max_degree`` distinct counterparties in a
+bucket. They end no path but are never expanded through, which bounds the
+fan-out of every join. The cycle search keeps, per starting transaction,
+only the earliest arrival at each account. A later arrival at the same
+account cannot reach anything the earlier one cannot, so the frontier
+stays at most one row per reachable account.
+"""
+
+from pyspark.sql import functions as F
+
+from aml.labeling import KEY_COLUMN
+
+MOTIF_COLUMNS = ["Fan_Out_Degree", "Fan_In_Degree", "Scatter_Gather_Width", "Cycle_Length",
+                 "Hub_Edge"]
+
+WINDOW_SECONDS = 24 * 3600
+
+
+def edge_list(df, source_col="From_Account", target_col="To_Account", timestamp_col="Timestamp",
+              key_col=KEY_COLUMN, window_seconds=WINDOW_SECONDS):
+    """Return the ``Key``, ``Src``, ``Dst``, ``Ts`` (seconds) and ``Bucket`` of every transfer.
+
+    Transfers of an account to itself are not edges of any motif and are
+    left out.
+    """
+    ts = F.col(timestamp_col).cast("long")
+    return df.select(F.col(key_col).alias("Key"), F.col(source_col).alias("Src"),
+                     F.col(target_col).alias("Dst"), ts.alias("Ts"),
+                     F.floor(ts / window_seconds).alias("Bucket")) \
+        .where(F.col("Src").isNotNull() & F.col("Dst").isNotNull()
+               & (F.col("Src") != F.col("Dst")))
+
+
+def account_degrees(edges):
+    """Distinct receivers (``Out_Degree``) and senders (``In_Degree``) per account and bucket."""
+    out_degree = edges.groupBy(F.col("Src").alias("Account"), "Bucket") \
+        .agg(F.countDistinct("Dst").alias("Out_Degree"))
+    in_degree = edges.groupBy(F.col("Dst").alias("Account"), "Bucket") \
+        .agg(F.countDistinct("Src").alias("In_Degree"))
+    return out_degree.join(in_degree, on=["Account", "Bucket"], how="full") \
+        .fillna(0, subset=["Out_Degree", "In_Degree"])
+
+
+def _next_hops(paths, edges, window_seconds):
+    """Extend ``paths`` ending at ``Node`` with every edge leaving it within the time limit.
+
+    ``paths`` carries ``Arrival`` (the time of its last edge) and ``Start``
+    (the time that bounds the path). Edges are matched in the bucket of
+    ``Start`` and the next one, which cover ``(Arrival, Start + window]``.
+    """
+    start_bucket = F.floor(F.col("Start") / window_seconds)
+    candidates = paths.withColumn("Bucket", F.explode(F.array(start_bucket, start_bucket + 1)))
+    hops = edges.select(F.col("Src").alias("Node"), "Bucket", F.col("Key").alias("Hop_Key"),
+                        F.col("Dst").alias("Next"), F.col("Ts").alias("Hop_Ts"))
+    return candidates.join(hops, on=["Node", "Bucket"]) \
+        .where((F.col("Hop_Ts") > F.col("Arrival"))
+               & (F.col("Hop_Ts") <= F.col("Start") + window_seconds)) \
+        .drop("Bucket")
+
+
+def _not_hub(df, hubs, account_col, ts_col, window_seconds):
+    """Rows of ``df`` whose ``account_col`` is not a hub in the bucket of ``ts_col``."""
+    return df.withColumn("Bucket", F.floor(F.col(ts_col) / window_seconds)) \
+        .join(F.broadcast(hubs.withColumnRenamed("Account", account_col)),
+              on=[account_col, "Bucket"], how="left_anti") \
+        .drop("Bucket")
+
+
+def scatter_gather_widths(edges, hubs, window_seconds):
+    """``Key`` and the widest scatter-gather (``Scatter_Gather_Width``) each edge takes part in."""
+    paths = _next_hops(
+        _not_hub(edges, hubs, "Dst", "Ts", window_seconds)
+        .select("Key", F.col("Src").alias("Origin"), F.col("Dst").alias("Node"),
+                F.col("Ts").alias("Arrival"), F.col("Ts").alias("Start")),
+        edges, window_seconds) \
+        .where(F.col("Next") != F.col("Origin")) \
+        .withColumn("Origin_Bucket", F.floor(F.col("Start") / window_seconds)) \
+        .localCheckpoint()
+
+    widths = paths.groupBy("Origin", "Next", "Origin_Bucket") \
+        .agg(F.countDistinct("Node").alias("Scatter_Gather_Width"))
+    per_path = paths.join(widths, on=["Origin", "Next", "Origin_Bucket"])
+    roles = per_path.select("Key", "Scatter_Gather_Width") \
+        .unionByName(per_path.select(F.col("Hop_Key").alias("Key"), "Scatter_Gather_Width"))
+    return roles.groupBy("Key").agg(F.max("Scatter_Gather_Width").alias("Scatter_Gather_Width"))
+
+
+def cycle_lengths(edges, hubs, window_seconds, max_cycle_length=4):
+    """``Key`` and the shortest cycle (``Cycle_Length``) each edge starts, searched hop by hop."""
+    frontier = _not_hub(edges, hubs, "Dst", "Ts", window_seconds) \
+        .select("Key", F.col("Src").alias("Origin"), F.col("Dst").alias("Node"),
+                F.col("Ts").alias("Arrival"), F.col("Ts").alias("Start"))
+    closed = []
+    for length in range(2, max_cycle_length + 1):
+        extended = _next_hops(frontier, edges, window_seconds).localCheckpoint()
+        closed.append(extended.where(F.col("Next") == F.col("Origin"))
+                      .select("Key", F.lit(length).alias("Cycle_Length")))
+        if length == max_cycle_length:
+            break
+        open_paths = extended.where(F.col("Next") != F.col("Origin"))
+        frontier = _not_hub(open_paths, hubs, "Next", "Hop_Ts", window_seconds) \
+            .groupBy("Key", "Origin", F.col("Next").alias("Node"), "Start") \
+            .agg(F.min("Hop_Ts").alias("Arrival"))
+
+    cycles = closed[0]
+    for other in closed[1:]:
+        cycles = cycles.unionByName(other)
+    return cycles.groupBy("Key").agg(F.min("Cycle_Length").alias("Cycle_Length"))
+
+
+def motif_table(df, source_col="From_Account", target_col="To_Account", timestamp_col="Timestamp",
+                key_col=KEY_COLUMN, window_seconds=WINDOW_SECONDS, max_cycle_length=4,
+                max_degree=50):
+    """Return one row of ``MOTIF_COLUMNS`` per transaction key of ``df``.
+
+    The intermediate paths of every hop are materialized with
+    ``localCheckpoint`` as the search runs, so each join starts from
+    stored rows instead of the growing lineage.
+    """
+    edges = edge_list(df, source_col, target_col, timestamp_col, key_col, window_seconds) \
+        .localCheckpoint()
+    degrees = account_degrees(edges) \
+        .withColumn("Hub", (F.col("Out_Degree") > max_degree) | (F.col("In_Degree") > max_degree)) \
+        .localCheckpoint()
+    hubs = degrees.where(F.col("Hub")).select("Account", "Bucket")
+
+    sender = degrees.select(F.col("Account").alias("Src"), "Bucket",
+                            F.col("Out_Degree").alias("Fan_Out_Degree"), F.col("Hub").alias("Src_Hub"))
+    receiver = degrees.select(F.col("Account").alias("Dst"), "Bucket",
+                              F.col("In_Degree").alias("Fan_In_Degree"), F.col("Hub").alias("Dst_Hub"))
+
+    fans = edges.join(sender, on=["Src", "Bucket"]).join(receiver, on=["Dst", "Bucket"]) \
+        .groupBy("Key") \
+        .agg(F.max("Fan_Out_Degree").alias("Fan_Out_Degree"),
+             F.max("Fan_In_Degree").alias("Fan_In_Degree"),
+             F.max(F.col("Src_Hub") | F.col("Dst_Hub")).cast("int").alias("Hub_Edge"))
+
+    return fans \
+        .join(scatter_gather_widths(edges, hubs, window_seconds), on="Key", how="left") \
+        .join(cycle_lengths(edges, hubs, window_seconds, max_cycle_length), on="Key", how="left") \
+        .fillna(0, subset=["Scatter_Gather_Width", "Cycle_Length"]) \
+        .withColumnRenamed("Key", key_col) \
+        .select(key_col, *MOTIF_COLUMNS)
+
+
+def motif_features(df, key_col=KEY_COLUMN, **options):
+    """Add ``MOTIF_COLUMNS`` to ``df``, joined on ``key_col``; see ``motif_table`` for ``options``.
+
+    Self-transfers and transactions with a missing account get zero
+    degrees and widths, no cycle and ``Hub_Edge`` 0.
+    """
+    motifs = motif_table(df, key_col=key_col, **options)
+    return df.join(motifs, on=key_col, how="left").fillna(0, subset=MOTIF_COLUMNS)
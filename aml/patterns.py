@@ -0,0 +1,127 @@
+"""Partition-parallel parser for the ``*_Patterns.txt`` laundering-attempt files.
+
+The patterns file lists laundering attempts as blocks::
+
+    BEGIN LAUNDERING ATTEMPT - FAN-OUT:  Max 16-degree Fan-Out
+    2022/09/01 00:06,021174,800737690,012,80011F990,2848.96,Euro,2848.96,Euro,ACH,1
+    ...
+    END LAUNDERING ATTEMPT - FAN-OUT
+
+A block can start in one partition of the text file and end in another, so
+parsing is a two-pass parallel prefix scan. The first pass summarizes each
+partition (how many blocks start in it, and which block is still open at
+its end). The driver turns these summaries into the state every partition
+starts in, and the second pass parses each partition independently,
+splitting every transaction line exactly once.
+
+``parse_pattern_lines`` runs the same parser over one sequence of lines
+without Spark, for the single-node engine (``aml.single_node``); pyspark
+is only imported by ``parse_patterns``.
+"""
+
+BEGIN_MARKER = "BEGIN LAUNDERING ATTEMPT"
+END_MARKER = "END LAUNDERING ATTEMPT"
+
+TRANSACTION_FIELDS = ["Timestamp", "From_Bank", "From_Account", "To_Bank", "To_Account",
+                      "Amount_Received", "Receiving_Currency", "Amount_Paid",
+                      "Payment_Currency", "Payment_Format"]
+
+PATTERNS_COLUMNS = ["Attempt_ID", "Pattern_Type", *TRANSACTION_FIELDS, "isLaundering"]
+
+
+def patterns_schema():
+    """Spark schema of the parsed rows, in ``PATTERNS_COLUMNS`` order."""
+    from pyspark.sql.types import IntegerType, LongType, StringType, StructField, StructType
+
+    return StructType(
+        [StructField("Attempt_ID", LongType(), False),
+         StructField("Pattern_Type", StringType(), True)]
+        + [StructField(name, StringType(), True) for name in TRANSACTION_FIELDS]
+        + [StructField("isLaundering", IntegerType(), True)]
+    )
+
+
+def _pattern_type(line):
+    """Return the typology after ``BEGIN LAUNDERING ATTEMPT - ``."""
+    _, _, pattern_type = line.partition(" - ")
+    return pattern_type.strip() or None
+
+
+def _summarize_partition(index, lines):
+    """Pass 1: count block starts and report whether a block is open at the end.
+
+    ``ends_open`` is None when the partition holds no marker at all, so the
+    state of the previous partition carries through it unchanged.
+    """
+    begins = 0
+    last_pattern = None
+    ends_open = None
+    for line in lines:
+        if line.startswith(BEGIN_MARKER):
+            begins += 1
+            last_pattern = _pattern_type(line)
+            ends_open = True
+        elif line.startswith(END_MARKER):
+            ends_open = False
+    yield index, begins, last_pattern, ends_open
+
+
+def _partition_start_states(summaries):
+    """Turn per-partition summaries into the state each partition starts in.
+
+    The state is ``(attempt_id, pattern_type, is_open)`` where ``attempt_id``
+    is the ID of the last block started before the partition (``-1`` if
+    none).
+    """
+    states = {}
+    attempt_id, pattern_type, is_open = -1, None, False
+    for index, begins, last_pattern, ends_open in sorted(summaries):
+        states[index] = (attempt_id, pattern_type, is_open)
+        attempt_id += begins
+        if begins:
+            pattern_type = last_pattern
+        if ends_open is not None:
+            is_open = ends_open
+    return states
+
+
+def _parse_partition(states):
+    def parse(index, lines):
+        attempt_id, pattern_type, is_open = states[index]
+        for line in lines:
+            if line.startswith(BEGIN_MARKER):
+                attempt_id += 1
+                pattern_type = _pattern_type(line)
+                is_open = True
+            elif line.startswith(END_MARKER):
+                is_open = False
+            elif is_open:
+                fields = line.split(",")
+                if len(fields) != len(TRANSACTION_FIELDS) + 1:
+                    continue
+                label = fields[-1].strip()
+                yield (attempt_id, pattern_type, *fields[:-1],
+                       int(label) if label.isdigit() else None)
+    return parse
+
+
+def parse_pattern_lines(lines):
+    """Yield the ``PATTERNS_COLUMNS`` tuple of every transaction in ``lines``, in order."""
+    return _parse_partition({0: (-1, None, False)})(0, (line.rstrip("\r\n") for line in lines))
+
+
+def parse_patterns(spark, path, min_partitions=None):
+    """Parse a laundering-patterns file into one row per transaction.
+
+    Every transaction is tagged with the ``Attempt_ID`` of its block (a
+    0-based position of the block in the file) and its ``Pattern_Type``.
+    Transaction fields are kept as the strings found in the file.
+    """
+    sc = spark.sparkContext
+    lines = sc.textFile(path, minPartitions=min_partitions or sc.defaultParallelism)
+
+    summaries = lines.mapPartitionsWithIndex(_summarize_partition).collect()
+    states = _partition_start_states(summaries)
+
+    rows = lines.mapPartitionsWithIndex(_parse_partition(states))
+    return spark.createDataFrame(rows, patterns_schema())
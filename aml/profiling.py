@@ -0,0 +1,196 @@
+"""Per-stage profiling of the pipeline with Spark's task metrics.
+
+``StageProfiler`` splits a run into named stages (ingest, pattern parse,
+label join, ...). Every Spark job started during a stage is tagged with
+the stage's job group. When the stage ends, its metrics are read back from
+the application status store that Spark's own listener fills, through the
+REST API of the driver UI:
+
+- wall time, and the number of jobs, Spark stages and tasks;
+- input, output, shuffle read and shuffle write bytes;
+- memory and disk spill, executor run time and GC time;
+- task skew: over the stage's Spark stages, the largest ratio between the
+  slowest and the median task;
+- the size of the cached data and the driver's peak memory when the stage
+  ends.
+
+When the UI is disabled or does not answer, a stage records only its wall
+time, cached data and driver memory.
+
+``finish`` writes everything as one JSON report per run, and
+``compare_reports`` lines up two reports so regressions show per stage.
+"""
+
+import json
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+from aml import fs
+from aml.metrics import cached_storage_mb, peak_driver_memory_mb
+
+# Stage fields of the REST API that are summed into the report
+_SUMMED_FIELDS = {
+    "inputBytes": "input_bytes",
+    "outputBytes": "output_bytes",
+    "shuffleReadBytes": "shuffle_read_bytes",
+    "shuffleWriteBytes": "shuffle_write_bytes",
+    "memoryBytesSpilled": "memory_spilled_bytes",
+    "diskBytesSpilled": "disk_spilled_bytes",
+    "executorRunTime": "executor_run_ms",
+    "jvmGcTime": "gc_ms",
+    "numTasks": "tasks",
+}
+
+COMPARED_FIELDS = ("seconds", "input_bytes", "shuffle_read_bytes", "shuffle_write_bytes",
+                   "disk_spilled_bytes", "gc_ms", "max_task_skew", "cached_memory_mb")
+
+
+def _empty_metrics():
+    metrics = {field: 0 for field in _SUMMED_FIELDS.values()}
+    metrics.update({"jobs": 0, "spark_stages": 0, "max_task_skew": None})
+    return metrics
+
+
+class StageProfiler:
+    """Record wall time and Spark metrics for consecutive named stages.
+
+    Call ``start(name)`` at the beginning of each stage; it ends the
+    previous one. Call ``finish()`` at the end of the run to close the last
+    stage and get (and optionally write) the report.
+    """
+
+    def __init__(self, spark, report_path=None, run_name=None):
+        self.spark = spark
+        self.report_path = report_path
+        self.run_name = run_name or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.stages = []
+        self._current = None
+        self._annotations = {}
+        self._started = time.perf_counter()
+
+    def start(self, name):
+        """End the running stage, if any, and start timing ``name``."""
+        self.stop()
+        group = f"{self.run_name}:{name}"
+        self.spark.sparkContext.setJobGroup(group, name)
+        self._current = (name, group, time.perf_counter())
+
+    def annotate(self, **fields):
+        """Add ``fields`` (e.g. ``rows=...``) to the record of the running stage."""
+        self._annotations.update(fields)
+
+    def stop(self):
+        """End the running stage and record its metrics."""
+        if self._current is None:
+            return
+        name, group, started = self._current
+        seconds = time.perf_counter() - started
+        self._current = None
+        self.spark.sparkContext.setLocalProperty("spark.jobGroup.id", None)
+
+        record = {"stage": name, "seconds": round(seconds, 3)}
+        record.update(self._annotations)
+        self._annotations = {}
+        record.update(self._spark_metrics(group))
+        record.update(cached_storage_mb(self.spark))
+        record.update(peak_driver_memory_mb(self.spark))
+        self.stages.append(record)
+
+    def finish(self):
+        """Close the last stage, write the report if a path was given and return it."""
+        self.stop()
+        sc = self.spark.sparkContext
+        report = {
+            "run": self.run_name,
+            "app_id": sc.applicationId,
+            "spark_version": self.spark.version,
+            "default_parallelism": sc.defaultParallelism,
+            "total_seconds": round(time.perf_counter() - self._started, 3),
+            "stages": self.stages,
+        }
+        if self.report_path is not None:
+            fs.write_text(self.spark, self.report_path, json.dumps(report, indent=2))
+        return report
+
+    def _get(self, path):
+        sc = self.spark.sparkContext
+        url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}{path}"
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                return json.load(response)
+        except urllib.error.HTTPError:
+            # The UI answered, but without this resource; connection failures
+            # propagate to _spark_metrics
+            return None
+
+    def _spark_metrics(self, group):
+        """Sum the task metrics of every Spark stage run by the jobs of ``group``."""
+        if self.spark.sparkContext.uiWebUrl is None:
+            # Without the UI there is no status REST API; only wall time is recorded
+            return _empty_metrics()
+        try:
+            return self._rest_metrics(group)
+        except OSError:
+            # URLError (refused or unreachable UI) and socket timeouts are both
+            # OSErrors. The stage keeps its wall time rather than failing the run
+            return _empty_metrics()
+
+    def _rest_metrics(self, group):
+        metrics = _empty_metrics()
+        job_ids = set(self.spark.sparkContext.statusTracker().getJobIdsForGroup(group))
+        # The status store is filled asynchronously from the listener bus, so
+        # give the last job's end event a moment to arrive
+        for _ in range(50):
+            jobs = [job for job in self._get("/jobs") or [] if job["jobId"] in job_ids]
+            if len(jobs) == len(job_ids) and all(job["status"] != "RUNNING" for job in jobs):
+                break
+            time.sleep(0.1)
+        stage_ids = sorted({stage_id for job in jobs for stage_id in job["stageIds"]})
+        metrics["jobs"] = len(jobs)
+
+        skews = []
+        for stage_id in stage_ids:
+            for attempt in self._get(f"/stages/{stage_id}?details=false") or []:
+                if attempt["status"] == "SKIPPED":
+                    continue
+                metrics["spark_stages"] += 1
+                for source, target in _SUMMED_FIELDS.items():
+                    metrics[target] += attempt.get(source, 0)
+                summary = self._get(f"/stages/{stage_id}/{attempt['attemptId']}"
+                                    f"/taskSummary?quantiles=0.5,1.0")
+                if summary:
+                    median, slowest = summary["executorRunTime"]
+                    if median > 0:
+                        skews.append(slowest / median)
+        if skews:
+            metrics["max_task_skew"] = round(max(skews), 2)
+        return metrics
+
+
+def read_report(spark, path):
+    """Load a report written by :meth:`StageProfiler.finish`."""
+    return json.loads(fs.read_text(spark, path))
+
+
+def compare_reports(baseline, current, fields=COMPARED_FIELDS):
+    """Compare two reports stage by stage.
+
+    Returns one row per stage present in either report, with the baseline
+    and current value of each field and their ratio (current / baseline).
+    """
+    before = {stage["stage"]: stage for stage in baseline["stages"]}
+    after = {stage["stage"]: stage for stage in current["stages"]}
+    names = list(before) + [name for name in after if name not in before]
+
+    rows = []
+    for name in names:
+        row = {"stage": name}
+        for field in fields:
+            old = before.get(name, {}).get(field)
+            new = after.get(name, {}).get(field)
+            row[field] = {"baseline": old, "current": new,
+                          "ratio": round(new / old, 3) if old and new is not None else None}
+        rows.append(row)
+    return rows
@@ -0,0 +1,285 @@
+"""Compiled in-process scorer for the trained RandomForest.
+
+``export_random_forest`` walks the trees of a Spark
+``RandomForestClassificationModel`` once and flattens them into NumPy
+arrays: one row per node holding the split feature, threshold, child
+indices, leaf class distribution and training cover. ``CompiledForest``
+scores from those arrays without a JVM:
+
+- ``predict_proba`` scores a batch by advancing every (row, tree) pair one
+  level per step with vectorized indexing;
+- ``predict_one`` is a plain-Python fast path for a single transaction.
+
+Probabilities follow Spark's definition: the mean over trees of the
+normalized class distribution of the leaf each tree reaches.
+
+This module does not import pyspark, so a scoring process only needs NumPy
+and the saved ``.npz`` file.
+"""
+
+import time
+
+import numpy as np
+
+LEAF = -1
+
+
+class CompiledForest:
+    """Array-based tree ensemble exported from Spark.
+
+    Node arrays are indexed by a global node ID. ``feature`` is ``LEAF`` for
+    leaves. A continuous split sends a row left when
+    ``x[feature] <= threshold``. A categorical split sends it left when
+    ``left_categories[node, int(x[feature])]`` is set.
+    """
+
+    def __init__(self, roots, feature, threshold, left, right, value, cover,
+                 is_categorical, left_categories, feature_names, max_depth):
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.cover = np.asarray(cover, dtype=np.float64)
+        self.is_categorical = np.asarray(is_categorical, dtype=bool)
+        self.left_categories = np.asarray(left_categories, dtype=bool)
+        self.feature_names = list(feature_names)
+        self.max_depth = int(max_depth)
+
+        # Python lists are faster than NumPy scalars for the single-row path
+        self._row_tables = (self.feature.tolist(), self.threshold.tolist(),
+                            self.left.tolist(), self.right.tolist(),
+                            [frozenset(np.flatnonzero(row).tolist()) if categorical else None
+                             for row, categorical in zip(self.left_categories, self.is_categorical)],
+                            self.value.tolist())
+
+    @property
+    def num_trees(self):
+        return len(self.roots)
+
+    @property
+    def num_classes(self):
+        return self.value.shape[1]
+
+    def leaves(self, X):
+        """Return the leaf node reached by every row in every tree, shape (n, trees)."""
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.num_trees)).copy()
+        num_categories = self.left_categories.shape[1]
+
+        for _ in range(self.max_depth):
+            feature = self.feature[nodes]
+            internal = feature != LEAF
+            if not internal.any():
+                break
+            x = X[rows, np.where(internal, feature, 0)]
+            go_left = x <= self.threshold[nodes]
+            categorical = self.is_categorical[nodes]
+            if categorical.any():
+                category = np.clip(np.nan_to_num(x, nan=num_categories), 0,
+                                   num_categories - 1).astype(np.int64)
+                in_left = self.left_categories[nodes, category] & (x < num_categories)
+                go_left = np.where(categorical, in_left, go_left)
+            child = np.where(go_left, self.left[nodes], self.right[nodes])
+            nodes = np.where(internal, child, nodes)
+        return nodes
+
+    def predict_proba(self, X):
+        """Return class probabilities for a batch, shape (n, classes)."""
+        summed = self.value[self.leaves(X)].sum(axis=1)
+        totals = summed.sum(axis=1, keepdims=True)
+        return np.divide(summed, totals, out=np.zeros_like(summed), where=totals > 0)
+
+    def predict_one(self, x):
+        """Return the class probabilities of a single row as a list."""
+        feature, threshold, left, right, categories, value = self._row_tables
+        x = [float(v) for v in x]
+        summed = [0.0] * self.num_classes
+        for node in self.roots.tolist():
+            while feature[node] != LEAF:
+                v = x[feature[node]]
+                if categories[node] is not None:
+                    go_left = v.is_integer() and int(v) in categories[node]
+                else:
+                    go_left = v <= threshold[node]
+                node = left[node] if go_left else right[node]
+            leaf = value[node]
+            for k in range(len(summed)):
+                summed[k] += leaf[k]
+        total = sum(summed)
+        return [s / total for s in summed] if total > 0 else summed
+
+    def save(self, path):
+        """Write the forest to a compressed ``.npz`` file."""
+        np.savez_compressed(
+            path, roots=self.roots, feature=self.feature, threshold=self.threshold,
+            left=self.left, right=self.right, value=self.value, cover=self.cover,
+            is_categorical=self.is_categorical, left_categories=self.left_categories,
+            feature_names=np.array(self.feature_names), max_depth=np.array(self.max_depth))
+
+    @classmethod
+    def load(cls, path):
+        """Load a forest written by :meth:`save`."""
+        with np.load(path) as arrays:
+            return cls(arrays["roots"], arrays["feature"], arrays["threshold"],
+                       arrays["left"], arrays["right"], arrays["value"], arrays["cover"],
+                       arrays["is_categorical"], arrays["left_categories"],
+                       arrays["feature_names"].tolist(), int(arrays["max_depth"]))
+
+
+def _random_forest_stage(model):
+    """Return ``(rf_model, feature_names, bins)`` from a RandomForest or a PipelineModel.
+
+    ``bins`` maps a Bucketizer output column to its ``(input column, splits)``.
+    """
+    stages = getattr(model, "stages", [model])
+    rf_model = stages[-1]
+    feature_names = None
+    bins = {}
+    for stage in stages:
+        if type(stage).__name__ == "VectorAssembler":
+            feature_names = stage.getInputCols()
+        elif type(stage).__name__ == "Bucketizer" and stage.isSet(stage.splitsArray):
+            for input_col, output_col, splits in zip(stage.getInputCols(), stage.getOutputCols(),
+                                                     stage.getSplitsArray()):
+                bins[output_col] = (input_col, splits)
+    if feature_names is None:
+        feature_names = [f"f{i}" for i in range(rf_model.numFeatures)]
+    return rf_model, feature_names, bins
+
+
+def input_columns(model):
+    """Return the raw columns the forest of ``model`` reads, Bucketizer outputs mapped to inputs."""
+    _, feature_names, bins = _random_forest_stage(model)
+    return [bins[name][0] if name in bins else name for name in feature_names]
+
+
+def _unbin(feature, threshold, is_categorical, feature_names, bins):
+    """Rewrite splits on Bucketizer bins as splits on the raw input columns.
+
+    A row is in bin ``b`` when ``splits[b] <= value < splits[b + 1]``, so
+    ``bin <= t`` holds exactly when ``value < splits[floor(t) + 1]``; the
+    raw threshold is the largest float below that split. The forest then
+    takes the raw feature values and needs no binning at scoring time.
+    """
+    feature_names = list(feature_names)
+    threshold = np.array(threshold, dtype=np.float64)
+    for index, name in enumerate(feature_names):
+        if name not in bins:
+            continue
+        input_col, splits = bins[name]
+        nodes = (feature == index) & ~is_categorical
+        upper = np.clip(np.floor(threshold[nodes]).astype(np.int64) + 1, 0, len(splits) - 1)
+        threshold[nodes] = np.nextafter(np.asarray(splits, dtype=np.float64)[upper], -np.inf)
+        feature_names[index] = input_col
+    return threshold, feature_names
+
+
+def export_random_forest(model):
+    """Flatten a Spark RandomForest (or a PipelineModel ending in one) into a CompiledForest.
+
+    The feature names come from the pipeline's VectorAssembler, so the
+    exported forest expects its columns in that order. Features binned by a
+    Bucketizer stage are exported as their raw input columns.
+    """
+    rf_model, feature_names, bins = _random_forest_stage(model)
+    nodes = {}
+    roots = []
+    next_slot = 0
+
+    for tree in rf_model.trees:
+        roots.append(next_slot)
+        stack = [(tree._java_obj.rootNode(), next_slot)]
+        next_slot += 1
+        while stack:
+            node, slot = stack.pop()
+            stats = node.impurityStats()
+            distribution = np.array(list(stats.stats()), dtype=np.float64)
+            total = distribution.sum()
+            if total > 0:
+                distribution /= total
+
+            if node.getClass().getSimpleName() == "LeafNode":
+                nodes[slot] = (LEAF, 0.0, LEAF, LEAF, distribution, stats.count(), False, ())
+                continue
+
+            split = node.split()
+            left_slot, right_slot = next_slot, next_slot + 1
+            next_slot += 2
+            if split.getClass().getSimpleName() == "CategoricalSplit":
+                left_categories = tuple(int(c) for c in split.leftCategories())
+                nodes[slot] = (split.featureIndex(), 0.0, left_slot, right_slot,
+                               distribution, stats.count(), True, left_categories)
+            else:
+                nodes[slot] = (split.featureIndex(), split.threshold(), left_slot, right_slot,
+                               distribution, stats.count(), False, ())
+            stack.append((node.rightChild(), right_slot))
+            stack.append((node.leftChild(), left_slot))
+
+    rows = [nodes[slot] for slot in range(next_slot)]
+    feature, threshold, left, right, value, cover, is_categorical, categories = zip(*rows)
+    num_categories = max((max(c) + 1 for c in categories if c), default=1)
+    left_categories = np.zeros((len(rows), num_categories), dtype=bool)
+    for slot, cats in enumerate(categories):
+        left_categories[slot, list(cats)] = True
+
+    feature, is_categorical = np.array(feature), np.array(is_categorical)
+    threshold, feature_names = _unbin(feature, threshold, is_categorical, feature_names, bins)
+    return CompiledForest(roots, feature, threshold, left, right, np.stack(value), cover,
+                          is_categorical, left_categories, feature_names,
+                          max_depth=max(tree.depth for tree in rf_model.trees))
+
+
+def check_parity(forest, predictions_df, features_col="features",
+                 probability_col="probability", sample_rows=10000, feature_columns=None):
+    """Compare the compiled forest with Spark's probabilities on scored rows.
+
+    ``predictions_df`` is the output of the Spark model's ``transform``.
+    The forest's input is read from the ``features_col`` vector, or from
+    the raw ``feature_columns`` when the pipeline bins its features.
+    Returns the number of rows compared and the largest absolute difference
+    in any class probability.
+    """
+    if feature_columns is not None:
+        rows = predictions_df.select(*feature_columns, probability_col).limit(sample_rows).collect()
+        X = np.array([[row[c] for c in feature_columns] for row in rows], dtype=np.float64)
+    else:
+        rows = predictions_df.select(features_col, probability_col).limit(sample_rows).collect()
+        X = np.array([row[features_col].toArray() for row in rows])
+    expected = np.array([row[probability_col].toArray() for row in rows])
+    batch_diff = np.abs(forest.predict_proba(X) - expected).max() if rows else 0.0
+    single_diff = max((np.abs(np.array(forest.predict_one(x)) - e).max()
+                       for x, e in zip(X[:1000], expected[:1000])), default=0.0)
+    return {"rows": len(rows), "max_abs_diff_batch": float(batch_diff),
+            "max_abs_diff_single": float(single_diff)}
+
+
+def benchmark(forest, X, single_rows=10000, batch_size=10000, repeats=5):
+    """Measure single-row latency percentiles and batch throughput.
+
+    Returns the p50 and p99 latency of ``predict_one`` in microseconds over
+    up to ``single_rows`` rows of ``X``, and the best ``predict_proba``
+    throughput in rows/sec over ``repeats`` batches of ``batch_size`` rows.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    latencies = []
+    for x in X[:single_rows]:
+        start = time.perf_counter_ns()
+        forest.predict_one(x)
+        latencies.append(time.perf_counter_ns() - start)
+
+    batch = X[:batch_size]
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        forest.predict_proba(batch)
+        best = min(best, time.perf_counter() - start)
+
+    return {
+        "single_row_p50_us": round(float(np.percentile(latencies, 50)) / 1000, 1),
+        "single_row_p99_us": round(float(np.percentile(latencies, 99)) / 1000, 1),
+        "batch_rows": len(batch),
+        "batch_rows_per_sec": round(len(batch) / best, 1) if best > 0 else None,
+    }
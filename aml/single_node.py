@@ -0,0 +1,716 @@
+"""Single-node engine: the pipeline stages without Spark, for small datasets.
+
+On the Small IBM files and in CI most of a Spark run is JVM and session
+startup. This engine runs the stages of ``aml.benchmark.run_pipeline`` in
+one Python process on NumPy columns:
+
+- ingest: the CSV is streamed in blocks with pyarrow's incremental reader.
+  Accounts, banks, currencies and payment formats are dictionary-encoded
+  as they arrive, and every column is appended to a flat binary file.
+  Later stages memory-map those files and walk them in chunks of
+  ``chunk_rows``, so only per-account tables and the training rows are
+  held in memory. Like ``aml.ingest``, the conversion is skipped while the
+  CSV is unchanged;
+- labeling: the patterns file is parsed by ``aml.patterns`` and the
+  transactions are matched on a 64-bit hash of their typed identity
+  columns;
+- account features: FanOut, FanIn and AvgAmountSent over all
+  transactions, from ``bincount`` over the account IDs;
+- velocity features: the rolling counts, amounts and counterparties of
+  ``aml.velocity``, from one sort of all rows by sender and time. The
+  graph motifs of ``aml.motifs`` are left to Spark, so a run here matches
+  ``run_pipeline`` without ``motif_options``;
+- resampling: a random share of the rows is held out, the training
+  majority is downsampled and the minority is replaced by SMOTE samples
+  with random neighbours (``aml.smote``);
+- encoding: the currency and payment-format indices of
+  ``FusedStringIndexer``, by descending frequency with ties alphabetical
+  and unseen values last;
+- training: a RandomForest grown like Spark's, with Poisson bootstrap
+  weights, a square-root feature subset per node, Gini impurity and at
+  most ``max_bins`` candidate splits per feature. The trees are built
+  straight into a ``CompiledForest`` (``aml.scorer``), so the model is
+  saved and scored like an exported Spark forest;
+- evaluation: the held-out rows are scored chunk by chunk and
+  ``aml.evaluation`` builds the report from the same score histogram.
+
+Nothing on this path imports pyspark, and pyarrow is only imported to read
+the CSV. The outputs are equivalent to those of the Spark pipeline rather
+than identical: the random draws differ, and amounts are doubles instead
+of decimals.
+
+Run it with::
+
+    python -m aml.single_node --transactions HI-Small_Trans.csv --patterns HI-Small_Patterns.txt \\
+        --work-dir /tmp/aml-local
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from aml.evaluation import array_histogram, format_report, histogram_report
+from aml.patterns import PATTERNS_COLUMNS, TRANSACTION_FIELDS, parse_pattern_lines
+from aml.scorer import LEAF, CompiledForest
+from aml.smote import random_neighbour_samples
+from aml.synthetic import TIMESTAMP_FORMAT
+from aml.velocity import HORIZONS, velocity_columns
+
+BASE_FEATURES = ["FanOut", "AvgAmountSent", "DayOfWeek", "CurrencyIndex", "PaymentFormatIndex"]
+
+# The default features of ``aml.benchmark.run_pipeline``; the graph motifs
+# are only computed on Spark
+MODEL_FEATURES = BASE_FEATURES + velocity_columns()
+
+# Vocabulary name -> the transaction columns it encodes
+VOCABULARIES = {
+    "account": ["From_Account", "To_Account"],
+    "bank": ["From_Bank", "To_Bank"],
+    "currency": ["Receiving_Currency", "Payment_Currency"],
+    "format": ["Payment_Format"],
+}
+
+# Stored columns and their types; encoded columns hold vocabulary IDs, -1 for null
+COLUMN_TYPES = {
+    "Timestamp": "int64",
+    "From_Bank": "int32",
+    "From_Account": "int32",
+    "To_Bank": "int32",
+    "To_Account": "int32",
+    "Amount_Received": "float64",
+    "Receiving_Currency": "int16",
+    "Amount_Paid": "float64",
+    "Payment_Currency": "int16",
+    "Payment_Format": "int16",
+    "Key": "uint64",
+}
+
+META_FILE = "_meta.json"
+
+# Bump when the stored layout changes so existing stores are rebuilt
+STORE_VERSION = 1
+
+BLOCK_BYTES = 64 << 20
+CHUNK_ROWS = 1 << 20
+
+
+class StageTimer:
+    """``StageProfiler`` without Spark: wall time, annotations and peak RSS per stage.
+
+    ``finish`` returns a report with the same layout, so the single-node
+    runs line up with the Spark ones.
+    """
+
+    def __init__(self, run_name=None):
+        self.run_name = run_name or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.stages = []
+        self._current = None
+        self._annotations = {}
+        self._started = time.perf_counter()
+
+    def start(self, name):
+        """End the running stage, if any, and start timing ``name``."""
+        self.stop()
+        self._current = (name, time.perf_counter())
+
+    def annotate(self, **fields):
+        """Add ``fields`` (e.g. ``rows=...``) to the record of the running stage."""
+        self._annotations.update(fields)
+
+    def stop(self):
+        """End the running stage and record it."""
+        if self._current is None:
+            return
+        name, started = self._current
+        self._current = None
+        record = {"stage": name, "seconds": round(time.perf_counter() - started, 3)}
+        record.update(self._annotations)
+        self._annotations = {}
+        record["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        self.stages.append(record)
+
+    def finish(self):
+        """Close the last stage and return the report."""
+        self.stop()
+        return {
+            "run": self.run_name,
+            "engine": "single_node",
+            "total_seconds": round(time.perf_counter() - self._started, 3),
+            "stages": self.stages,
+        }
+
+
+def transaction_keys(frame):
+    """Return the typed identity columns of raw string transactions and their 64-bit keys.
+
+    The CSV and the patterns file go through the same conversion, so a
+    transaction gets the same key in both, like ``aml.labeling``.
+    """
+    typed = frame[TRANSACTION_FIELDS].assign(
+        Timestamp=pd.to_datetime(frame["Timestamp"], format=TIMESTAMP_FORMAT, errors="coerce")
+        .to_numpy(dtype="datetime64[s]").astype(np.int64),
+        Amount_Received=pd.to_numeric(frame["Amount_Received"], errors="coerce"),
+        Amount_Paid=pd.to_numeric(frame["Amount_Paid"], errors="coerce"),
+    )
+    return typed, pd.util.hash_pandas_object(typed, index=False).to_numpy(dtype=np.uint64)
+
+
+def _encode(values, vocabulary):
+    """Map ``values`` to dense IDs, adding new values to ``vocabulary``; nulls become -1."""
+    codes, uniques = pd.factorize(values)
+    ids = np.array([vocabulary.setdefault(v, len(vocabulary)) for v in uniques] + [-1],
+                   dtype=np.int64)
+    # Code -1 (null) picks the trailing -1
+    return ids[codes]
+
+
+def _column_path(store_dir, name):
+    return os.path.join(store_dir, f"{name}.bin")
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "version": STORE_VERSION}
+
+
+def ingest_csv(csv_path, store_dir, block_bytes=BLOCK_BYTES, force=False):
+    """Convert the transactions CSV into memory-mappable columns under ``store_dir``.
+
+    Returns True when the CSV was converted and False when the store was
+    already up to date with it.
+    """
+    import pyarrow as pa
+    from pyarrow import csv
+
+    meta_path = os.path.join(store_dir, META_FILE)
+    fingerprint = _fingerprint(csv_path)
+    if not force and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f).get("fingerprint") == fingerprint:
+                return False
+    os.makedirs(store_dir, exist_ok=True)
+    # The metadata is written last, so an interrupted conversion is redone
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    with open(csv_path) as f:
+        header = f.readline().rstrip("\r\n").split(",")
+    # The header repeats "Account", so the columns are named by position
+    names = TRANSACTION_FIELDS + [f"_extra_{i}" for i in range(len(header) - len(TRANSACTION_FIELDS))]
+    reader = csv.open_csv(
+        csv_path,
+        read_options=csv.ReadOptions(block_size=block_bytes, skip_rows=1, column_names=names),
+        convert_options=csv.ConvertOptions(
+            include_columns=TRANSACTION_FIELDS,
+            column_types={c: pa.string() for c in TRANSACTION_FIELDS}))
+
+    vocabularies = {name: {} for name in VOCABULARIES}
+    outputs = {c: open(_column_path(store_dir, c), "wb") for c in COLUMN_TYPES}
+    rows = 0
+    try:
+        for batch in reader:
+            frame = batch.to_pandas()
+            typed, keys = transaction_keys(frame)
+            columns = {"Timestamp": typed["Timestamp"].to_numpy(),
+                       "Amount_Received": typed["Amount_Received"].to_numpy(),
+                       "Amount_Paid": typed["Amount_Paid"].to_numpy(),
+                       "Key": keys}
+            for name, encoded in VOCABULARIES.items():
+                for c in encoded:
+                    columns[c] = _encode(frame[c], vocabularies[name])
+            for c, out in outputs.items():
+                out.write(np.ascontiguousarray(columns[c], dtype=COLUMN_TYPES[c]).tobytes())
+            rows += len(frame)
+    finally:
+        for out in outputs.values():
+            out.close()
+
+    for name, vocabulary in vocabularies.items():
+        with open(os.path.join(store_dir, f"{name}.json"), "w") as out:
+            json.dump(list(vocabulary), out)
+    with open(meta_path, "w") as out:
+        json.dump({"fingerprint": fingerprint, "rows": rows, "columns": COLUMN_TYPES,
+                   "vocabulary_sizes": {name: len(v) for name, v in vocabularies.items()}}, out)
+    return True
+
+
+def read_store(store_dir):
+    """Return the memory-mapped columns of the store and its metadata."""
+    with open(os.path.join(store_dir, META_FILE)) as f:
+        meta = json.load(f)
+    rows = meta["rows"]
+    columns = {name: np.memmap(_column_path(store_dir, name), dtype=dtype, mode="r", shape=(rows,))
+               if rows else np.empty(0, dtype=dtype)
+               for name, dtype in meta["columns"].items()}
+    return columns, meta
+
+
+def read_vocabulary(store_dir, name):
+    """Return the values of vocabulary ``name``, indexed by their ID."""
+    with open(os.path.join(store_dir, f"{name}.json")) as f:
+        return json.load(f)
+
+
+def _chunks(rows, chunk_rows):
+    for index, start in enumerate(range(0, rows, chunk_rows)):
+        yield index, start, min(rows, start + chunk_rows)
+
+
+def laundering_keys(patterns_path):
+    """Return the sorted keys of the transactions labeled as laundering in the patterns file."""
+    with open(patterns_path) as lines:
+        frame = pd.DataFrame(list(parse_pattern_lines(lines)), columns=PATTERNS_COLUMNS)
+    if frame.empty:
+        return np.empty(0, dtype=np.uint64)
+    _, keys = transaction_keys(frame)
+    return np.unique(keys[(frame["isLaundering"] == 1).to_numpy()])
+
+
+def label_keys(keys, laundering):
+    """``isLaundering`` (0 or 1) of every key, from the sorted ``laundering`` keys."""
+    if not len(laundering):
+        return np.zeros(len(keys), dtype=np.int8)
+    position = np.minimum(np.searchsorted(laundering, keys), len(laundering) - 1)
+    return (laundering[position] == keys).astype(np.int8)
+
+
+def account_tables(columns, num_accounts, chunk_rows=CHUNK_ROWS):
+    """Per-account ``Out_Count``, ``Out_Amount`` and ``In_Count`` over all transactions.
+
+    These are the aggregates of ``aml.account_features``, indexed by
+    account ID.
+    """
+    out_count = np.zeros(num_accounts, dtype=np.int64)
+    out_amount = np.zeros(num_accounts, dtype=np.float64)
+    in_count = np.zeros(num_accounts, dtype=np.int64)
+    for _, start, end in _chunks(len(columns["Key"]), chunk_rows):
+        sender = np.asarray(columns["From_Account"][start:end], dtype=np.int64)
+        receiver = np.asarray(columns["To_Account"][start:end], dtype=np.int64)
+        amount = np.asarray(columns["Amount_Paid"][start:end])
+        both = (sender >= 0) & (receiver >= 0)
+        paid = (sender >= 0) & ~np.isnan(amount)
+        out_count += np.bincount(sender[both], minlength=num_accounts)
+        out_amount += np.bincount(sender[paid], weights=amount[paid], minlength=num_accounts)
+        in_count += np.bincount(receiver[both], minlength=num_accounts)
+    return {"Out_Count": out_count, "Out_Amount": out_amount, "In_Count": in_count}
+
+
+def chunk_features(columns, tables, start, end):
+    """FanOut, FanIn, AvgAmountSent and DayOfWeek (1 = Sunday) of rows ``start:end``.
+
+    Like ``join_account_features``, an unknown account has zero counts
+    and no average amount (NaN).
+    """
+    sender = np.asarray(columns["From_Account"][start:end], dtype=np.int64)
+    receiver = np.asarray(columns["To_Account"][start:end], dtype=np.int64)
+    known_sender, known_receiver = sender >= 0, receiver >= 0
+    fan_out = np.where(known_sender, tables["Out_Count"][sender], 0)
+    fan_in = np.where(known_receiver, tables["In_Count"][receiver], 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_sent = np.where(known_sender & (fan_out > 0),
+                            tables["Out_Amount"][sender] / fan_out, np.nan)
+
+    timestamp = np.asarray(columns["Timestamp"][start:end])
+    # 1970-01-01 was a Thursday, which is day 5 when Sunday is 1
+    day_of_week = np.where(timestamp == np.iinfo(np.int64).min, np.nan,
+                           (timestamp // 86400 + 4) % 7 + 1)
+    return {"FanOut": fan_out.astype(np.float64), "FanIn": fan_in.astype(np.float64),
+            "AvgAmountSent": avg_sent, "DayOfWeek": day_of_week.astype(np.float64)}
+
+
+def velocity_tables(columns, horizons=HORIZONS):
+    """The ``velocity_columns()`` of every row, as computed by ``aml.velocity``.
+
+    The rows are sorted by sender and time once, and every horizon's frame
+    is a range of that order found with ``searchsorted``. Counts and
+    amounts are then differences of running sums. A transfer to a
+    counterparty is a repeat for exactly the rows whose frame also holds
+    the sender's previous transfer to it. Those rows form a range too, so
+    the repeats are one more running sum. The counterparty counts are
+    exact, where Spark's are HyperLogLog estimates. Unlike the other
+    stages this one holds a few arrays of the size of the store in memory.
+    """
+    sender = np.asarray(columns["From_Account"], dtype=np.int64)
+    receiver = np.asarray(columns["To_Account"], dtype=np.int64)
+    timestamp = np.asarray(columns["Timestamp"])
+    amount = np.asarray(columns["Amount_Paid"])
+    rows = len(sender)
+    names = velocity_columns(horizons=horizons)
+    if not rows:
+        return {name: np.empty(0) for name in names}
+
+    # One sortable key per (sender, time). Rows without a time take offset 0,
+    # which sorts them first in their sender and puts them in frames only with
+    # each other, like the null ordering values of a Spark range frame
+    longest = max(horizons.values())
+    known = timestamp != np.iinfo(np.int64).min
+    origin = timestamp[known].min() if known.any() else 0
+    span = (timestamp[known].max() - origin if known.any() else 0) + longest + 2
+    offset = np.where(known, timestamp - origin + longest + 1, 0)
+    order = np.argsort((sender + 1) * span + offset, kind="stable")
+    sender, receiver = sender[order], receiver[order]
+    key = (sender + 1) * span + offset[order]
+    first_of_sender = np.searchsorted(key, (sender + 1) * span)
+    end = np.searchsorted(key, key, side="right")
+
+    paid = ~np.isnan(amount[order])
+    amount_sums = np.concatenate([[0.0], np.cumsum(np.where(paid, amount[order], 0.0))])
+    paid_counts = np.concatenate([[0], np.cumsum(paid)])
+
+    # The previous transfer of the same sender to the same receiver, if any;
+    # a missing receiver counts as a repeat of itself, so it is never counted
+    position = np.arange(rows)
+    by_pair = np.lexsort((position, receiver, sender))
+    same_pair = (sender[by_pair[1:]] == sender[by_pair[:-1]]) \
+        & (receiver[by_pair[1:]] == receiver[by_pair[:-1]])
+    previous = np.full(rows, -1)
+    previous[by_pair[1:][same_pair]] = by_pair[:-1][same_pair]
+    previous = np.where(receiver < 0, position, previous)
+    # The frames that hold a row start after the frames that end at or before it
+    first_frame = np.searchsorted(end, position, side="right")
+
+    features = {}
+    for suffix, seconds in horizons.items():
+        start = np.maximum(np.searchsorted(key, key - seconds), first_of_sender)
+        count = end - start
+        with np.errstate(invalid="ignore"):
+            total = np.where(paid_counts[end] > paid_counts[start],
+                             amount_sums[end] - amount_sums[start], np.nan)
+        # Row k repeats its previous pair for the frames from first_frame[k]
+        # up to the first frame that starts after the previous transfer
+        after_frame = np.searchsorted(start, previous, side="right")
+        repeated = after_frame > first_frame
+        repeats = np.cumsum(np.bincount(first_frame[repeated], minlength=rows + 1)
+                            - np.bincount(after_frame[repeated], minlength=rows + 1))[:rows]
+        for kind, values in (("Count", count), ("Amount", total),
+                             ("Counterparties", count - repeats)):
+            features[f"Out_{kind}_{suffix}"] = np.empty(rows)
+            features[f"Out_{kind}_{suffix}"][order] = values
+    return features
+
+
+def _feature_rows(columns, tables, velocity, start, end, rows):
+    """``MODEL_FEATURES`` of the selected ``rows`` of ``start:end``, with raw category IDs.
+
+    ``CurrencyIndex`` and ``PaymentFormatIndex`` hold the vocabulary IDs
+    of the currency and payment format until they are encoded.
+    """
+    features = chunk_features(columns, tables, start, end)
+    features.update({name: values[start:end] for name, values in velocity.items()})
+    features["CurrencyIndex"] = np.asarray(columns["Receiving_Currency"][start:end])
+    features["PaymentFormatIndex"] = np.asarray(columns["Payment_Format"][start:end])
+    return np.column_stack([np.asarray(features[name], dtype=np.float64)[rows]
+                            for name in MODEL_FEATURES])
+
+
+def _encode_categories(X, currency_index, format_index):
+    """Replace the category IDs of ``_feature_rows`` by their indices, in place."""
+    currency, payment_format = (MODEL_FEATURES.index("CurrencyIndex"),
+                                MODEL_FEATURES.index("PaymentFormatIndex"))
+    X[:, currency] = currency_index[X[:, currency].astype(np.int64)]
+    X[:, payment_format] = format_index[X[:, payment_format].astype(np.int64)]
+    return X
+
+
+def fit_category_index(counts, vocabulary):
+    """``FusedStringIndexer`` indices of one column as a lookup table by vocabulary ID.
+
+    ``counts`` holds the row count of every vocabulary ID. Labels are
+    ordered by descending count with ties broken alphabetically. Unseen
+    values and nulls (ID -1, the table's last slot) get ``len(labels)``.
+    Returns the table and the ordered labels.
+    """
+    labels = sorted((i for i in range(len(vocabulary)) if counts[i] > 0),
+                    key=lambda i: (-counts[i], vocabulary[i]))
+    table = np.full(len(vocabulary) + 1, float(len(labels)))
+    table[labels] = np.arange(len(labels), dtype=np.float64)
+    return table, [vocabulary[i] for i in labels]
+
+
+def _draws(seed, chunk_index, size):
+    """The holdout and downsampling draws of one chunk, identical on every pass."""
+    rng = np.random.default_rng([seed, chunk_index])
+    return rng.random(size), rng.random(size)
+
+
+def split_thresholds(x, max_bins=32):
+    """Candidate split thresholds of one feature, like Spark's continuous splits.
+
+    With at most ``max_bins`` distinct values the thresholds are the
+    midpoints between neighbouring values. Otherwise they are the
+    midpoints after ``max_bins - 1`` quantiles. NaNs are ignored.
+    """
+    x = x[~np.isnan(x)]
+    values = np.unique(x)
+    if len(values) <= max_bins:
+        return (values[:-1] + values[1:]) / 2
+    quantiles = np.unique(np.quantile(x, np.arange(1, max_bins) / max_bins, method="inverted_cdf"))
+    quantiles = quantiles[quantiles < values[-1]]
+    following = values[np.searchsorted(values, quantiles, side="right")]
+    return np.unique((quantiles + following) / 2)
+
+
+def _gini(counts):
+    """Gini impurity of class-count rows, and their totals."""
+    total = counts.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = counts / total[..., None]
+    return 1.0 - (shares ** 2).sum(axis=-1), total
+
+
+def _best_split(bins, y, weights, rows, features, num_bins, parent, min_instances):
+    """Return ``(gain, feature, bin)`` of the best split of ``rows``, or a None feature."""
+    parent_impurity, total = _gini(parent)
+    best = (0.0, None, None)
+    for f in features:
+        histogram = np.bincount(bins[rows, f] * 2 + y, weights=weights,
+                                minlength=num_bins[f] * 2).reshape(-1, 2)
+        # Splitting after bin j sends the bins <= j left
+        left = np.cumsum(histogram, axis=0)[:-1]
+        right = parent - left
+        left_impurity, left_total = _gini(left)
+        right_impurity, right_total = _gini(right)
+        valid = (left_total >= min_instances) & (right_total >= min_instances)
+        if not valid.any():
+            continue
+        gain = parent_impurity - (left_total * np.nan_to_num(left_impurity)
+                                  + right_total * np.nan_to_num(right_impurity)) / total
+        gain = np.where(valid, gain, -np.inf)
+        j = int(np.argmax(gain))
+        if gain[j] > best[0] + 1e-12:
+            best = (float(gain[j]), int(f), j)
+    return best
+
+
+def train_random_forest(X, y, feature_names, num_trees=20, max_depth=10, max_bins=32,
+                        min_instances_per_node=1, seed=42):
+    """Train a binary RandomForest on ``X`` and return it as a ``CompiledForest``.
+
+    Follows Spark's defaults: every tree sees Poisson(1) bootstrap weights
+    of the rows, and every node draws ``ceil(sqrt(features))`` candidate
+    features (all of them for a single tree). A node splits on the
+    candidate threshold with the largest Gini gain, as long as the gain
+    is positive, both sides keep ``min_instances_per_node`` of weight and
+    the node is shallower than ``max_depth``. NaN features go right, as in
+    ``CompiledForest``.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    thresholds = [split_thresholds(X[:, f], max_bins) for f in range(X.shape[1])]
+    bins = np.column_stack([np.searchsorted(t, X[:, f], side="left")
+                            for f, t in enumerate(thresholds)]).astype(np.int32)
+    num_bins = [len(t) + 1 for t in thresholds]
+    num_candidates = X.shape[1] if num_trees == 1 else math.ceil(math.sqrt(X.shape[1]))
+
+    feature, threshold, left, right, value, cover = [], [], [], [], [], []
+    roots, depth_reached = [], 0
+
+    def new_node():
+        for column, default in ((feature, LEAF), (threshold, 0.0), (left, LEAF), (right, LEAF),
+                                (value, None), (cover, 0.0)):
+            column.append(default)
+        return len(feature) - 1
+
+    for _ in range(num_trees):
+        weights = rng.poisson(1.0, len(y)).astype(np.float64)
+        root = new_node()
+        roots.append(root)
+        stack = [(root, np.flatnonzero(weights > 0), 0)]
+        while stack:
+            slot, rows, depth = stack.pop()
+            depth_reached = max(depth_reached, depth)
+            node_y, node_weights = y[rows], weights[rows]
+            parent = np.bincount(node_y, weights=node_weights, minlength=2)
+            value[slot] = parent / parent.sum() if parent.sum() > 0 else parent
+            cover[slot] = float(parent.sum())
+            if depth >= max_depth or np.count_nonzero(parent) < 2:
+                continue
+            candidates = rng.choice(X.shape[1], num_candidates, replace=False)
+            _, f, j = _best_split(bins, node_y, node_weights, rows, candidates, num_bins,
+                                  parent, min_instances_per_node)
+            if f is None:
+                continue
+            goes_left = bins[rows, f] <= j
+            feature[slot], threshold[slot] = f, float(thresholds[f][j])
+            left[slot], right[slot] = new_node(), new_node()
+            stack.append((right[slot], rows[~goes_left], depth + 1))
+            stack.append((left[slot], rows[goes_left], depth + 1))
+
+    num_nodes = len(feature)
+    return CompiledForest(roots, feature, threshold, left, right, np.stack(value), cover,
+                          np.zeros(num_nodes, dtype=bool), np.zeros((num_nodes, 1), dtype=bool),
+                          feature_names, max_depth=depth_reached)
+
+
+def _predict(forest, X, batch_rows=65536):
+    """Positive-class probabilities of ``X``, scored ``batch_rows`` at a time."""
+    return np.concatenate([forest.predict_proba(X[start:start + batch_rows])[:, 1]
+                           for start in range(0, len(X), batch_rows)] or [np.empty(0)])
+
+
+def run_pipeline(transactions_csv, patterns_path, work_dir, timer, desired_ratio=1.5,
+                 smote_samples=10, num_trees=20, max_depth=10, max_bins=32, test_fraction=0.2,
+                 chunk_rows=CHUNK_ROWS, model_path=None, seed=42):
+    """Run the pipeline stages on one machine, one ``timer`` stage each.
+
+    Takes the options of ``aml.benchmark.run_pipeline`` with SMOTE
+    balancing. ``desired_ratio=None`` skips the downsampling of the
+    majority. With ``model_path`` the forest is saved there as a
+    ``CompiledForest`` ``.npz``. Returns the evaluation report of the
+    held-out rows.
+    """
+    store_dir = os.path.join(work_dir, "transactions")
+
+    timer.start("ingest")
+    converted = ingest_csv(transactions_csv, store_dir)
+    columns, meta = read_store(store_dir)
+    rows = meta["rows"]
+    timer.annotate(rows=rows, converted=converted)
+
+    timer.start("pattern_parse")
+    laundering = laundering_keys(patterns_path)
+    timer.annotate(rows=len(laundering))
+
+    timer.start("account_features")
+    tables = account_tables(columns, meta["vocabulary_sizes"]["account"], chunk_rows)
+    timer.annotate(accounts=meta["vocabulary_sizes"]["account"])
+
+    timer.start("velocity_features")
+    velocity = velocity_tables(columns)
+    timer.annotate(rows=rows)
+
+    timer.start("label_join")
+    class_counts = np.zeros((2, 2), dtype=np.int64)  # [holdout, label]
+    for index, start, end in _chunks(rows, chunk_rows):
+        labels = label_keys(columns["Key"][start:end], laundering)
+        holdout = _draws(seed, index, end - start)[0] < test_fraction
+        class_counts += np.bincount(holdout * 2 + labels, minlength=4).reshape(2, 2)
+    timer.annotate(rows=rows, laundering=int(class_counts[:, 1].sum()))
+
+    timer.start("downsample")
+    keep = 1.0
+    if desired_ratio is not None:
+        keep = min(1.0, desired_ratio * class_counts[0, 1] / max(1, class_counts[0, 0]))
+    vocabulary_sizes = meta["vocabulary_sizes"]
+    currency_counts = np.zeros(vocabulary_sizes["currency"] + 1, dtype=np.int64)
+    format_counts = np.zeros(vocabulary_sizes["format"] + 1, dtype=np.int64)
+    train_parts, train_labels = [], []
+    for index, start, end in _chunks(rows, chunk_rows):
+        labels = label_keys(columns["Key"][start:end], laundering)
+        holdout_draw, keep_draw = _draws(seed, index, end - start)
+        holdout = holdout_draw < test_fraction
+        kept = holdout | (labels == 1) | (keep_draw < keep)
+        currency = np.asarray(columns["Receiving_Currency"][start:end], dtype=np.int64)
+        payment_format = np.asarray(columns["Payment_Format"][start:end], dtype=np.int64)
+        # The encoder is fitted on every kept row, held out or not, as in the
+        # Spark run; nulls (-1) are counted in the last slot
+        currency_counts += np.bincount(currency[kept] % len(currency_counts),
+                                       minlength=len(currency_counts))
+        format_counts += np.bincount(payment_format[kept] % len(format_counts),
+                                     minlength=len(format_counts))
+
+        train = kept & ~holdout
+        train_parts.append(_feature_rows(columns, tables, velocity, start, end, train))
+        train_labels.append(labels[train])
+    train_X = np.concatenate(train_parts) if train_parts else np.empty((0, len(MODEL_FEATURES)))
+    train_y = np.concatenate(train_labels).astype(np.int64) if train_labels \
+        else np.empty(0, dtype=np.int64)
+    timer.annotate(rows=len(train_X) + int(class_counts[1].sum()))
+
+    timer.start("encoding")
+    currency_index, currency_labels = fit_category_index(
+        currency_counts, read_vocabulary(store_dir, "currency"))
+    format_index, format_labels = fit_category_index(
+        format_counts, read_vocabulary(store_dir, "format"))
+    train_X = _encode_categories(train_X, currency_index, format_index)
+    timer.annotate(rows=len(train_X), currencies=len(currency_labels),
+                   payment_formats=len(format_labels))
+
+    timer.start("smote")
+    minority = train_X[train_y == 1]
+    rng = np.random.default_rng(seed)
+    synthetic = np.concatenate(list(random_neighbour_samples(minority, smote_samples, rng))) \
+        if len(minority) else np.empty((0, len(MODEL_FEATURES)))
+    # As in the Spark run, the synthetic rows replace the real minority rows
+    majority = train_y == 0
+    train_X = np.concatenate([train_X[majority], synthetic])
+    train_y = np.concatenate([train_y[majority], np.ones(len(synthetic), dtype=np.int64)])
+    timer.annotate(rows=len(synthetic))
+
+    timer.start("training")
+    forest = train_random_forest(train_X, train_y, MODEL_FEATURES, num_trees=num_trees,
+                                 max_depth=max_depth, max_bins=max_bins, seed=seed)
+    if model_path is not None:
+        forest.save(model_path)
+    timer.annotate(rows=len(train_X), nodes=len(forest.feature))
+
+    timer.start("evaluation")
+    positives = negatives = None
+    confusion = {}
+    for index, start, end in _chunks(rows, chunk_rows):
+        holdout = _draws(seed, index, end - start)[0] < test_fraction
+        if not holdout.any():
+            continue
+        labels = label_keys(columns["Key"][start:end], laundering)[holdout]
+        X = _encode_categories(_feature_rows(columns, tables, velocity, start, end, holdout),
+                               currency_index, format_index)
+        chunk_positives, chunk_negatives, chunk_confusion = array_histogram(_predict(forest, X), labels)
+        positives = chunk_positives if positives is None else positives + chunk_positives
+        negatives = chunk_negatives if negatives is None else negatives + chunk_negatives
+        for cell, count in chunk_confusion.items():
+            confusion[cell] = confusion.get(cell, 0) + count
+    if positives is None:
+        positives, negatives, _ = array_histogram(np.empty(0), np.empty(0))
+    report = histogram_report(positives, negatives, confusion)
+    timer.annotate(rows=report["rows"])
+    timer.stop()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the pipeline on one machine without Spark.")
+    parser.add_argument("--transactions", required=True, help="transactions CSV")
+    parser.add_argument("--patterns", required=True, help="laundering patterns file")
+    parser.add_argument("--work-dir", required=True, help="directory for the columnar store")
+    parser.add_argument("--desired-ratio", type=float, default=1.5,
+                        help="majority rows kept per minority row; 0 keeps all")
+    parser.add_argument("--smote-samples", type=int, default=10)
+    parser.add_argument("--num-trees", type=int, default=20)
+    parser.add_argument("--max-depth", type=int, default=10)
+    parser.add_argument("--max-bins", type=int, default=32)
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model", help="output compiled forest (.npz)")
+    parser.add_argument("--report", help="output JSON report")
+    args = parser.parse_args(argv)
+
+    timer = StageTimer()
+    evaluation = run_pipeline(
+        args.transactions, args.patterns, args.work_dir, timer,
+        desired_ratio=args.desired_ratio or None, smote_samples=args.smote_samples,
+        num_trees=args.num_trees, max_depth=args.max_depth, max_bins=args.max_bins,
+        test_fraction=args.test_fraction, chunk_rows=args.chunk_rows, model_path=args.model,
+        seed=args.seed)
+    profile = timer.finish()
+    if args.report:
+        with open(args.report, "w") as out:
+            json.dump({"evaluation": evaluation, "profile": profile}, out, indent=2)
+
+    print(format_report(evaluation))
+    for stage in profile["stages"]:
+        print(f"{stage['stage']:<18} {stage['seconds']:>8.2f}s  rss={stage['peak_rss_mb']:>8.1f}MB")
+    print(f"{'total':<18} {profile['total_seconds']:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
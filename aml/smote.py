@@ -0,0 +1,172 @@
+"""Distributed SMOTE oversampling for the minority class.
+
+The synthetic rows are generated on the executors, partition by partition,
+so the minority class never has to be collected to the driver. Each
+partition interpolates between its rows and a set of neighbours with
+batched NumPy operations over Arrow record batches.
+
+Two neighbour strategies are available:
+
+- ``"random"``: neighbours are drawn at random from the partition, which
+  is a random shuffle of the minority class. This matches the behaviour of
+  the original driver-side loop.
+- ``"lsh"``: rows are bucketed with a bucketed random projection LSH on the
+  standardized features and each row interpolates towards one of its true
+  k nearest neighbours inside its bucket. Buckets larger than
+  ``batch_rows`` are split at random into groups of about ``batch_rows``
+  rows, so no Python worker holds the samples of a whole dense bucket.
+
+Minority rows with a null or NaN feature are skipped in both modes.
+
+The NumPy samplers are shared with the single-node engine
+(``aml.single_node``), so pyspark is only imported by the Spark functions.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def interpolate(base, neighbours, rng):
+    """Return ``base + gap * (neighbours - base)`` with one uniform gap per row."""
+    gaps = rng.random((len(base), 1))
+    return base + gaps * (neighbours - base)
+
+
+def random_neighbour_samples(X, num_samples, rng, batch_rows=1000):
+    """Yield synthetic rows built from randomly chosen neighbours in ``X``.
+
+    Every row of ``X`` produces ``num_samples`` synthetic rows. Base rows are
+    processed ``batch_rows`` at a time to bound memory.
+    """
+    for start in range(0, len(X), batch_rows):
+        base = np.repeat(X[start:start + batch_rows], num_samples, axis=0)
+        neighbour_idx = rng.integers(0, len(X), size=len(base))
+        yield interpolate(base, X[neighbour_idx], rng)
+
+
+def nearest_neighbours(Z, k):
+    """Return the indices of the ``k`` nearest rows of ``Z`` for every row.
+
+    Distances are squared Euclidean and a row is never its own neighbour.
+    ``k`` is clipped to ``len(Z) - 1``; a single row is its own neighbour.
+    """
+    if len(Z) == 1:
+        return np.zeros((1, 1), dtype=np.int64)
+    k = min(k, len(Z) - 1)
+    sq_norms = (Z ** 2).sum(axis=1)
+    distances = sq_norms[:, None] + sq_norms[None, :] - 2 * Z @ Z.T
+    np.fill_diagonal(distances, np.inf)
+    return np.argpartition(distances, k - 1, axis=1)[:, :k]
+
+
+def knn_samples(X, Z, num_samples, k_neighbors, rng, batch_rows=1000):
+    """Yield synthetic rows interpolated towards the k nearest neighbours.
+
+    ``X`` holds the raw feature values that are interpolated and ``Z`` the
+    scaled values the neighbours are searched on. Groups larger than
+    ``batch_rows`` are split into chunks and neighbours are searched within
+    each chunk, which keeps the distance matrix bounded.
+    """
+    for start in range(0, len(X), batch_rows):
+        X_chunk = X[start:start + batch_rows]
+        neighbours = nearest_neighbours(Z[start:start + batch_rows], k_neighbors)
+        base_idx = np.repeat(np.arange(len(X_chunk)), num_samples)
+        pick = rng.integers(0, neighbours.shape[1], size=len(base_idx))
+        yield interpolate(X_chunk[base_idx], X_chunk[neighbours[base_idx, pick]], rng)
+
+
+def _output_schema(feature_columns, label_col):
+    from pyspark.sql.types import DoubleType, IntegerType, StructField, StructType
+
+    fields = [StructField(c, DoubleType(), True) for c in feature_columns]
+    return StructType(fields + [StructField(label_col, IntegerType(), False)])
+
+
+def _task_rng(seed):
+    from pyspark import TaskContext
+
+    partition = TaskContext.get().partitionId() if TaskContext.get() else 0
+    return np.random.default_rng([seed, partition])
+
+
+def _to_frame(samples, feature_columns, label_col):
+    frame = pd.DataFrame(samples, columns=feature_columns)
+    frame[label_col] = np.int32(1)
+    return frame
+
+
+def smote(minority_df, feature_columns, num_samples=130, label_col="isLaundering",
+          k_neighbors=None, bucket_length=2.0, num_partitions=None, batch_rows=1000,
+          seed=42):
+    """Generate ``num_samples`` synthetic rows per minority row on the executors.
+
+    ``minority_df`` must contain ``feature_columns``; any other column is
+    ignored. When ``k_neighbors`` is None neighbours are drawn at random,
+    otherwise each synthetic row interpolates towards one of the row's
+    ``k_neighbors`` nearest neighbours inside its LSH bucket (see
+    ``bucket_length``, measured in standard deviations). In both modes the
+    rows are generated by ``num_partitions`` tasks, by default the default
+    parallelism.
+
+    Rows with a null or NaN in ``feature_columns`` are skipped. Returns a
+    DataFrame of ``feature_columns`` as doubles plus ``label_col`` set to 1.
+    """
+    from pyspark.ml.feature import BucketedRandomProjectionLSH, StandardScaler, VectorAssembler
+    from pyspark.ml.functions import vector_to_array
+    from pyspark.sql import functions as F
+
+    spark = minority_df.sparkSession
+    num_partitions = num_partitions or spark.sparkContext.defaultParallelism
+    schema = _output_schema(feature_columns, label_col)
+    features_df = minority_df.select(
+        *[F.col(c).cast("double").alias(c) for c in feature_columns]).na.drop()
+
+    if k_neighbors is None:
+        def generate(batches):
+            rng = _task_rng(seed)
+            frames = [batch for batch in batches if len(batch)]
+            if not frames:
+                return
+            X = pd.concat(frames).to_numpy(dtype=np.float64)
+            for samples in random_neighbour_samples(X, num_samples, rng, batch_rows):
+                yield _to_frame(samples, feature_columns, label_col)
+
+        shuffled = features_df.repartition(num_partitions, F.rand(seed))
+        return shuffled.mapInPandas(generate, schema)
+
+    assembler = VectorAssembler(inputCols=feature_columns, outputCol="_smote_raw")
+    vectors = assembler.transform(features_df)
+    scaler = StandardScaler(inputCol="_smote_raw", outputCol="_smote_scaled",
+                            withMean=False, withStd=True)
+    scaled = scaler.fit(vectors).transform(vectors)
+    lsh = BucketedRandomProjectionLSH(inputCol="_smote_scaled", outputCol="_smote_hashes",
+                                      bucketLength=bucket_length, numHashTables=1, seed=seed)
+    bucketed = lsh.fit(scaled).transform(scaled)
+
+    scaled_columns = [f"_smote_z{i}" for i in range(len(feature_columns))]
+    scaled_array = vector_to_array("_smote_scaled")
+    bucketed = bucketed.select(
+        vector_to_array(F.col("_smote_hashes")[0])[0].alias("_smote_bucket"),
+        *feature_columns,
+        *[scaled_array[i].alias(name) for i, name in enumerate(scaled_columns)],
+    )
+
+    # Split every bucket at random into groups of about batch_rows rows;
+    # knn_samples searches neighbours within such chunks anyway
+    groups = bucketed.groupBy("_smote_bucket") \
+        .agg(F.ceil(F.count(F.lit(1)) / batch_rows).alias("_smote_groups"))
+    grouped_input = bucketed.join(F.broadcast(groups), on="_smote_bucket") \
+        .withColumn("_smote_group", F.floor(F.rand(seed) * F.col("_smote_groups")))
+
+    def generate_group(group):
+        rng = np.random.default_rng([seed, abs(int(group["_smote_bucket"].iloc[0])),
+                                     int(group["_smote_group"].iloc[0])])
+        X = group[feature_columns].to_numpy(dtype=np.float64)
+        Z = group[scaled_columns].to_numpy(dtype=np.float64)
+        samples = list(knn_samples(X, Z, num_samples, k_neighbors, rng, batch_rows))
+        return _to_frame(np.concatenate(samples), feature_columns, label_col)
+
+    # Hash the groups over num_partitions tasks; the groupBy keeps that partitioning
+    return grouped_input.repartition(num_partitions, "_smote_bucket", "_smote_group") \
+        .groupBy("_smote_bucket", "_smote_group") \
+        .applyInPandas(generate_group, schema)
@@ -0,0 +1,344 @@
+"""Structured Streaming detection over a landing directory of transaction files.
+
+New CSV files dropped into the landing directory are read with the file
+source. Each transaction is keyed per account twice, once as the sender and
+once as the receiver. ``applyInPandasWithState`` then keeps the running send
+count, send amount and receive count of every account in the state store.
+Accounts that see no transaction for ``state_ttl`` of event time are
+evicted once the watermark passes. These live counts are added to the
+historical aggregates of the account feature store, when one is given, to
+form FanOut, FanIn and AvgAmountSent.
+
+Every micro-batch is scored with the saved PipelineModel (category encoder,
+VectorAssembler and RandomForest). Transactions at or above the alert
+threshold are appended to a Parquet sink partitioned by ``Date``. The
+stream keeps no transaction history, so models that read the velocity or
+graph motif features are rejected at start. The notebook therefore saves a
+second forest, trained on ``STREAM_FEATURES`` only, for the stream
+(``models/aml_rf_stream``); the full model is scored with
+``aml.batch_scoring``.
+``StreamMonitor`` records the end-to-end latency of every micro-batch (from
+the arrival of the oldest file in it to the write of its alerts) and the
+state-store size reported by Spark.
+
+Run it with::
+
+    python -m aml.streaming --landing /data/landing --model /models/aml_rf_stream \\
+        --alerts /data/alerts --checkpoint /data/checkpoints/stream
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from pyspark.ml import PipelineModel
+from pyspark.ml.functions import vector_to_array
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+from pyspark.sql.streaming import StreamingQueryListener
+from pyspark.sql.streaming.state import GroupStateTimeout
+from pyspark.sql.types import (BooleanType, DoubleType, LongType, StringType, StructField,
+                               StructType, TimestampType)
+
+from aml.account_features import read_feature_store
+from aml.features import add_missing_columns, add_time_features
+from aml.identity import decode_identities
+from aml.ingest import AMOUNT_COLUMNS, RAW_SCHEMA, TRANSACTION_COLUMNS, cast_transactions
+from aml.labeling import KEY_COLUMN, transaction_key
+from aml.motifs import MOTIF_COLUMNS
+from aml.scorer import input_columns
+from aml.velocity import velocity_columns
+
+# The model features every micro-batch can compute from the live state, the
+# feature store and the transaction itself
+STREAM_FEATURES = ["FanOut", "AvgAmountSent", "DayOfWeek", "CurrencyIndex", "PaymentFormatIndex"]
+
+_ROLE_FIELDS = [
+    StructField("Account", StringType(), True),
+    StructField("Outgoing", BooleanType(), False),
+    StructField(KEY_COLUMN, LongType(), False),
+    StructField("Arrival_Time", TimestampType(), True),
+]
+_TRANSACTION_FIELDS = [
+    StructField(c, TimestampType() if c == "Timestamp" else
+                DoubleType() if c in AMOUNT_COLUMNS else StringType(), True)
+    for c in TRANSACTION_COLUMNS
+]
+
+# Role rows carry the whole transaction, so the stateful output can be
+# scored without joining it back to the input stream
+LIVE_SCHEMA = StructType(_ROLE_FIELDS + _TRANSACTION_FIELDS + [
+    StructField("Live_Count", LongType(), False),
+    StructField("Live_Amount", DoubleType(), False),
+])
+
+STATE_SCHEMA = StructType([
+    StructField("out_count", LongType(), False),
+    StructField("out_amount", DoubleType(), False),
+    StructField("in_count", LongType(), False),
+])
+
+
+def _update_account_state(state_ttl_ms):
+    def update(key, batches, state):
+        if state.hasTimedOut:
+            state.remove()
+            return
+
+        out_count, out_amount, in_count = state.get if state.exists else (0, 0.0, 0)
+        rows = pd.concat(list(batches)).sort_values("Timestamp", kind="stable")
+        outgoing = rows["Outgoing"].to_numpy(dtype=bool)
+        amounts = np.where(outgoing, rows["Amount_Paid"].fillna(0.0).to_numpy(dtype=np.float64), 0.0)
+
+        # Running totals as of (and including) each transaction
+        sent = out_count + np.cumsum(outgoing)
+        sent_amount = out_amount + np.cumsum(amounts)
+        received = in_count + np.cumsum(~outgoing)
+        out_count, out_amount, in_count = int(sent[-1]), float(sent_amount[-1]), int(received[-1])
+
+        yield rows.assign(Live_Count=np.where(outgoing, sent, received),
+                          Live_Amount=np.where(outgoing, sent_amount, 0.0))
+
+        state.update((out_count, out_amount, in_count))
+        # The TTL runs from the account's latest event time. In the first batch
+        # the watermark is still 0, and a timeout based on it would expire
+        # every state as soon as the watermark reaches the data
+        latest = rows["Timestamp"].max()
+        latest_ms = int(latest.timestamp() * 1000) if pd.notna(latest) else 0
+        state.setTimeoutTimestamp(max(state.getCurrentWatermarkMs(), latest_ms) + state_ttl_ms)
+    return update
+
+
+def live_account_counts(transactions_stream, watermark="1 day", state_ttl="30 days"):
+    """Return the running per-account counts for every transaction role row.
+
+    The stream must hold typed transactions with ``Transaction_Key`` and
+    ``Arrival_Time`` columns. Every transaction yields an outgoing row for
+    its sender and an incoming row for its receiver.
+    """
+    state_ttl_ms = _interval_ms(state_ttl)
+    transaction = [F.col(c).cast("double").alias(c) if c in AMOUNT_COLUMNS else F.col(c)
+                   for c in TRANSACTION_COLUMNS]
+    roles = F.explode(F.array(
+        F.struct(F.col("From_Account").alias("Account"), F.lit(True).alias("Outgoing"),
+                 F.col(KEY_COLUMN), F.col("Arrival_Time"), *transaction),
+        F.struct(F.col("To_Account").alias("Account"), F.lit(False).alias("Outgoing"),
+                 F.col(KEY_COLUMN), F.col("Arrival_Time"), *transaction),
+    )).alias("role")
+
+    return transactions_stream.withWatermark("Timestamp", watermark) \
+        .select(roles).select("role.*") \
+        .groupBy("Account") \
+        .applyInPandasWithState(_update_account_state(state_ttl_ms), LIVE_SCHEMA, STATE_SCHEMA,
+                                "append", GroupStateTimeout.EventTimeTimeout)
+
+
+def _interval_ms(interval):
+    amount, unit = interval.split()
+    seconds = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}[unit.rstrip("s")]
+    return int(float(amount) * seconds * 1000)
+
+
+def combine_account_features(live_df, history_df=None):
+    """Turn role rows into one row per transaction with FanOut, FanIn and AvgAmountSent.
+
+    ``history_df`` holds the account feature store (see
+    ``read_feature_store``). Its historical counts are added to the live
+    counts.
+    """
+    outgoing = F.col("Outgoing")
+    per_transaction = live_df.groupBy(KEY_COLUMN).agg(
+        F.first(F.when(outgoing, F.col("Account")), ignorenulls=True).alias("From_Account"),
+        F.first(F.when(~outgoing, F.col("Account")), ignorenulls=True).alias("To_Account"),
+        F.max(F.when(outgoing, F.col("Live_Count"))).alias("Live_FanOut"),
+        F.max(F.when(outgoing, F.col("Live_Amount"))).alias("Live_AmountSent"),
+        F.max(F.when(~outgoing, F.col("Live_Count"))).alias("Live_FanIn"),
+    )
+
+    if history_df is None:
+        return per_transaction.select(
+            KEY_COLUMN,
+            F.col("Live_FanOut").alias("FanOut"),
+            F.col("Live_FanIn").alias("FanIn"),
+            (F.col("Live_AmountSent") / F.col("Live_FanOut")).alias("AvgAmountSent"))
+
+    sender = history_df.select(F.col("Account").alias("From_Account"),
+                               F.col("FanOut").alias("Hist_FanOut"),
+                               F.col("AvgAmountSent").alias("Hist_AvgAmountSent"))
+    receiver = history_df.select(F.col("Account").alias("To_Account"),
+                                 F.col("FanIn").alias("Hist_FanIn"))
+    joined = per_transaction.join(F.broadcast(sender), "From_Account", "left") \
+        .join(F.broadcast(receiver), "To_Account", "left")
+
+    hist_out = F.coalesce(F.col("Hist_FanOut"), F.lit(0))
+    hist_sent = hist_out * F.coalesce(F.col("Hist_AvgAmountSent"), F.lit(0.0))
+    fan_out = hist_out + F.col("Live_FanOut")
+    return joined.select(
+        KEY_COLUMN,
+        fan_out.alias("FanOut"),
+        (F.coalesce(F.col("Hist_FanIn"), F.lit(0)) + F.col("Live_FanIn")).alias("FanIn"),
+        ((hist_sent + F.col("Live_AmountSent")) / fan_out).alias("AvgAmountSent"),
+    )
+
+
+class StreamMonitor(StreamingQueryListener):
+    """Collect per-micro-batch latency and state-store size.
+
+    ``onQueryProgress`` records what Spark reports for every trigger. The
+    foreachBatch sink adds the end-to-end latency through
+    ``record_latency``, because it measures from file arrival to the alert
+    write.
+    """
+
+    def __init__(self):
+        self.progress = []
+        self.latency_ms = {}
+
+    def onQueryStarted(self, event):
+        pass
+
+    def onQueryProgress(self, event):
+        progress = event.progress
+        operators = progress.stateOperators or []
+        self.progress.append({
+            "batch_id": progress.batchId,
+            "input_rows": progress.numInputRows,
+            "input_rows_per_sec": progress.inputRowsPerSecond,
+            "processed_rows_per_sec": progress.processedRowsPerSecond,
+            "trigger_ms": progress.durationMs.get("triggerExecution"),
+            "state_rows": sum(op.numRowsTotal for op in operators),
+            "state_memory_bytes": sum(op.memoryUsedBytes for op in operators),
+            "end_to_end_ms": self.latency_ms.get(progress.batchId),
+        })
+
+    def onQueryIdle(self, event):
+        pass
+
+    def onQueryTerminated(self, event):
+        pass
+
+    def record_latency(self, batch_id, latency_ms):
+        self.latency_ms[batch_id] = latency_ms
+
+    def summary(self):
+        """Return latency percentiles and the latest state size over all batches."""
+        latencies = [v for v in self.latency_ms.values() if v is not None]
+        last = self.progress[-1] if self.progress else {}
+        return {
+            "batches": len(self.progress),
+            "end_to_end_p50_ms": float(np.percentile(latencies, 50)) if latencies else None,
+            "end_to_end_p99_ms": float(np.percentile(latencies, 99)) if latencies else None,
+            "max_processed_rows_per_sec": max(
+                (p["processed_rows_per_sec"] or 0 for p in self.progress), default=None),
+            "state_rows": last.get("state_rows"),
+            "state_memory_bytes": last.get("state_memory_bytes"),
+        }
+
+
+def _score_batch(model, history_df, alerts_path, threshold, monitor):
+    def process(live_df, batch_id):
+        live_df.persist()
+        if live_df.isEmpty():
+            live_df.unpersist()
+            return
+        features = combine_account_features(live_df, history_df)
+        transactions = live_df.where(F.col("Outgoing")) \
+            .select(KEY_COLUMN, *TRANSACTION_COLUMNS)
+        scored_input = transactions.join(features, KEY_COLUMN)
+        scored_input = add_time_features(add_missing_columns(
+            scored_input, model.stages[0].getInputCols()))
+
+        predictions = model.transform(scored_input) \
+            .withColumn("Score", vector_to_array("probability")[1])
+        predictions.where(F.col("Score") >= threshold) \
+            .select(*TRANSACTION_COLUMNS, "FanOut", "FanIn", "AvgAmountSent", "Score",
+                    F.to_date("Timestamp").alias("Date")) \
+            .write.mode("append").partitionBy("Date").parquet(alerts_path)
+
+        oldest_arrival = live_df.agg(F.min("Arrival_Time")).first()[0]
+        if monitor is not None and oldest_arrival is not None:
+            monitor.record_latency(batch_id, (time.time() - oldest_arrival.timestamp()) * 1000)
+        live_df.unpersist()
+    return process
+
+
+def start_detection_stream(spark, landing_dir, model_path, alerts_path, checkpoint_path,
+                           feature_store_path=None, threshold=0.5, watermark="1 day",
+                           state_ttl="30 days", trigger_interval="10 seconds",
+                           max_files_per_trigger=None, monitor=None, identity_path=None):
+    """Start the streaming detection query and return it.
+
+    Files are picked up from ``landing_dir`` in the CSV layout of the
+    transactions file. Pass a ``StreamMonitor`` to collect latency and
+    state-store metrics. If the feature store is keyed by account IDs,
+    ``identity_path`` maps them back to the account strings of the files.
+    Raises ``ValueError`` if the model reads velocity or motif features.
+    """
+    model = PipelineModel.load(model_path)
+    unsupported = [c for c in input_columns(model) if c in velocity_columns() + MOTIF_COLUMNS]
+    if unsupported:
+        raise ValueError(f"The stream cannot compute the features {unsupported}; "
+                         "score this model with aml.batch_scoring, or stream a model "
+                         "trained on STREAM_FEATURES")
+    history_df = None
+    if feature_store_path:
+        history_df = read_feature_store(spark, feature_store_path)
+        if identity_path:
+            history_df = decode_identities(spark, identity_path, history_df,
+                                           {"account": ["Account"]})
+        history_df = history_df.cache()
+    if monitor is not None:
+        spark.streams.addListener(monitor)
+
+    reader = spark.readStream.schema(RAW_SCHEMA).option("header", True)
+    if max_files_per_trigger:
+        reader = reader.option("maxFilesPerTrigger", max_files_per_trigger)
+    raw_stream = reader.csv(landing_dir)
+
+    transactions = cast_transactions(raw_stream) \
+        .withColumn(KEY_COLUMN, transaction_key()) \
+        .withColumn("Arrival_Time", F.col("_metadata.file_modification_time"))
+    live = live_account_counts(transactions, watermark, state_ttl)
+
+    return live.writeStream \
+        .foreachBatch(_score_batch(model, history_df, alerts_path, threshold, monitor)) \
+        .option("checkpointLocation", checkpoint_path) \
+        .trigger(processingTime=trigger_interval) \
+        .start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score transaction files as they land.")
+    parser.add_argument("--landing", required=True, help="directory watched for new CSV files")
+    parser.add_argument("--model", required=True, help="saved scoring PipelineModel")
+    parser.add_argument("--alerts", required=True, help="Parquet directory for alerts")
+    parser.add_argument("--checkpoint", required=True, help="streaming checkpoint directory")
+    parser.add_argument("--feature-store", help="account feature store with the history")
+    parser.add_argument("--identities", help="identity store, if the feature store is keyed by IDs")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--watermark", default="1 day")
+    parser.add_argument("--state-ttl", default="30 days")
+    parser.add_argument("--trigger", default="10 seconds")
+    parser.add_argument("--max-files-per-trigger", type=int)
+    parser.add_argument("--timeout", type=float, help="stop after this many seconds")
+    args = parser.parse_args(argv)
+
+    spark = SparkSession.builder.appName("Anti-Money Laundering Streaming").getOrCreate()
+    monitor = StreamMonitor()
+    query = start_detection_stream(
+        spark, args.landing, args.model, args.alerts, args.checkpoint,
+        feature_store_path=args.feature_store, threshold=args.threshold,
+        watermark=args.watermark, state_ttl=args.state_ttl, trigger_interval=args.trigger,
+        max_files_per_trigger=args.max_files_per_trigger, monitor=monitor,
+        identity_path=args.identities)
+    try:
+        query.awaitTermination(args.timeout)
+    finally:
+        query.stop()
+        print(json.dumps(monitor.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Generator of synthetic transactions in the IBM AML file formats.
+
+``generate_dataset`` writes two files:
+
+- a transactions CSV with the header and columns of ``LI-Medium_Trans.csv``;
+- a patterns file of ``BEGIN LAUNDERING ATTEMPT`` / ``END LAUNDERING
+  ATTEMPT`` blocks like ``LI-Medium_Patterns.txt``.
+
+Each file can be read by the pipeline unchanged. Every laundering
+transaction appears in both files. The row count, the laundering rate, the
+skew of the account degrees and the mix of typologies are all parameters,
+so the pipeline can be benchmarked at any scale without the original data.
+
+Ordinary transactions pick their sender and receiver from a Zipf-like
+distribution over accounts, so a few hub accounts carry a large share of
+the traffic. Laundering attempts follow the typologies of the IBM
+generator (fan-out, fan-in, cycle and scatter-gather), with payment
+formats drawn from a mix per typology (``LAUNDERING_FORMATS``). The CSV is written
+in time order, one chunk at a time, so memory stays bounded for any row
+count.
+"""
+
+import argparse
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+CSV_HEADER = ["Timestamp", "From Bank", "Account", "To Bank", "Account", "Amount Received",
+              "Receiving Currency", "Amount Paid", "Payment Currency", "Payment Format",
+              "Is Laundering"]
+
+CURRENCIES = {
+    # currency: (share of accounts, US dollars per unit)
+    "US Dollar": (0.35, 1.0), "Euro": (0.22, 1.09), "Yuan": (0.07, 0.14),
+    "Yen": (0.05, 0.0068), "Rupee": (0.05, 0.012), "UK Pound": (0.05, 1.27),
+    "Swiss Franc": (0.03, 1.13), "Australian Dollar": (0.03, 0.66),
+    "Canadian Dollar": (0.03, 0.74), "Mexican Peso": (0.03, 0.058),
+    "Brazil Real": (0.03, 0.2), "Ruble": (0.02, 0.011), "Saudi Riyal": (0.02, 0.27),
+    "Shekel": (0.01, 0.27), "Bitcoin": (0.01, 60000.0),
+}
+
+PAYMENT_FORMATS = {"Cheque": 0.34, "Credit Card": 0.26, "ACH": 0.14, "Cash": 0.12,
+                   "Reinvestment": 0.1, "Wire": 0.03, "Bitcoin": 0.01}
+
+TYPOLOGIES = {"FAN-OUT": 0.3, "FAN-IN": 0.3, "CYCLE": 0.2, "SCATTER-GATHER": 0.2}
+
+# Payment formats of the laundering transactions of each typology. They lean
+# towards ACH, cash and wire transfers but overlap the ordinary mix, so the
+# format alone does not give the label away.
+LAUNDERING_FORMATS = {
+    "FAN-OUT": {"ACH": 0.35, "Cheque": 0.2, "Credit Card": 0.15, "Cash": 0.15,
+                "Wire": 0.1, "Bitcoin": 0.05},
+    "FAN-IN": {"Cash": 0.3, "ACH": 0.25, "Cheque": 0.2, "Credit Card": 0.15, "Wire": 0.1},
+    "CYCLE": {"ACH": 0.3, "Wire": 0.2, "Cheque": 0.2, "Reinvestment": 0.15,
+              "Credit Card": 0.1, "Bitcoin": 0.05},
+    "SCATTER-GATHER": {"ACH": 0.3, "Cheque": 0.25, "Cash": 0.2, "Credit Card": 0.15,
+                       "Wire": 0.1},
+}
+
+TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M"
+
+
+class _Accounts:
+    """Account and bank identifiers with a skewed selection distribution."""
+
+    def __init__(self, rng, num_accounts, num_banks, degree_skew):
+        self.ids = np.array([f"{v:09X}" for v in
+                             rng.choice(16 ** 9, size=num_accounts, replace=False)])
+        self.banks = np.array([f"{b:06d}" for b in rng.choice(10 ** 6, size=num_banks,
+                                                                replace=False)])
+        self.bank_of = rng.integers(0, num_banks, size=num_accounts)
+        currency_shares = np.array([share for share, _ in CURRENCIES.values()])
+        self.currency_of = rng.choice(len(CURRENCIES), size=num_accounts,
+                                      p=currency_shares / currency_shares.sum())
+        # Zipf-like weights over a random ranking of the accounts, kept as a
+        # CDF so that every draw is a binary search
+        weights = rng.permutation(1.0 / np.arange(1, num_accounts + 1) ** degree_skew)
+        self.cdf = np.cumsum(weights) / weights.sum()
+
+    def draw(self, rng, size):
+        return np.minimum(np.searchsorted(self.cdf, rng.random(size)), len(self.ids) - 1)
+
+
+def _frame(accounts, timestamps, senders, receivers, usd_amounts, formats, label):
+    """Build transaction rows in CSV column order from account indices."""
+    rates = np.array([rate for _, rate in CURRENCIES.values()])
+    names = np.array(list(CURRENCIES))
+    paid_currency = accounts.currency_of[senders]
+    received_currency = accounts.currency_of[receivers]
+    # Each side sees the amount in its own account currency
+    amount_paid = usd_amounts / rates[paid_currency]
+    amount_received = usd_amounts / rates[received_currency]
+    return pd.DataFrame({
+        "Timestamp": timestamps,
+        "From Bank": accounts.banks[accounts.bank_of[senders]],
+        "From Account": accounts.ids[senders],
+        "To Bank": accounts.banks[accounts.bank_of[receivers]],
+        "To Account": accounts.ids[receivers],
+        "Amount Received": amount_received,
+        "Receiving Currency": names[received_currency],
+        "Amount Paid": amount_paid,
+        "Payment Currency": names[paid_currency],
+        "Payment Format": np.array(list(PAYMENT_FORMATS))[formats],
+        "Is Laundering": label,
+    })
+
+
+def _attempt_edges(rng, accounts, typology, max_degree):
+    """Return ``(senders, receivers, description)`` for one laundering attempt."""
+    degree = int(rng.integers(2, max_degree + 1))
+    if typology == "FAN-OUT":
+        source, targets = accounts.draw(rng, 1)[0], rng.choice(len(accounts.ids), degree)
+        return np.full(degree, source), targets, f"Max {degree}-degree Fan-Out"
+    if typology == "FAN-IN":
+        sources, target = rng.choice(len(accounts.ids), degree), accounts.draw(rng, 1)[0]
+        return sources, np.full(degree, target), f"Max {degree}-degree Fan-In"
+    if typology == "CYCLE":
+        ring = rng.choice(len(accounts.ids), degree, replace=False)
+        return ring, np.roll(ring, -1), f"Max {degree} hops"
+    # SCATTER-GATHER: source -> intermediates -> sink
+    source, sink = rng.choice(len(accounts.ids), 2, replace=False)
+    middle = rng.choice(len(accounts.ids), degree)
+    return (np.concatenate([np.full(degree, source), middle]),
+            np.concatenate([middle, np.full(degree, sink)]), "")
+
+
+def _format_codes(rng, typology, size):
+    """Draw payment format indices for ``size`` laundering rows of ``typology``.
+
+    Typologies without an entry in ``LAUNDERING_FORMATS`` use the ordinary mix.
+    """
+    shares = LAUNDERING_FORMATS.get(typology, PAYMENT_FORMATS)
+    codes = np.array([list(PAYMENT_FORMATS).index(f) for f in shares])
+    p = np.array(list(shares.values()), dtype=np.float64)
+    return codes[rng.choice(len(codes), size=size, p=p / p.sum())]
+
+
+def _laundering(rng, accounts, num_rows, start, days, typologies, max_degree):
+    """Generate the laundering attempts; returns the rows and the blocks of the patterns file.
+
+    With ``num_rows`` of 0 there are no attempts and the rows are an empty
+    frame with the transaction columns.
+    """
+    names = list(typologies)
+    shares = np.array([typologies[n] for n in names], dtype=np.float64)
+    frames, blocks = [], []
+    total = 0
+    while total < num_rows:
+        typology = names[rng.choice(len(names), p=shares / shares.sum())]
+        senders, receivers, description = _attempt_edges(rng, accounts, typology, max_degree)
+        # Hops follow each other within a few days, in order
+        first = rng.uniform(0, max(days - 3, 0) * 86400)
+        offsets = np.sort(rng.uniform(0, 3 * 86400, size=len(senders)))
+        timestamps = start + pd.to_timedelta(first + offsets, unit="s")
+        amount = rng.lognormal(9, 1)
+        usd = amount * rng.uniform(0.9, 1.0, size=len(senders))
+        formats = _format_codes(rng, typology, len(senders))
+        frame = _frame(accounts, timestamps.floor("min"), senders, receivers, usd, formats, 1)
+        frames.append(frame)
+        blocks.append((typology, description, frame))
+        total += len(frame)
+    if not frames:
+        none = np.zeros(0, dtype=np.int64)
+        return _frame(accounts, pd.DatetimeIndex([]), none, none, np.zeros(0), none, 1), blocks
+    return pd.concat(frames, ignore_index=True), blocks
+
+
+def _fixed_point(values, decimals):
+    """Format non-negative floats with a fixed number of decimals, vectorized."""
+    scaled = pd.Series(np.round(values * 10 ** decimals).astype(np.int64))
+    return (scaled // 10 ** decimals).astype(str) + "." + \
+        (scaled % 10 ** decimals).astype(str).str.zfill(decimals)
+
+
+def _format(frame):
+    """Render timestamps and amounts as in the IBM files (8 decimals for Bitcoin)."""
+    frame = frame.copy()
+    # Timestamps are whole minutes, so only the distinct values are formatted
+    codes, minutes = pd.factorize(frame["Timestamp"])
+    frame["Timestamp"] = np.asarray(minutes.strftime(TIMESTAMP_FORMAT))[codes]
+    for amount, currency in (("Amount Received", "Receiving Currency"),
+                             ("Amount Paid", "Payment Currency")):
+        values = frame[amount].to_numpy()
+        bitcoin = frame[currency].to_numpy() == "Bitcoin"
+        frame[amount] = np.where(bitcoin, _fixed_point(values, 8), _fixed_point(values, 2))
+    return frame
+
+
+def generate_dataset(transactions_path, patterns_path, num_rows=1_000_000, laundering_rate=0.001,
+                     num_accounts=None, num_banks=None, degree_skew=1.0, typologies=None,
+                     max_degree=16, days=14, start="2022/09/01", chunk_rows=1_000_000, seed=42):
+    """Write a transactions CSV and a patterns file with about ``num_rows`` transactions.
+
+    ``laundering_rate`` is the fraction of transactions that belong to
+    laundering attempts. ``degree_skew`` is the Zipf exponent of account
+    selection: 0 is uniform, and larger values concentrate the traffic on
+    hub accounts. ``typologies`` maps typology names to their share of the
+    attempts (default ``TYPOLOGIES``). ``num_accounts`` defaults to
+    ``num_rows / 10`` and ``num_banks`` to ``num_accounts / 50``.
+
+    Returns a summary with the row, account and attempt counts.
+    """
+    rng = np.random.default_rng(seed)
+    num_accounts = num_accounts or max(100, num_rows // 10)
+    num_banks = num_banks or max(5, num_accounts // 50)
+    accounts = _Accounts(rng, num_accounts, num_banks, degree_skew)
+    start = pd.Timestamp(datetime.strptime(start, "%Y/%m/%d"))
+
+    laundering, blocks = _laundering(rng, accounts, int(num_rows * laundering_rate), start, days,
+                                     typologies or TYPOLOGIES, max_degree)
+    normal_rows = max(0, num_rows - len(laundering))
+    format_shares = np.array(list(PAYMENT_FORMATS.values()))
+
+    # Split the period into time slices so the CSV is written in time order
+    num_chunks = max(1, -(-normal_rows // chunk_rows))
+    edges = [start + timedelta(days=days) * i / num_chunks for i in range(num_chunks + 1)]
+    with open(transactions_path, "w") as out:
+        out.write(",".join(CSV_HEADER) + "\n")
+        for i in range(num_chunks):
+            size = normal_rows // num_chunks + (i < normal_rows % num_chunks)
+            seconds = rng.uniform(0, (edges[i + 1] - edges[i]).total_seconds(), size=size)
+            normal = _frame(accounts, (edges[i] + pd.to_timedelta(seconds, unit="s")).floor("min"),
+                            accounts.draw(rng, size), accounts.draw(rng, size),
+                            rng.lognormal(7, 1.5, size=size),
+                            rng.choice(len(PAYMENT_FORMATS), size=size,
+                                       p=format_shares / format_shares.sum()), 0)
+            in_slice = (laundering["Timestamp"] >= edges[i]) & (
+                (laundering["Timestamp"] < edges[i + 1]) | (i == num_chunks - 1))
+            chunk = pd.concat([normal, laundering[in_slice]]).sort_values("Timestamp", kind="stable")
+            _format(chunk).to_csv(out, header=False, index=False)
+
+    with open(patterns_path, "w") as out:
+        for typology, description, frame in blocks:
+            header = f"{typology}:  {description}" if description else typology
+            out.write(f"BEGIN LAUNDERING ATTEMPT - {header}\n")
+            _format(frame).to_csv(out, header=False, index=False)
+            out.write(f"END LAUNDERING ATTEMPT - {typology}\n")
+
+    return {"rows": normal_rows + len(laundering), "laundering_rows": len(laundering),
+            "attempts": len(blocks), "accounts": num_accounts, "banks": num_banks}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate IBM-AML-format synthetic data.")
+    parser.add_argument("--transactions", required=True, help="output transactions CSV")
+    parser.add_argument("--patterns", required=True, help="output patterns file")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--laundering-rate", type=float, default=0.001)
+    parser.add_argument("--accounts", type=int)
+    parser.add_argument("--banks", type=int)
+    parser.add_argument("--degree-skew", type=float, default=1.0)
+    parser.add_argument("--typologies", type=json.loads,
+                        help='JSON shares, e.g. \'{"FAN-IN": 1, "CYCLE": 1}\'')
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    summary = generate_dataset(args.transactions, args.patterns, num_rows=args.rows,
+                               laundering_rate=args.laundering_rate, num_accounts=args.accounts,
+                               num_banks=args.banks, degree_skew=args.degree_skew,
+                               typologies=args.typologies, days=args.days, seed=args.seed)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Hyperparameter search over cached folds with successive halving.
+
+``CrossValidator`` runs the whole pipeline again for every fold and param
+map. That means re-assembling the feature vectors over uncached splits, and
+then refitting the best model from scratch. Here:
+
+- the feature vectors are assembled once and cached together with a fold
+  ID (``cached_folds``). Every fit filters that in-memory relation instead
+  of recomputing its lineage;
+- ``successive_halving`` first trains every candidate on a small sample of
+  each training fold. It keeps the best ``1/eta`` of them and multiplies
+  the sample fraction by ``eta``, until the survivors are trained on the
+  full folds. Wide grids over ``numTrees``/``maxDepth``/``maxBins`` spend
+  most of their time on the few promising candidates;
+- the fits of one round run concurrently. Each fit reads the cached folds
+  through ``partitions_per_fit`` coalesced partitions, and as many fits
+  run at once as there are groups of that many scheduler slots, so
+  together they fill the available cores.
+
+Candidates are ranked by a metric of ``aml.evaluation.evaluation_report``,
+which by default is PR-AUC.
+"""
+
+import math
+import time
+from multiprocessing.pool import ThreadPool
+
+from pyspark.ml.feature import VectorAssembler
+from pyspark.sql import functions as F
+from pyspark.util import inheritable_thread_target
+
+from aml.evaluation import evaluation_report
+
+FOLD_COLUMN = "_fold"
+
+HOLDOUT_COLUMN = "_holdout"
+
+
+def fold_column(num_folds=3, seed=42):
+    """Column expression assigning each row a random fold ID, named ``FOLD_COLUMN``."""
+    return F.floor(F.rand(seed) * num_folds).cast("int").alias(FOLD_COLUMN)
+
+
+def holdout_column(fraction=0.2, seed=43):
+    """Column expression that is true for a random ``fraction`` of the rows, named ``HOLDOUT_COLUMN``.
+
+    Add it before any downsampling or oversampling, so the held-out rows
+    keep the real class balance.
+    """
+    return (F.rand(seed) < fraction).alias(HOLDOUT_COLUMN)
+
+
+def cached_folds(df, feature_columns, label_col="isLaundering", features_col="features",
+                 num_folds=3, seed=42):
+    """Assemble the feature vector once and cache it with a random fold ID.
+
+    Returns the cached DataFrame with ``features_col``, ``label_col`` and
+    ``FOLD_COLUMN``. It is materialized before returning. For a compact
+    matrix of binned columns see ``aml.binning.binned_matrix``.
+    """
+    assembler = VectorAssembler(inputCols=feature_columns, outputCol=features_col)
+    folds_df = assembler.transform(df) \
+        .select(features_col, label_col, fold_column(num_folds, seed)) \
+        .cache()
+    folds_df.count()
+    return folds_df
+
+
+def _param_names(param_map):
+    return {param.name: value for param, value in param_map.items()}
+
+
+def _fit_slots(folds_df, num_fits, partitions_per_fit=None, parallelism=None):
+    """Return ``(partitions_per_fit, parallelism)`` for ``num_fits`` fits of a round.
+
+    The scheduler slots (default parallelism) are shared out between the
+    fits. By default every fit gets ``cores // num_fits`` partitions, at
+    least 1 and at most the partitions of ``folds_df``. The concurrency is
+    then the number of fits whose tasks fit in the slots together.
+    """
+    cores = folds_df.sparkSession.sparkContext.defaultParallelism
+    if partitions_per_fit is None:
+        partitions_per_fit = max(1, min(folds_df.rdd.getNumPartitions(), cores // max(1, num_fits)))
+    if parallelism is None:
+        parallelism = max(1, min(num_fits, cores // max(1, partitions_per_fit)))
+    return partitions_per_fit, parallelism
+
+
+def successive_halving(estimator, param_maps, folds_df, label_col="isLaundering",
+                       metric="pr_auc", eta=3, min_fraction=None, parallelism=None,
+                       partitions_per_fit=None, num_bins=1000, feature_columns=None, seed=42):
+    """Search ``param_maps`` on the folds of ``folds_df`` and refit the winner on all rows.
+
+    ``param_maps`` is a list of ``{Param: value}`` maps, e.g. from
+    ``ParamGridBuilder``. In each round every remaining candidate is fitted
+    on a ``fraction`` sample of each training fold and scored by the mean
+    ``metric`` over the validation folds. ``min_fraction`` is the starting
+    fraction; it defaults to the value that reaches the full data in
+    ``ceil(log_eta(len(param_maps)))`` rounds. Every fit reads the folds
+    through ``partitions_per_fit`` coalesced partitions, and ``parallelism``
+    caps the number of concurrent fits; both default to a share of the
+    scheduler slots (see ``_fit_slots``). When ``folds_df`` holds separate
+    feature columns instead of a vector, ``feature_columns`` lists them and
+    every fit assembles them on the fly from the cache.
+
+    Returns a dict with the refitted ``model``, ``best_params``,
+    ``best_metric``, the per-round ``history`` and the total ``seconds``.
+    """
+    start = time.perf_counter()
+    folds = sorted(row[FOLD_COLUMN] for row in folds_df.select(FOLD_COLUMN).distinct().collect())
+    if min_fraction is None:
+        rounds = math.ceil(math.log(len(param_maps), eta)) if len(param_maps) > 1 else 0
+        min_fraction = float(eta) ** -rounds
+    partitions_per_fit, parallelism = _fit_slots(folds_df, len(param_maps) * len(folds),
+                                                 partitions_per_fit, parallelism)
+    if feature_columns is not None:
+        assembler = VectorAssembler(inputCols=feature_columns, outputCol=estimator.getFeaturesCol())
+        folds_df = assembler.transform(folds_df)
+    # The search fits read fewer partitions each; the final refit reads all
+    search_df = folds_df
+    if folds_df.rdd.getNumPartitions() > partitions_per_fit:
+        search_df = folds_df.coalesce(partitions_per_fit)
+
+    def fit_and_score(task):
+        candidate, fold, fraction = task
+        train = search_df.where(F.col(FOLD_COLUMN) != fold)
+        if fraction < 1.0:
+            train = train.sample(fraction=fraction, seed=seed + fold)
+        model = estimator.fit(train, param_maps[candidate])
+        validation = search_df.where(F.col(FOLD_COLUMN) == fold)
+        report = evaluation_report(model.transform(validation), label_col=label_col,
+                                   num_bins=num_bins, alert_budgets=(), curve_points=0)
+        return candidate, report[metric]
+
+    candidates = list(range(len(param_maps)))
+    fraction = min(1.0, min_fraction)
+    history = []
+    pool = ThreadPool(processes=parallelism)
+    try:
+        while True:
+            round_start = time.perf_counter()
+            tasks = [(c, fold, fraction) for c in candidates for fold in folds]
+            scores = {c: [] for c in candidates}
+            for candidate, score in pool.imap_unordered(inheritable_thread_target(fit_and_score),
+                                                        tasks):
+                scores[candidate].append(score if score is not None else float("-inf"))
+            means = {c: sum(s) / len(s) for c, s in scores.items()}
+            history.append({
+                "fraction": fraction,
+                "seconds": round(time.perf_counter() - round_start, 3),
+                "candidates": [{"params": _param_names(param_maps[c]), metric: means[c]}
+                               for c in candidates],
+            })
+
+            candidates = sorted(candidates, key=lambda c: means[c], reverse=True)
+            if fraction >= 1.0 or len(candidates) == 1:
+                break
+            candidates = candidates[:max(1, len(candidates) // eta)]
+            fraction = min(1.0, fraction * eta)
+    finally:
+        pool.close()
+
+    best = candidates[0]
+    model = estimator.fit(folds_df.drop(FOLD_COLUMN), param_maps[best])
+    return {
+        "model": model,
+        "best_params": _param_names(param_maps[best]),
+        "best_metric": means[best],
+        "history": history,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
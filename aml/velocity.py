@@ -0,0 +1,225 @@
+"""Rolling-window velocity features per account.
+
+For every transaction the engine computes, over each horizon (1h, 24h and
+7d by default), how many transactions the account made, the amount they
+summed to and how many distinct counterparties they involved. All horizons
+share one ``partitionBy(account).orderBy(ts)`` specification, so Spark
+computes them in a single sort and a single Window operator with range
+frames.
+
+Hub accounts (clearing accounts of large banks) would produce giant window
+partitions. The rows of accounts with more than ``hot_key_rows``
+transactions are salted with their ``bucket_seconds`` time bucket (one hour
+by default), so a hot account is spread over one sub-partition per hour of
+activity and no row is copied. Every horizon ``h`` is a whole number of
+buckets, so the frame of a row at time ``t`` is the union of three partial
+aggregates:
+
+* the rows of its own bucket up to ``t``, a running aggregate in the bucket,
+* the whole buckets in between, from a small table of per-bucket totals,
+* the rows of the bucket ``h`` earlier from ``t - h`` on, a running
+  aggregate towards the end of that bucket, read at a probe row placed at
+  ``t - h``.
+
+The parts are merged per (account, time) and joined back to the hot rows.
+Counts and amounts are exact. The counterparties of hot accounts are
+merged HyperLogLog sketches, estimates like the ``approx_count_distinct``
+of the other accounts.
+
+The single-node engine (``aml.single_node``) computes the same columns
+with NumPy, so pyspark is only imported by the Spark functions.
+"""
+
+import math
+import operator
+from functools import reduce
+
+HORIZONS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600}
+
+_TS = "_velocity_ts"
+_HOT = "_velocity_hot"
+# Horizon of a probe row (null for transactions) and the time it probes for
+_PROBE = "_velocity_probe"
+_AT = "_velocity_at"
+SALT_COLUMN = "_velocity_salt"
+
+
+def velocity_columns(prefix="Out", horizons=None):
+    """Names of the columns ``velocity_features`` adds, in order."""
+    return [f"{prefix}_{kind}_{suffix}" for suffix in (horizons or HORIZONS)
+            for kind in ("Count", "Amount", "Counterparties")]
+
+
+def hot_keys(df, account_col, hot_key_rows):
+    """Return a DataFrame of the accounts with more than ``hot_key_rows`` rows."""
+    from pyspark.sql import functions as F
+
+    return df.groupBy(account_col).count().where(F.col("count") > hot_key_rows) \
+        .select(account_col, F.lit(True).alias(_HOT))
+
+
+def velocity_partitions(df, account_col="From_Account", hot_key_rows=1_000_000,
+                        bucket_seconds=None, timestamp_col="Timestamp"):
+    """Add the window sub-partition ``SALT_COLUMN`` of every row.
+
+    Timed rows of hot accounts get their ``bucket_seconds`` time bucket as
+    salt, one hour by default. All other rows get salt 0 and stay in one
+    window partition per account.
+    """
+    from pyspark.sql import functions as F
+
+    bucket_seconds = bucket_seconds or min(HORIZONS.values())
+    prepared = df if _TS in df.columns else df.withColumn(_TS, F.col(timestamp_col).cast("long"))
+    if hot_key_rows is None:
+        return prepared.withColumn(SALT_COLUMN, F.lit(0).cast("long")) \
+            .withColumn(_HOT, F.lit(False))
+
+    hot = F.broadcast(hot_keys(prepared, account_col, hot_key_rows))
+    is_hot = F.coalesce(F.col(_HOT), F.lit(False)) & F.col(_TS).isNotNull()
+    return prepared.join(hot, on=account_col, how="left") \
+        .withColumn(_HOT, is_hot) \
+        .withColumn(SALT_COLUMN, F.when(F.col(_HOT), F.floor(F.col(_TS) / bucket_seconds))
+                    .otherwise(F.lit(0)).cast("long"))
+
+
+def velocity_features(df, account_col="From_Account", counterparty_col="To_Account",
+                      amount_col="Amount_Paid", prefix="Out", horizons=None,
+                      hot_key_rows=1_000_000, bucket_seconds=None, timestamp_col="Timestamp"):
+    """Add ``{prefix}_Count_{h}``, ``{prefix}_Amount_{h}`` and ``{prefix}_Counterparties_{h}``.
+
+    Each feature covers the account's transactions in the ``h`` up to and
+    including the current one. ``horizons`` maps a suffix to its length in
+    seconds (defaults to ``HORIZONS``). Counterparty counts are HyperLogLog
+    estimates. Set ``hot_key_rows`` to None to disable hot-key splitting.
+    Every horizon must be a multiple of ``bucket_seconds``, which defaults
+    to their greatest common divisor.
+    """
+    from pyspark.sql import Window
+    from pyspark.sql import functions as F
+
+    horizons = horizons or HORIZONS
+    bucket_seconds = bucket_seconds or math.gcd(*horizons.values())
+    if any(seconds % bucket_seconds for seconds in horizons.values()):
+        raise ValueError("every horizon must be a multiple of bucket_seconds")
+    prepared = velocity_partitions(df, account_col, hot_key_rows, bucket_seconds, timestamp_col)
+
+    ordered = Window.partitionBy(account_col).orderBy(_TS)
+    features = []
+    for suffix, seconds in horizons.items():
+        frame = ordered.rangeBetween(-seconds, Window.currentRow)
+        features += [
+            F.count(F.lit(1)).over(frame).alias(f"{prefix}_Count_{suffix}"),
+            F.sum(F.col(amount_col).cast("double")).over(frame).alias(f"{prefix}_Amount_{suffix}"),
+            F.approx_count_distinct(counterparty_col).over(frame)
+             .alias(f"{prefix}_Counterparties_{suffix}"),
+        ]
+
+    rows = prepared.where(~F.col(_HOT)).select("*", *features)
+    if hot_key_rows is not None:
+        hot = prepared.where(F.col(_HOT))
+        merged = _hot_features(hot, account_col, counterparty_col, amount_col, prefix,
+                               horizons, bucket_seconds)
+        rows = rows.unionByName(hot.join(merged, on=[account_col, _TS]))
+    return rows.drop(_TS, SALT_COLUMN, _HOT)
+
+
+def _merge(parts, combine):
+    """Combine partial aggregates pairwise, skipping the null (empty) ones."""
+    from pyspark.sql import functions as F
+
+    return reduce(lambda a, b: F.when(a.isNull(), b).when(b.isNull(), a).otherwise(combine(a, b)),
+                  parts)
+
+
+def _hot_features(hot, account_col, counterparty_col, amount_col, prefix, horizons,
+                  bucket_seconds):
+    """Velocity features of the salted rows per (account, time), merged from partial aggregates."""
+    from pyspark.sql import Window
+    from pyspark.sql import functions as F
+
+    events = hot.select(account_col, _TS, SALT_COLUMN,
+                        F.col(amount_col).cast("double").alias("_amount"),
+                        F.col(counterparty_col).alias("_counterparty"))
+    times = events.select(account_col, _TS).distinct()
+    for suffix, seconds in horizons.items():
+        start = F.col(_TS) - seconds
+        events = events.unionByName(
+            times.select(account_col, start.alias(_TS),
+                         F.floor(start / bucket_seconds).cast("long").alias(SALT_COLUMN),
+                         F.lit(suffix).alias(_PROBE), F.col(_TS).alias(_AT)),
+            allowMissingColumns=True)
+
+    # One sort per bucket: transactions read the running aggregate up to
+    # their time, probes the one from their time to the end of the bucket
+    ordered = Window.partitionBy(account_col, SALT_COLUMN).orderBy(_TS)
+    frames = [ordered.rangeBetween(Window.unboundedPreceding, Window.currentRow),
+              ordered.rangeBetween(Window.currentRow, Window.unboundedFollowing)]
+    transaction = F.col(_PROBE).isNull()
+    partial = events.select(
+        account_col, _TS, SALT_COLUMN, _PROBE, _AT,
+        *[F.when(transaction, aggregate.over(frames[0])).otherwise(aggregate.over(frames[1]))
+          .alias(name) for name, aggregate in [
+              ("_count", F.count(F.when(transaction, 1))),
+              ("_amount", F.sum("_amount")),
+              ("_sketch", F.hll_sketch_agg("_counterparty"))]])
+
+    own = partial.where(transaction).dropDuplicates([account_col, _TS]) \
+        .select(account_col, _TS, SALT_COLUMN, "_count", "_amount", "_sketch")
+    boundary = partial.where(~transaction).groupBy(account_col, F.col(_AT).alias(_TS)) \
+        .pivot(_PROBE, list(horizons)) \
+        .agg(F.first("_count").alias("count"), F.first("_amount").alias("amount"),
+             F.first("_sketch").alias("sketch"))
+
+    # Whole buckets between the boundary bucket and the row's own bucket
+    totals = hot.groupBy(account_col, SALT_COLUMN).agg(
+        F.count(F.lit(1)).alias("_count"),
+        F.sum(F.col(amount_col).cast("double")).alias("_amount"),
+        F.hll_sketch_agg(counterparty_col).alias("_sketch"))
+    by_bucket = Window.partitionBy(account_col).orderBy(SALT_COLUMN)
+    sums = []
+    for suffix, seconds in horizons.items():
+        buckets = seconds // bucket_seconds
+        if buckets > 1:
+            frame = by_bucket.rangeBetween(1 - buckets, -1)
+            sums += [F.sum("_count").over(frame).alias(f"{suffix}_between_count"),
+                     F.sum("_amount").over(frame).alias(f"{suffix}_between_amount"),
+                     F.hll_union_agg("_sketch").over(frame).alias(f"{suffix}_between_sketch")]
+    between = totals.select(account_col, SALT_COLUMN, *sums)
+
+    merged = own.join(boundary, on=[account_col, _TS]) \
+        .join(F.broadcast(between), on=[account_col, SALT_COLUMN])
+
+    def parts(suffix, kind):
+        columns = [f"_{kind}", f"{suffix}_{kind}", f"{suffix}_between_{kind}"]
+        return [F.col(c) for c in columns if c in merged.columns]
+
+    features = []
+    for suffix in horizons:
+        features += [
+            _merge(parts(suffix, "count"), operator.add).alias(f"{prefix}_Count_{suffix}"),
+            _merge(parts(suffix, "amount"), operator.add).alias(f"{prefix}_Amount_{suffix}"),
+            F.coalesce(F.hll_sketch_estimate(_merge(parts(suffix, "sketch"), F.hll_union)),
+                       F.lit(0)).alias(f"{prefix}_Counterparties_{suffix}"),
+        ]
+    return merged.select(account_col, _TS, *features)
+
+
+def key_skew(df, key_cols):
+    """Summarize how unevenly rows are spread over the ``key_cols`` partitions.
+
+    Returns the number of keys, the largest and median key sizes and their
+    ratio; a ratio far above 1 means the largest window partition straggles.
+    """
+    from pyspark.sql import functions as F
+
+    sizes = df.groupBy(*key_cols).count()
+    stats = sizes.agg(F.count(F.lit(1)).alias("keys"),
+                      F.max("count").alias("max_rows"),
+                      F.percentile_approx("count", 0.5).alias("median_rows")).first()
+    median = stats["median_rows"] or 0
+    return {
+        "keys": stats["keys"],
+        "max_rows": stats["max_rows"],
+        "median_rows": median,
+        "max_to_median": round(stats["max_rows"] / median, 1) if median else None,
+    }
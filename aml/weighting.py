@@ -0,0 +1,94 @@
+"""Per-row class weights as an alternative to downsampling plus SMOTE.
+
+Balancing by SMOTE turns every minority row into ``num_samples`` synthetic
+rows, all of which are cached, shuffled and trained on. Tree learners in
+Spark accept a ``weightCol`` instead. A row's weight scales its
+contribution to the impurity of every split, so one real minority row
+weighted by ``w`` counts like ``w`` copies of it, and no row is added.
+
+``class_weights`` derives the weights from the class frequencies in one
+aggregation. They can be stratified by a column such as the payment
+format, so that each stratum is balanced on its own. A class that is rare
+overall but common in one format is then not weighted up further in that
+format. ``with_class_weights`` adds the weight column. The weights are
+JSON-serializable, so they can be stored with a run or a checkpoint.
+"""
+
+from pyspark.sql import functions as F
+
+WEIGHT_COLUMN = "weight"
+
+
+def class_weights(df, label_col="isLaundering", strata_col=None, max_weight=None):
+    """Return balanced class weights of ``df`` from one ``groupBy``.
+
+    Without ``strata_col`` the weight of class ``c`` is
+    ``rows / (classes * rows_c)``. With it, each stratum ``s`` is
+    balanced separately: ``rows_s / (classes_s * rows_s_c)``. Every stratum
+    then keeps its total weight while its classes contribute equally. The
+    weights are capped at ``max_weight`` when it is given.
+
+    Returns a dict with the ``label_col``, the ``strata_col``, the
+    overall per-class weights under ``classes`` and, when stratified, one
+    record per stratum and class under ``strata``. Rows whose stratum is
+    not listed get the overall weight of their class.
+    """
+    group_cols = [label_col] if strata_col is None else [strata_col, label_col]
+    counts = [row.asDict() for row in df.groupBy(*group_cols).count().collect()]
+
+    def capped(weight):
+        return min(weight, max_weight) if max_weight is not None else weight
+
+    totals = {}
+    for row in counts:
+        totals[row[label_col]] = totals.get(row[label_col], 0) + row["count"]
+    rows = sum(totals.values())
+    classes = [{"label": label, "count": count, "weight": capped(rows / (len(totals) * count))}
+               for label, count in sorted(totals.items())]
+
+    strata = []
+    if strata_col is not None:
+        by_stratum = {}
+        for row in counts:
+            by_stratum.setdefault(row[strata_col], []).append(row)
+        for stratum, stratum_rows in by_stratum.items():
+            stratum_total = sum(row["count"] for row in stratum_rows)
+            for row in sorted(stratum_rows, key=lambda r: r[label_col]):
+                strata.append({
+                    "stratum": stratum,
+                    "label": row[label_col],
+                    "count": row["count"],
+                    "weight": capped(stratum_total / (len(stratum_rows) * row["count"])),
+                })
+
+    return {"label_col": label_col, "strata_col": strata_col, "classes": classes, "strata": strata}
+
+
+def weight_column(weights):
+    """Column expression giving each row its weight from ``class_weights``."""
+    label = F.col(weights["label_col"])
+    overall = None
+    for entry in weights["classes"]:
+        condition = label == F.lit(entry["label"])
+        overall = (F.when(condition, entry["weight"]) if overall is None
+                   else overall.when(condition, entry["weight"]))
+    overall = overall.otherwise(1.0)
+
+    if not weights["strata"]:
+        return overall.cast("double")
+
+    stratum = F.col(weights["strata_col"])
+    stratified = None
+    for entry in weights["strata"]:
+        if entry["stratum"] is None:
+            condition = stratum.isNull() & (label == F.lit(entry["label"]))
+        else:
+            condition = (stratum == F.lit(entry["stratum"])) & (label == F.lit(entry["label"]))
+        stratified = (F.when(condition, entry["weight"]) if stratified is None
+                      else stratified.when(condition, entry["weight"]))
+    return stratified.otherwise(overall).cast("double")
+
+
+def with_class_weights(df, weights, weight_col=WEIGHT_COLUMN):
+    """Return ``df`` with the ``weight_col`` column from ``class_weights``."""
+    return df.withColumn(weight_col, weight_column(weights))
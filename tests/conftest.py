@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def spark():
+    """A small local SparkSession; the tests that use it are skipped without pyspark."""
+    pyspark_sql = pytest.importorskip("pyspark.sql")
+    session = pyspark_sql.SparkSession.builder \
+        .master("local[2]") \
+        .appName("aml-tests") \
+        .config("spark.ui.enabled", "false") \
+        .config("spark.sql.shuffle.partitions", "2") \
+        .config("spark.sql.session.timeZone", "UTC") \
+        .getOrCreate()
+    yield session
+    session.stop()
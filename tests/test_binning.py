@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("pyspark")
+
+from pyspark.ml.feature import VectorAssembler  # noqa: E402
+
+from aml.binning import binned_matrix, fit_bucketizer  # noqa: E402
+from aml.encoding import FusedStringIndexer  # noqa: E402
+
+
+def feature_types(df, column):
+    """Map every slot of an assembled vector column to its ML attribute type."""
+    attrs = df.schema[column].metadata["ml_attr"]["attrs"]
+    return {attr["name"]: kind for kind, group in attrs.items() for attr in group}
+
+
+@pytest.mark.parametrize("stored", [False, True])
+def test_passthrough_indices_stay_nominal(spark, tmp_path, stored):
+    rows = [(float(i), ["Euro", "US Dollar", "Yen"][i % 3], i % 2) for i in range(60)]
+    df = spark.createDataFrame(rows, ["Amount", "Currency", "isLaundering"])
+    df = FusedStringIndexer(inputCols=["Currency"], outputCols=["CurrencyIndex"]).fit(df).transform(df)
+
+    binner = fit_bucketizer(df, ["Amount"], max_bins=4)
+    matrix = binned_matrix(df, binner, passthrough_columns=["CurrencyIndex"],
+                           extra_cols=["isLaundering"],
+                           path=str(tmp_path / "matrix") if stored else None)
+    assembled = VectorAssembler(inputCols=["Amount_Bin", "CurrencyIndex"],
+                                outputCol="features").transform(matrix)
+    matrix.unpersist()
+
+    types = feature_types(assembled, "features")
+    assert types["CurrencyIndex"] == "nominal"
+    assert types["Amount_Bin"] != "nominal"
+
+
+def test_null_and_constant_columns_get_valid_splits(spark):
+    df = spark.createDataFrame([(None, 5.0, float(i)) for i in range(20)],
+                               "Empty double, Constant double, Amount double")
+    binner = fit_bucketizer(df, ["Empty", "Constant", "Amount"], max_bins=4)
+    assert all(len(splits) >= 3 for splits in binner.getSplitsArray())
+
+    matrix = binned_matrix(df, binner)
+    bins = matrix.select("Empty_Bin", "Constant_Bin").distinct().collect()
+    matrix.unpersist()
+    assert [tuple(row) for row in bins] == [(None, 1)]
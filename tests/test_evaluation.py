@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from aml.evaluation import array_histogram, histogram_report
+
+NUM_BINS = 1000
+
+
+def exact_roc_auc(scores, labels):
+    """Probability that a positive outscores a negative, ties counting half."""
+    positives, negatives = scores[labels == 1], scores[labels == 0]
+    greater = (positives[:, None] > negatives[None, :]).sum()
+    ties = (positives[:, None] == negatives[None, :]).sum()
+    return (greater + 0.5 * ties) / (len(positives) * len(negatives))
+
+
+def exact_pr_auc(scores, labels):
+    """Trapezoidal PR area over the distinct thresholds, starting at recall 0."""
+    precision, recall = [], []
+    for threshold in np.unique(scores)[::-1]:
+        flagged = scores >= threshold
+        true_pos = (labels[flagged] == 1).sum()
+        precision.append(true_pos / flagged.sum())
+        recall.append(true_pos / (labels == 1).sum())
+    precision = np.array([precision[0]] + precision)
+    recall = np.array([0.0] + recall)
+    return float(np.sum(np.diff(recall) * (precision[1:] + precision[:-1]) / 2))
+
+
+@pytest.fixture
+def scored():
+    """Scores that each fall in their own bin, with noisy labels."""
+    rng = np.random.default_rng(7)
+    scores = (rng.permutation(NUM_BINS)[:300] + 0.5) / NUM_BINS
+    labels = (rng.random(300) < scores).astype(int)
+    return scores, labels
+
+
+def test_curves_match_exact_metrics(scored):
+    scores, labels = scored
+    report = histogram_report(*array_histogram(scores, labels, num_bins=NUM_BINS))
+    assert report["rows"] == 300
+    assert report["positives"] == labels.sum()
+    assert report["roc_auc"] == pytest.approx(exact_roc_auc(scores, labels))
+    assert report["pr_auc"] == pytest.approx(exact_pr_auc(scores, labels))
+
+
+def test_tied_scores_count_half():
+    scores = np.array([0.5, 0.5, 0.5, 0.9])
+    labels = np.array([1, 0, 0, 1])
+    report = histogram_report(*array_histogram(scores, labels, num_bins=NUM_BINS))
+    assert report["roc_auc"] == pytest.approx(exact_roc_auc(scores, labels))
+
+
+def test_classification_metrics_match_confusion_counts(scored):
+    scores, labels = scored
+    predictions = (scores > 0.5).astype(int)
+    report = histogram_report(*array_histogram(scores, labels, num_bins=NUM_BINS))
+
+    true_pos = ((predictions == 1) & (labels == 1)).sum()
+    precision = true_pos / predictions.sum()
+    recall = true_pos / labels.sum()
+    assert report["accuracy"] == pytest.approx((predictions == labels).mean())
+    assert report["precision"] == pytest.approx(precision)
+    assert report["recall"] == pytest.approx(recall)
+    assert report["f1"] == pytest.approx(2 * precision * recall / (precision + recall))
+    cells = {(c["label"], c["prediction"]): c["count"] for c in report["confusion_matrix"]}
+    assert cells[(1, 1)] == true_pos
+    assert sum(cells.values()) == len(labels)
+
+
+@pytest.mark.parametrize("alerts", [1, 10, 100, 300])
+def test_precision_at_k_matches_top_k(scored, alerts):
+    scores, labels = scored
+    report = histogram_report(*array_histogram(scores, labels, num_bins=NUM_BINS),
+                              alert_budgets=(alerts,))
+    top = labels[np.argsort(-scores)[:alerts]]
+    point = report["precision_at_k"][0]
+    assert point["alerts"] == alerts
+    assert point["precision"] == pytest.approx(top.mean())
+    assert point["recall"] == pytest.approx(top.sum() / labels.sum())
+
+
+def test_histograms_of_batches_add_up(scored):
+    scores, labels = scored
+    whole = array_histogram(scores, labels, num_bins=NUM_BINS)
+    first = array_histogram(scores[:120], labels[:120], num_bins=NUM_BINS)
+    second = array_histogram(scores[120:], labels[120:], num_bins=NUM_BINS)
+    np.testing.assert_array_equal(whole[0], first[0] + second[0])
+    np.testing.assert_array_equal(whole[1], first[1] + second[1])
+    for cell, count in whole[2].items():
+        assert count == first[2].get(cell, 0) + second[2].get(cell, 0)
+
+
+def test_single_class_has_no_curves():
+    report = histogram_report(*array_histogram([0.2, 0.7], [0, 0], num_bins=NUM_BINS))
+    assert report["roc_auc"] is None and report["pr_auc"] is None
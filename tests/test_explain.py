@@ -0,0 +1,124 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from aml.explain import ForestExplainer, alerts_in_budget, top_contributions
+from aml.scorer import LEAF, CompiledForest
+
+
+def hand_built_forest():
+    """Two trees over three features; feature 1 is categorical with 3 categories.
+
+    Tree 0 splits on feature 0 twice along one path, which the explainer
+    merges into a single path element.
+    """
+    nodes = [
+        # feature, threshold, left, right, cover, positive value
+        (0, 5.0, 1, 2, 20, None),     # 0: tree 0 root
+        (0, 2.0, 3, 4, 12, None),     # 1
+        (1, 0.0, 5, 6, 8, None),      # 2: categorical, {0, 2} go left
+        (LEAF, 0, -1, -1, 5, 0.1),    # 3
+        (2, 1.5, 7, 8, 7, None),      # 4
+        (LEAF, 0, -1, -1, 3, 0.6),    # 5
+        (LEAF, 0, -1, -1, 5, 0.9),    # 6
+        (LEAF, 0, -1, -1, 4, 0.3),    # 7
+        (LEAF, 0, -1, -1, 3, 0.7),    # 8
+        (2, 0.5, 10, 11, 20, None),   # 9: tree 1 root
+        (LEAF, 0, -1, -1, 9, 0.2),    # 10
+        (0, 7.0, 12, 13, 11, None),   # 11
+        (LEAF, 0, -1, -1, 6, 0.4),    # 12
+        (LEAF, 0, -1, -1, 5, 1.0),    # 13
+    ]
+    left_categories = np.zeros((len(nodes), 3), dtype=bool)
+    left_categories[2] = [True, False, True]
+    return CompiledForest(
+        roots=[0, 9],
+        feature=[n[0] for n in nodes],
+        threshold=[n[1] for n in nodes],
+        left=[n[2] for n in nodes],
+        right=[n[3] for n in nodes],
+        value=[[0.0, 0.0] if n[5] is None else [1 - n[5], n[5]] for n in nodes],
+        cover=[n[4] for n in nodes],
+        is_categorical=[i == 2 for i in range(len(nodes))],
+        left_categories=left_categories,
+        feature_names=["Amount", "Format", "Count"],
+        max_depth=3)
+
+
+def expected_output(forest, node, x, known):
+    """Tree output with the features in ``known`` fixed to ``x`` and the rest averaged by cover."""
+    feature = forest.feature[node]
+    if feature == LEAF:
+        return forest.value[node, 1]
+    if feature in known:
+        if forest.is_categorical[node]:
+            categories = forest.left_categories.shape[1]
+            go_left = x[feature] < categories and forest.left_categories[node, int(x[feature])]
+        else:
+            go_left = x[feature] <= forest.threshold[node]
+        return expected_output(forest, forest.left[node] if go_left else forest.right[node],
+                               x, known)
+    left, right = forest.left[node], forest.right[node]
+    return (forest.cover[left] * expected_output(forest, left, x, known)
+            + forest.cover[right] * expected_output(forest, right, x, known)) / forest.cover[node]
+
+
+def brute_force_shap(forest, x):
+    """Shapley values of the path-dependent value function, summed over every subset."""
+    num_features = len(forest.feature_names)
+
+    def value(known):
+        return sum(expected_output(forest, root, x, known) for root in forest.roots) \
+            / forest.num_trees
+
+    phi = np.zeros(num_features)
+    for j in range(num_features):
+        others = [k for k in range(num_features) if k != j]
+        for size in range(num_features):
+            weight = math.factorial(size) * math.factorial(num_features - size - 1) \
+                / math.factorial(num_features)
+            for subset in itertools.combinations(others, size):
+                phi[j] += weight * (value(set(subset) | {j}) - value(set(subset)))
+    return phi
+
+
+ROWS = np.array([
+    [1.0, 0.0, 0.0],
+    [3.0, 1.0, 2.0],
+    [6.0, 0.0, 1.0],
+    [6.0, 1.0, 3.0],
+    [9.0, 2.0, 0.2],
+    [2.0, 5.0, 1.5],     # unseen category
+    [np.nan, 1.0, 0.4],  # NaN goes right
+])
+
+
+@pytest.mark.parametrize("max_cells", [1_000_000, 5])
+def test_shap_values_match_brute_force(max_cells):
+    forest = hand_built_forest()
+    values = ForestExplainer(forest, max_cells=max_cells).shap_values(ROWS)
+    expected = np.array([brute_force_shap(forest, x) for x in ROWS])
+    np.testing.assert_allclose(values, expected, atol=1e-12)
+
+
+def test_contributions_add_up_to_the_score():
+    forest = hand_built_forest()
+    explainer = ForestExplainer(forest)
+    values = explainer.shap_values(ROWS)
+    scores = forest.predict_proba(ROWS)[:, 1]
+    np.testing.assert_allclose(explainer.expected_value + values.sum(axis=1), scores)
+    everything_unknown = sum(expected_output(forest, root, ROWS[0], set())
+                             for root in forest.roots) / forest.num_trees
+    assert explainer.expected_value == pytest.approx(everything_unknown)
+
+
+def test_top_contributions_by_absolute_value():
+    names, values = top_contributions(np.array([[0.1, -0.5, 0.3]]), ["a", "b", "c"], top_n=2)
+    assert names.tolist() == [["b", "c"]]
+    np.testing.assert_allclose(values, [[-0.5, 0.3]])
+
+
+def test_alerts_in_budget():
+    assert alerts_in_budget(1000.0, 4, 60.0) == 240_000
@@ -0,0 +1,56 @@
+import pytest
+
+from aml.patterns import (_parse_partition, _partition_start_states, _summarize_partition,
+                          parse_pattern_lines)
+
+LINES = [
+    "BEGIN LAUNDERING ATTEMPT - FAN-OUT:  Max 2-degree Fan-Out",
+    "2022/09/01 00:06,021174,800737690,012,80011F990,2848.96,Euro,2848.96,Euro,ACH,1",
+    "2022/09/01 04:11,021174,800737690,020,80020C5B0,8630.40,Euro,8630.40,Euro,ACH,1",
+    "END LAUNDERING ATTEMPT - FAN-OUT",
+    "",
+    "BEGIN LAUNDERING ATTEMPT - CYCLE:  Max 3 hops",
+    "2022/09/02 10:00,000001,AAA,000002,BBB,100.00,US Dollar,100.00,US Dollar,Cash,1",
+    "2022/09/02 11:00,000002,BBB,000003,CCC,99.00,US Dollar,99.00,US Dollar,Cash,1",
+    "2022/09/02 12:00,000003,CCC,000001,AAA,98.00,US Dollar,98.00,US Dollar,Wire,1",
+    "END LAUNDERING ATTEMPT - CYCLE",
+    "2022/09/03 00:00,000009,ZZZ,000008,YYY,1.00,Euro,1.00,Euro,ACH,0",
+    "BEGIN LAUNDERING ATTEMPT - GATHER-SCATTER",
+    "2022/09/04 09:30,000004,DDD,000005,EEE,5.00,Euro,5.00,Euro,Cheque,1",
+    "END LAUNDERING ATTEMPT - GATHER-SCATTER",
+]
+
+
+def parse_in_partitions(lines, cuts):
+    """Run the two-pass parser of ``parse_patterns`` over ``lines`` cut at ``cuts``."""
+    bounds = [0, *cuts, len(lines)]
+    partitions = [lines[start:end] for start, end in zip(bounds, bounds[1:])]
+    summaries = [summary for index, part in enumerate(partitions)
+                 for summary in _summarize_partition(index, iter(part))]
+    parse = _parse_partition(_partition_start_states(summaries))
+    return [row for index, part in enumerate(partitions) for row in parse(index, iter(part))]
+
+
+def test_parse_pattern_lines():
+    rows = list(parse_pattern_lines(line + "\n" for line in LINES))
+    assert [(row[0], row[1]) for row in rows] == [
+        (0, "FAN-OUT:  Max 2-degree Fan-Out"), (0, "FAN-OUT:  Max 2-degree Fan-Out"),
+        (1, "CYCLE:  Max 3 hops"), (1, "CYCLE:  Max 3 hops"), (1, "CYCLE:  Max 3 hops"),
+        (2, "GATHER-SCATTER"),
+    ]
+    assert rows[0][2:] == ("2022/09/01 00:06", "021174", "800737690", "012", "80011F990",
+                           "2848.96", "Euro", "2848.96", "Euro", "ACH", 1)
+    # The line between the blocks is not part of an attempt
+    assert all(row[4] != "ZZZ" for row in rows)
+
+
+@pytest.mark.parametrize("cuts", [(c,) for c in range(1, len(LINES))]
+                         + [(2, 3), (1, 7, 8), (6, 7, 8, 9), tuple(range(1, len(LINES)))])
+def test_blocks_split_across_partitions(cuts):
+    assert parse_in_partitions(LINES, cuts) == list(parse_pattern_lines(LINES))
+
+
+def test_partition_without_markers_carries_the_open_block():
+    # The middle partition holds only transaction lines of the CYCLE block
+    rows = parse_in_partitions(LINES, (7, 8))
+    assert [row[0] for row in rows if row[1].startswith("CYCLE")] == [1, 1, 1]
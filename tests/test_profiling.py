@@ -0,0 +1,31 @@
+import socket
+
+import pytest
+
+pytest.importorskip("pyspark")
+
+from pyspark import SparkContext  # noqa: E402
+
+from aml.profiling import StageProfiler  # noqa: E402
+
+
+def closed_port():
+    """A local port that nothing listens on, so connections to it are refused."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_unreachable_ui_records_wall_time_only(spark, monkeypatch):
+    url = f"http://127.0.0.1:{closed_port()}"
+    monkeypatch.setattr(SparkContext, "uiWebUrl", property(lambda sc: url))
+
+    profiler = StageProfiler(spark)
+    profiler.start("count")
+    assert spark.range(100).count() == 100
+    report = profiler.finish()
+
+    stage, = report["stages"]
+    assert stage["stage"] == "count"
+    assert stage["seconds"] >= 0
+    assert stage["jobs"] == 0 and stage["tasks"] == 0 and stage["max_task_skew"] is None
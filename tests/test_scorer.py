@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from aml.scorer import LEAF, CompiledForest
+
+
+def hand_built_forest():
+    """Two trees over Amount, Format (3 categories) and Count.
+
+    Tree 0: Amount <= 100 ? (Format in {0, 2} ? [0.9, 0.1] : [0.2, 0.8]) : [0.5, 0.5]
+    Tree 1: Count <= 3 ? [1.0, 0.0] : [0.25, 0.75]
+    """
+    left_categories = np.zeros((8, 3), dtype=bool)
+    left_categories[1] = [True, False, True]
+    return CompiledForest(
+        roots=[0, 5],
+        feature=[0, 1, LEAF, LEAF, LEAF, 2, LEAF, LEAF],
+        threshold=[100.0, 0.0, 0.0, 0.0, 0.0, 3.0, 0.0, 0.0],
+        left=[1, 3, -1, -1, -1, 6, -1, -1],
+        right=[2, 4, -1, -1, -1, 7, -1, -1],
+        value=[[0, 0], [0, 0], [0.5, 0.5], [0.9, 0.1], [0.2, 0.8],
+               [0, 0], [1.0, 0.0], [0.25, 0.75]],
+        cover=[10, 6, 4, 3, 3, 10, 7, 3],
+        is_categorical=[False, True, False, False, False, False, False, False],
+        left_categories=left_categories,
+        feature_names=["Amount", "Format", "Count"],
+        max_depth=2)
+
+
+# Rows and the mean of the two trees' positive-class values, worked out by hand
+CASES = [
+    ([50.0, 0.0, 2.0], (0.1 + 0.0) / 2),
+    ([50.0, 1.0, 5.0], (0.8 + 0.75) / 2),
+    ([100.0, 2.0, 3.0], (0.1 + 0.0) / 2),   # thresholds are inclusive on the left
+    ([150.0, 2.0, 3.0], (0.5 + 0.0) / 2),
+    ([np.nan, 0.0, np.nan], (0.5 + 0.75) / 2),  # NaN goes right
+    ([50.0, np.nan, 0.0], (0.8 + 0.0) / 2),
+    ([50.0, 3.0, 0.0], (0.8 + 0.0) / 2),  # unseen category goes right
+]
+
+
+def test_predict_proba_matches_hand_computed_scores():
+    forest = hand_built_forest()
+    X = np.array([row for row, _ in CASES])
+    proba = forest.predict_proba(X)
+    np.testing.assert_allclose(proba[:, 1], [score for _, score in CASES])
+    np.testing.assert_allclose(proba.sum(axis=1), 1.0)
+
+
+@pytest.mark.parametrize("row, score", CASES)
+def test_predict_one_matches_batch(row, score):
+    assert hand_built_forest().predict_one(row)[1] == pytest.approx(score)
+
+
+def test_leaves_reached():
+    leaves = hand_built_forest().leaves(np.array([[50.0, 0.0, 2.0], [150.0, 1.0, 9.0]]))
+    np.testing.assert_array_equal(leaves, [[3, 6], [2, 7]])
+
+
+def test_save_and_load_round_trip(tmp_path):
+    forest = hand_built_forest()
+    path = str(tmp_path / "forest.npz")
+    forest.save(path)
+    loaded = CompiledForest.load(path)
+    X = np.array([row for row, _ in CASES])
+    assert loaded.feature_names == forest.feature_names
+    np.testing.assert_array_equal(loaded.predict_proba(X), forest.predict_proba(X))
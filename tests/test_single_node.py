@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from aml.single_node import velocity_tables
+from aml.velocity import velocity_columns
+
+HORIZONS = {"1h": 3600, "24h": 24 * 3600}
+NO_TIME = np.iinfo(np.int64).min
+
+
+def brute_force_velocity(columns, horizons):
+    """Every row's frame found by comparing it with every other row."""
+    sender, receiver = columns["From_Account"], columns["To_Account"]
+    timestamp, amount = columns["Timestamp"], columns["Amount_Paid"]
+    features = {name: np.empty(len(sender)) for name in velocity_columns(horizons=horizons)}
+    for i in range(len(sender)):
+        for suffix, seconds in horizons.items():
+            if timestamp[i] == NO_TIME:
+                frame = (sender == sender[i]) & (timestamp == NO_TIME)
+            else:
+                frame = (sender == sender[i]) & (timestamp != NO_TIME) \
+                    & (timestamp >= timestamp[i] - seconds) & (timestamp <= timestamp[i])
+            paid = amount[frame][~np.isnan(amount[frame])]
+            features[f"Out_Count_{suffix}"][i] = frame.sum()
+            features[f"Out_Amount_{suffix}"][i] = paid.sum() if len(paid) else np.nan
+            counterparties = receiver[frame]
+            features[f"Out_Counterparties_{suffix}"][i] = len(set(counterparties[counterparties >= 0]))
+    return features
+
+
+def random_columns(rows, seed):
+    """Transfers between few accounts, with ties, repeats and nulls (ID -1, no time, NaN)."""
+    rng = np.random.default_rng(seed)
+    timestamp = rng.integers(0, 3 * 24 * 3600, size=rows) // 600 * 600
+    timestamp[rng.random(rows) < 0.05] = NO_TIME
+    amount = rng.gamma(2.0, 100.0, size=rows)
+    amount[rng.random(rows) < 0.1] = np.nan
+    return {
+        "From_Account": rng.integers(-1, 6, size=rows).astype(np.int32),
+        "To_Account": rng.integers(-1, 8, size=rows).astype(np.int32),
+        "Timestamp": timestamp,
+        "Amount_Paid": amount,
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_velocity_matches_brute_force(seed):
+    columns = random_columns(400, seed)
+    features = velocity_tables(columns, HORIZONS)
+    expected = brute_force_velocity(columns, HORIZONS)
+    assert list(features) == list(expected)
+    for name, values in expected.items():
+        np.testing.assert_allclose(features[name], values, err_msg=name)
+
+
+def test_velocity_without_rows():
+    features = velocity_tables(random_columns(0, 0), HORIZONS)
+    assert all(len(values) == 0 for values in features.values())
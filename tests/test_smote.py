@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pyspark")
+
+from aml.smote import smote  # noqa: E402
+
+
+@pytest.mark.parametrize("k_neighbors", [None, 3])
+def test_rows_are_generated_by_num_partitions_tasks(spark, k_neighbors):
+    rows = np.random.default_rng(0).normal(size=(200, 3))
+    minority = spark.createDataFrame([tuple(map(float, row)) for row in rows], ["a", "b", "c"])
+    synthetic = smote(minority, ["a", "b", "c"], num_samples=2, k_neighbors=k_neighbors,
+                      num_partitions=5, batch_rows=50)
+    assert synthetic.rdd.getNumPartitions() == 5
+    assert synthetic.count() == 2 * len(rows)
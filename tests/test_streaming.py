@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pyspark")
+
+from pyspark.sql import functions as F  # noqa: E402
+
+from aml.ingest import TRANSACTION_COLUMNS  # noqa: E402
+from aml.labeling import KEY_COLUMN, transaction_key  # noqa: E402
+from aml.streaming import live_account_counts  # noqa: E402
+
+
+def drop_file(spark, landing, rows):
+    """Append one Parquet file of typed transactions to the landing directory."""
+    frame = spark.createDataFrame(
+        [(datetime.fromisoformat(ts), "B1", sender, "B2", receiver, amount, "Euro", amount,
+          "Euro", "ACH") for ts, sender, receiver, amount in rows],
+        TRANSACTION_COLUMNS)
+    frame.coalesce(1).write.mode("append").parquet(landing)
+
+
+def run_batch(spark, landing, checkpoint, schema):
+    """Process the files that arrived since the last run, as one micro-batch."""
+    collected = []
+    transactions = spark.readStream.schema(schema).parquet(landing) \
+        .withColumn(KEY_COLUMN, transaction_key()) \
+        .withColumn("Arrival_Time", F.current_timestamp())
+    query = live_account_counts(transactions).writeStream \
+        .foreachBatch(lambda df, _: collected.extend(df.collect())) \
+        .option("checkpointLocation", checkpoint) \
+        .trigger(availableNow=True) \
+        .start()
+    query.awaitTermination()
+    return {(row["Account"], row["Outgoing"]): row["Live_Count"] for row in collected}
+
+
+def test_account_state_carries_over_between_batches(spark, tmp_path):
+    landing, checkpoint = str(tmp_path / "landing"), str(tmp_path / "checkpoint")
+    drop_file(spark, landing, [("2022-09-01 10:00:00", "A", "B", 10.0)])
+    schema = spark.read.parquet(landing).schema
+
+    first = run_batch(spark, landing, checkpoint, schema)
+    assert first[("A", True)] == 1
+
+    # Account A has no transaction in this batch, whose watermark is the first
+    # event time in 2022, so A's state is only kept if its timeout follows event time
+    drop_file(spark, landing, [("2022-09-05 10:00:00", "C", "D", 20.0)])
+    run_batch(spark, landing, checkpoint, schema)
+
+    drop_file(spark, landing, [("2022-09-06 10:00:00", "A", "E", 30.0)])
+    third = run_batch(spark, landing, checkpoint, schema)
+    assert third[("A", True)] == 2
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyspark")
+
+from pyspark.sql import functions as F  # noqa: E402
+
+from aml.velocity import (SALT_COLUMN, velocity_columns, velocity_features,  # noqa: E402
+                          velocity_partitions)
+
+START = datetime(2022, 9, 1)
+
+
+def transfers(spark, seed, hot_rows=400, other_rows=100, days=10):
+    """Transfers of a hub account "H" and a few others, with ties, null amounts and a null time."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(hot_rows + other_rows):
+        account = "H" if i < hot_rows else f"A{rng.integers(4)}"
+        minutes = int(rng.integers(0, days * 24 * 60)) // 10 * 10
+        amount = None if rng.random() < 0.1 else float(rng.gamma(2.0, 100.0))
+        rows.append((i, account, f"C{rng.integers(6)}", START + timedelta(minutes=minutes), amount))
+    rows.append((len(rows), "H", "C0", None, 5.0))
+    return spark.createDataFrame(rows, "Row int, From_Account string, To_Account string, "
+                                       "Timestamp timestamp, Amount_Paid double")
+
+
+def features_by_row(df):
+    return {row["Row"]: row for row in df.collect()}
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_split_hot_account_matches_one_partition(spark, seed):
+    df = transfers(spark, seed)
+    split = features_by_row(velocity_features(df, hot_key_rows=100))
+    whole = features_by_row(velocity_features(df, hot_key_rows=None))
+    assert split.keys() == whole.keys()
+    for row_id, expected in whole.items():
+        for name in velocity_columns():
+            if "Amount" in name and expected[name] is not None:
+                assert split[row_id][name] == pytest.approx(expected[name]), (row_id, name)
+            else:
+                assert split[row_id][name] == expected[name], (row_id, name)
+
+
+def test_hot_account_spreads_over_tasks_without_copies(spark):
+    df = transfers(spark, 0, hot_rows=2000, other_rows=0)
+    salted = velocity_partitions(df, hot_key_rows=100)
+    assert salted.count() == df.count()
+
+    hot = salted.where(F.col("From_Account") == "H")
+    assert hot.select(SALT_COLUMN).distinct().count() > 100
+    tasks = hot.repartition(8, "From_Account", SALT_COLUMN) \
+        .select(F.spark_partition_id().alias("task")).distinct().count()
+    assert tasks > 2